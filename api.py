@@ -0,0 +1,113 @@
+import hashlib
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy import func, select
+from database import db, Device, get_device_by_id, home_registry, sync_devices
+from labels import LabelError, selector_condition
+from models import DEVICE_WATTAGE
+from registry import DeviceRecord
+from tenancy import current_home
+from writebehind import ProvisionalRecord
+
+FIELDS = DeviceRecord.__slots__
+
+api = Blueprint('api', __name__)
+
+#Error Handling
+class ApiQueryError(Exception):
+    def __init__(self, message, status=400):
+        self.message = message
+        self.status = status
+
+def requested_fields(): #?fields=id,name,status, Defaults to Every Field
+    text = request.args.get('fields')
+    if not text:
+        return FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in text.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise ApiQueryError(f"Unknown field: {', '.join(unknown)}. Choose from {', '.join(FIELDS)}")
+    return fields
+
+def as_json(device, fields):
+    return {field: getattr(device, field) for field in fields}
+
+def conditional(etag, build): #304 When the Client Already Has This Representation; No ETag Given for None
+    if etag is not None and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache' #Always Revalidate, Never Serve Stale
+    return response
+
+#One Device; the ETag Changes Whenever its Version Does, and Differs Between Homes
+#A Command Not Yet Written Has No Real Version, so Until its Flush the Device is Served Without One
+@api.route('/api/devices/<int:device_id>', methods=['GET'])
+def api_device(device_id):
+    fields = requested_fields()
+    device = get_device_by_id(device_id)
+    if device is None:
+        raise ApiQueryError(f"No device with id {device_id}", 404)
+    if isinstance(device, ProvisionalRecord):
+        etag = None
+    elif fields == FIELDS:
+        etag = f"{device.home_id}-{device.id}-{device.version}"
+    else:
+        etag = f"{device.home_id}-{device.id}-{device.version}-{'.'.join(fields)}"
+    return conditional(etag, lambda: as_json(device, fields))
+
+#Paginated Devices, Optionally of One Type and/or Matching a Selector
+#The Page's IDs Come from SQL in ID Order, so a Page Costs the Same at Any Fleet Size; ?after=<id> Continues
+#from the Previous Page's Last Device Without an OFFSET or a Count, and Each Page Gives the Next after
+@api.route('/api/devices', methods=['GET'])
+def api_devices():
+    fields = requested_fields()
+    device_type = request.args.get('type')
+    selector = request.args.get('selector', '').strip()
+    if device_type and device_type not in DEVICE_WATTAGE:
+        raise ApiQueryError(f"Unknown device type: {device_type}")
+    page = request.args.get('page', 1, type=int)
+    after = request.args.get('after', type=int)
+    per_page = min(request.args.get('per_page', current_app.config['DEVICES_PER_PAGE'], type=int),
+                   current_app.config['API_MAX_PER_PAGE'])
+    if page < 1 or per_page < 1:
+        raise ApiQueryError("page and per_page must be positive")
+
+    conditions = [Device.home_id == current_home()]
+    if device_type:
+        conditions.append(Device.type == device_type)
+    if selector:
+        try:
+            conditions.append(selector_condition(selector))
+        except LabelError as error:
+            raise ApiQueryError(error.message)
+    query = select(Device.id).where(*conditions).order_by(Device.id).limit(per_page + 1) #One Extra Shows a Next Page
+    if after is not None:
+        query = query.where(Device.id > after)
+    else:
+        query = query.offset((page - 1) * per_page)
+    ids = db.session.execute(query).scalars().all()
+    more = len(ids) > per_page
+    sync_devices() #Served from the Registry, Which Holds Changes Not Yet Written
+    registry = home_registry()
+    items = [registry.get(device_id) for device_id in ids[:per_page] if device_id in registry]
+
+    body = {'per_page': per_page, 'next_after': ids[per_page - 1] if more else None}
+    if after is None: #Numbered Pages Keep Their Totals
+        total = db.session.execute(select(func.count(Device.id)).where(*conditions)).scalar()
+        body.update(page=page, total=total, pages=-(-total // per_page))
+
+    #Digest of the Page's IDs and Versions, Plus Everything Else Shaping the Body
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{current_home()}|{device_type}|{selector}|{after}|{body.get('total')}|{page}|{per_page}|"
+                  f"{body['next_after']}|{','.join(fields)}|".encode())
+    for device in items:
+        digest.update(f"{device.id}:{device.version},".encode())
+
+    etag = None if any(isinstance(device, ProvisionalRecord) for device in items) else digest.hexdigest()
+    return conditional(etag, lambda: dict(body, devices=[as_json(device, fields) for device in items]))
+
+@api.errorhandler(ApiQueryError)
+def handle_api_query_error(error):
+    return jsonify(error=error.message), error.status
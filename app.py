@@ -1,40 +1,84 @@
+import threading
 from flask import Flask
-from database import db, Device
+from database import db, load_devices
+from sqlalchemy.exc import OperationalError
 from config import Config
 from flask_migrate import Migrate
-from apscheduler.schedulers.background import BackgroundScheduler
-
-
-app = Flask(__name__)
-app.config.from_object(Config)
-
-migrate = Migrate(app, db)
-db.init_app(app)
-
-#Scheduling
-scheduler = BackgroundScheduler({
-    'apscheduler.jobstores.default': {
-        'type': 'sqlalchemy',
-        'url': 'sqlite:///jobs.sqlite'
-    }
-})
-scheduler.start()
+from journal import journal
+from engines import apply_pragmas
+from metrics import instrument_engine, profiler
+
+migrate = Migrate()
+
+#Application Factory: Nothing Here Starts a Thread or Loads the Views
+#Web Servers Use create_app(), Workers, Jobs and Scripts create_app(web=False)
+#Migrations Without the Views: flask --app "app:create_app(web=False)" db upgrade
+def create_app(config=Config, web=True):
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    db.init_app(app)
+    migrate.init_app(app, db)
+    journal.configure(app.config['JOURNAL_ENABLED'])
+
+    #Fill the Device Registry
+    with app.app_context():
+        for shard, engine in db.engines.items(): #Main Database and Any Shards
+            apply_pragmas(engine, app.config['SQLITE_PRAGMAS'])
+            instrument_engine(engine, shard or 'main')
+        try:
+            load_devices()
+        except OperationalError:
+            pass #Devices Table Not Created Yet, Loaded on First Use
+
+    #Opt-In Stack Sampling of Slow Requests
+    profiler.configure(app.config['PROFILER_INTERVAL'], app.config['PROFILER_SLOW_SECONDS'],
+                       app.config['PROFILER_DIRECTORY'])
+
+    register_commands(app)
+    if web:
+        register_views(app)
+    _set_default(app)
+    return app
+
+def register_views(app): #Routes, Forms and WTForms are Only Imported Here
+    from routes import main
+    from api import api
+    app.register_blueprint(main)
+    app.register_blueprint(api)
+    if app.config['PROFILER_ENABLED']:
+        profiler.start()
+
+def register_commands(app): #Command Bodies Import What They Need When Run
+    from inventory import export_command, import_command
+    from journal import snapshot_command, undo_command
+    from tasks import create_shards, sync_schedules
+    for command in (import_command, export_command, sync_schedules, create_shards, snapshot_command, undo_command):
+        app.cli.add_command(command)
+
+#The App Jobs Run Against; the First One Created in the Process, or a Web-Less One on Demand
+_default = None
+_default_lock = threading.RLock()
+
+def _set_default(app):
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = app
+
+def get_app():
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                create_app(web=False)
+    return _default
 
 #Run the app and Create Database
 if __name__ == '__main__':
-    with app.app_context():  
-        db.create_all()      
+    from app import create_app #The Importable Module, so Jobs Find This App Through get_app()
+    from schedulers import schedulers
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    schedulers.start()
     app.run(debug=True)
-
-from routes import *
-
-
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,229 @@
+#ASGI Entry Point: uvicorn asgi:application
+#Async JSON Control Endpoints Under /api/async, Everything Else Served by the Flask App
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import func, not_, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route, request_response
+from app import create_app
+from commands import build_command, ACTION_FIELDS, BulkCommandError, LIGHT_TYPES, TEMPERATURE_RANGES
+from database import Device
+from engines import apply_pragmas
+from journal import journal
+from metrics import instrument_engine
+from events import hub, format_event, last_event_id
+from models import InvalidDeviceTypeError
+from registry import DeviceRecord, registries
+from schedulers import schedulers
+from telemetry import recorder
+from tenancy import HomeError, current_home, parse_home, shard_for, using_home
+from validation import ValidationError, check, check_changes
+from writebehind import writes
+
+flask_app = create_app()
+flask_app.config['EVENTS_URL'] = '/api/async/events' #Dashboards Listen Without Holding a WSGI Thread
+
+def async_url(url): #Same Database Through the Async Driver
+    url = make_url(url)
+    if url.drivername == 'sqlite':
+        return url.set(drivername='sqlite+aiosqlite')
+    return url
+
+def shard_url(shard): #Main Database or a DATABASE_SHARDS Entry, Through the Async Driver
+    if shard is None:
+        return flask_app.config['ASYNC_DATABASE_URI'] or async_url(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+    return async_url(flask_app.config['SQLALCHEMY_BINDS'][shard])
+
+engines = {shard: create_async_engine(shard_url(shard), **flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+           for shard in flask_app.config['HOME_SHARDS']}
+for shard, engine in engines.items():
+    apply_pragmas(engine.sync_engine, flask_app.config['SQLITE_PRAGMAS'])
+    instrument_engine(engine.sync_engine, f"{shard or 'main'}-async")
+sessions = {shard: async_sessionmaker(engine, expire_on_commit=False) for shard, engine in engines.items()}
+
+#SQLite Has One Writer per File; Queue Here Instead of Spinning in its Busy Handler
+write_locks = {shard: asyncio.Lock() for shard in engines}
+
+def home_shard(): #Shard Holding the Current Home
+    return shard_for(current_home(), flask_app.config)
+
+def as_json(record):
+    return {field: getattr(record, field) for field in DeviceRecord.__slots__}
+
+def home_rows():
+    return select(Device.__table__).where(Device.home_id == current_home())
+
+async def sync_registry(): #Async Counterpart of database.sync_devices
+    registry = registries[current_home()]
+    now = time.monotonic()
+    if registry.loaded and now - registry.synced_at < flask_app.config['DEVICE_CACHE_SYNC_INTERVAL']:
+        return
+    registry.synced_at = now
+    async with sessions[home_shard()]() as session:
+        if registry.loaded:
+            registry.merge((await session.execute(
+                home_rows().where(Device.version > registry.high_water))).all())
+            count = (await session.execute(
+                select(func.count(Device.id)).where(Device.home_id == current_home()))).scalar()
+        if not registry.loaded or count != len(registry):
+            registry.replace((await session.execute(home_rows())).all())
+            writes.overlay(registry)
+
+async def fetch_device(device_id): #Served from the Home's Registry, Like the Flask Views
+    await sync_registry()
+    device = registries[current_home()].get(device_id)
+    if device is None:
+        raise HTTPException(404, f"No device with id {device_id}")
+    return device
+
+def only(records, device_id):
+    if not records:
+        raise HTTPException(404, f"No device with id {device_id}")
+    return records[0]
+
+def device_update(device_id): #UPDATE of One of the Home's Devices
+    return update(Device).where(Device.id == device_id, Device.home_id == current_home())
+
+def flush_writes(home_id): #Runs in a Thread; the Flush Uses the Flask Session
+    with flask_app.app_context():
+        writes.flush(home_id)
+
+async def apply(statement, fields): #One UPDATE ... RETURNING in its Own Transaction, Written Through
+    if writes.enabled: #Queued Commands Land First, so This One Wins
+        await asyncio.to_thread(flush_writes, current_home())
+    shard = home_shard()
+    async with write_locks[shard], sessions[shard].begin() as session:
+        rows = (await session.execute(statement.returning(*Device.__table__.columns))).all()
+    records = [DeviceRecord.from_row(row) for row in rows]
+    registries[current_home()].put_many(records)
+    recorder.record_many(records)
+    journal.record_rows(records, fields) #The fields the Statement Sets
+    return records
+
+async def read_json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        raise BulkCommandError("Request body must be JSON")
+    if not isinstance(data, dict):
+        raise BulkCommandError("Request body must be a JSON object")
+    return data
+
+#Endpoints
+async def device_detail(request):
+    return JSONResponse(as_json(await fetch_device(request.path_params['device_id'])))
+
+async def toggle(request):
+    device_id = request.path_params['device_id']
+    records = await apply(device_update(device_id).values(status=not_(Device.status)), ('status',))
+    return JSONResponse(as_json(only(records, device_id)))
+
+async def update_temperature(request):
+    device = await fetch_device(request.path_params['device_id'])
+    if device.type not in TEMPERATURE_RANGES:
+        raise InvalidDeviceTypeError("Temperature can't be updated for this device.")
+    temperature = check(device.type, 'temperature', (await read_json(request)).get('temperature'))
+    records = await apply(device_update(device.id).values(temperature=temperature), ('temperature',))
+    return JSONResponse(as_json(only(records, device.id)))
+
+async def update_light(request):
+    device = await fetch_device(request.path_params['device_id'])
+    if device.type not in LIGHT_TYPES:
+        raise InvalidDeviceTypeError("Brightness can't be updated for this device.")
+    data = await read_json(request)
+    changes = {field: data[field] for field in ('brightness', 'colour') if data.get(field) is not None}
+    if not changes:
+        raise BulkCommandError("Nothing to change: send brightness and/or colour")
+    changes = check_changes(device.type, changes)
+    records = await apply(device_update(device.id).values(**changes), tuple(changes))
+    return JSONResponse(as_json(only(records, device.id)))
+
+async def bulk_command(request): #Same Validation and UPDATE as /devices/command
+    data = await read_json(request)
+    action = data.get('action')
+    records = await apply(build_command(action, data.get('value'), data.get('types'), data.get('ids'),
+                                        data.get('selector')), ACTION_FIELDS[action])
+    return JSONResponse({'action': action, 'affected': len(records)})
+
+async def device_events(request): #/events Without a Thread per Subscriber
+    subscription = hub.subscribe(current_home(), last_event_id(request.headers.get('last-event-id')),
+                                 loop=asyncio.get_running_loop())
+    keepalive = flask_app.config['EVENTS_KEEPALIVE']
+
+    async def stream():
+        try:
+            yield 'retry: 2000\n\n'
+            while True:
+                yield format_event(await subscription.get(keepalive))
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+#Scopes Each Request to the Home Named by X-Home-ID or ?home=, Else the First Home
+class HomeMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        try:
+            home_id = parse_home(request.headers.get('x-home-id'), request.query_params.get('home'))
+        except HomeError as error:
+            await JSONResponse({'error': error.message}, status_code=400)(scope, receive, send)
+            return
+        with using_home(home_id):
+            await self.app(scope, receive, send)
+
+#Error Handling
+async def handle_client_error(request, error):
+    return JSONResponse({'error': error.message}, status_code=400)
+
+async def handle_http_error(request, error):
+    return JSONResponse({'error': error.detail}, status_code=error.status_code)
+
+api = Starlette(
+    routes=[
+        Route('/devices/{device_id:int}', device_detail),
+        Route('/devices/{device_id:int}/toggle', toggle, methods=['POST']),
+        Route('/devices/{device_id:int}/temperature', update_temperature, methods=['POST']),
+        Route('/devices/{device_id:int}/light', update_light, methods=['POST']),
+        Route('/devices/command', bulk_command, methods=['POST']),
+        Route('/events', device_events),
+    ],
+    exception_handlers={
+        BulkCommandError: handle_client_error,
+        InvalidDeviceTypeError: handle_client_error,
+        ValidationError: handle_client_error,
+        HTTPException: handle_http_error,
+    },
+    middleware=[Middleware(HomeMiddleware)],
+)
+
+@asynccontextmanager
+async def lifespan(application):
+    schedulers.start() #Scheduled Jobs Run from Startup, Not from the First Request
+    yield
+    for engine in engines.values():
+        await engine.dispose()
+
+application = Starlette(
+    routes=[
+        Mount('/api/async', app=api),
+        Route('/events', HomeMiddleware(request_response(device_events))), #Not the Thread-Holding Flask Stream
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
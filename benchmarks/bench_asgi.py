@@ -0,0 +1,130 @@
+#WSGI vs ASGI Control Endpoints: python -m benchmarks.bench_asgi [--clients N] [--seconds S]
+#Starts Each Server on a Seeded Throwaway Database, Then Drives it with Concurrent Async Clients
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from sqlalchemy import create_engine, insert
+from database import db, Device
+from models import DEVICE_TYPE_CODES
+
+#Same Operations on Each Path: (Method, WSGI Path, ASGI Path, JSON Body)
+SCENARIOS = {
+    'read device': ('GET', '/device/{id}', '/api/async/devices/{id}', None),
+    'toggle device': ('POST', '/toggle/{id}', '/api/async/devices/{id}/toggle', None),
+    'bulk command': ('POST', '/devices/command', '/api/async/devices/command',
+                     {'action': 'on', 'ids': ['{id}']}),
+}
+
+def seed(url, count):
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    names = list(DEVICE_TYPE_CODES)
+    with engine.begin() as connection:
+        connection.execute(insert(Device), [
+            {'name': f'device {i}', 'type': names[i % len(names)], 'status': False, 'version': i + 1,
+             'type_code': DEVICE_TYPE_CODES[names[i % len(names)]], 'temperature': None, 'brightness': 50}
+            for i in range(count)
+        ])
+    engine.dispose()
+
+def serve(kind, port): #Runs in the Child Process
+    if kind == 'wsgi':
+        from werkzeug.serving import run_simple
+        from app import create_app
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        run_simple('127.0.0.1', port, app, threaded=True)
+    else:
+        import uvicorn
+        uvicorn.run('asgi:application', host='127.0.0.1', port=port, log_level='warning')
+
+async def request(port, method, path, body):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body).encode() if body is not None else b''
+    head = (f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n")
+    writer.write(head.encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+async def client(port, method, template, body, devices, deadline, latencies, errors, offset):
+    i = offset
+    while time.perf_counter() < deadline:
+        i += 1
+        device_id = i % devices + 1
+        data = json.loads(json.dumps(body).replace('{id}', str(device_id))) if body else None
+        start = time.perf_counter()
+        try:
+            status = await request(port, method, template.format(id=device_id), data)
+        except OSError:
+            status = 0
+        if status >= 400 or status == 0:
+            errors.append(status)
+        else:
+            latencies.append(time.perf_counter() - start)
+
+async def drive(port, method, template, body, clients, seconds, devices):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(client(port, method, template, body, devices, deadline, latencies, errors, n * 97)
+                           for n in range(clients)))
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+    return len(latencies) / seconds, p99, len(errors)
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            asyncio.run(request(port, 'GET', '/', None))
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare requests/s and p99 of the Flask and ASGI control paths')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--devices', type=int, default=10_000)
+    parser.add_argument('--serve', choices=('wsgi', 'asgi'), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=8790)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    directory = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(directory, 'devices.db')}"
+    seed(url, args.devices)
+    env = dict(os.environ, DATABASE_URL=url, SCHEDULER_RUN_JOBS='0',
+               SCHEDULER_JOBSTORE_URL=f"sqlite:///{os.path.join(directory, 'jobs.sqlite')}")
+
+    results = {}
+    for offset, kind in enumerate(('wsgi', 'asgi')):
+        port = args.port + offset
+        server = subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_asgi', '--serve', kind, '--port', str(port)],
+                                  env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for(port)
+            for name, (method, wsgi_path, asgi_path, body) in SCENARIOS.items():
+                path = wsgi_path if kind == 'wsgi' else asgi_path
+                results[name, kind] = asyncio.run(drive(port, method, path, body, args.clients, args.seconds, args.devices))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'scenario':<16}{'server':<8}{'req/s':>10}{'p99 ms':>10}{'errors':>8}")
+    for (name, kind), (rate, p99, errors) in results.items():
+        print(f"{name:<16}{kind:<8}{rate:>10,.0f}{p99:>10.1f}{errors:>8}")
+
+if __name__ == '__main__':
+    main()
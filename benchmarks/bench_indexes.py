@@ -0,0 +1,119 @@
+#Devices Index Benchmark: python -m benchmarks.bench_indexes [--devices N] [--homes N] [--repeat N]
+#Seeds a Throwaway SQLite File, Then Times the Hot Queries Before and After the Indexes
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from models import DEVICE_TYPE_CODES, DEVICE_WATTAGE
+
+#Schema as Created by the Initial Migration, Plus the Later version, type_code and home_id Columns
+SCHEMA = """
+CREATE TABLE devices (
+    id INTEGER NOT NULL PRIMARY KEY,
+    home_id INTEGER DEFAULT '1' NOT NULL,
+    name VARCHAR(80) NOT NULL,
+    type VARCHAR(20) NOT NULL,
+    status BOOLEAN,
+    temperature INTEGER,
+    brightness INTEGER,
+    colour VARCHAR(20),
+    version INTEGER DEFAULT '0' NOT NULL,
+    type_code INTEGER DEFAULT '0' NOT NULL
+)
+"""
+
+#Same Indexes as Revision e2c4a9d1f357
+INDEXES = (
+    "CREATE INDEX ix_devices_home_type_status ON devices (home_id, type, status)",
+    "CREATE INDEX ix_devices_home_type_id ON devices (home_id, type, id)",
+    "CREATE INDEX ix_devices_home_type_code_status ON devices (home_id, type_code, status)",
+    "CREATE INDEX ix_devices_home_version ON devices (home_id, version)",
+)
+HOME = 1 #Every Query is Scoped to One Home, as the Routes' are
+
+LIGHTS = "('BasicLight', 'ColourLight')"
+WATTS_BY_NAME = ' '.join(f"WHEN '{name}' THEN {watts}" for name, watts in DEVICE_WATTAGE.items())
+WATTS_BY_CODE = ' '.join(f"WHEN {DEVICE_TYPE_CODES[name]} THEN {watts}" for name, watts in DEVICE_WATTAGE.items())
+
+#Read Versions of What the Routes, Bulk Commands and Registry Syncs Run
+QUERIES = {
+    'lights on (turn_off_lights)':
+        f"SELECT id FROM devices WHERE home_id = {HOME} AND type IN {LIGHTS} AND status = 1",
+    'locks open (max_security)':
+        f"SELECT count(id) FROM devices WHERE home_id = {HOME} AND type = 'DoorLock' AND status = 0",
+    'type page (view_type)':
+        f"SELECT * FROM devices WHERE home_id = {HOME} AND type = 'Camera' ORDER BY id LIMIT 100 OFFSET 5000",
+    'summary by type':
+        f"SELECT type, count(id), sum(status), sum(status * CASE type {WATTS_BY_NAME} ELSE 0 END) "
+        f"FROM devices WHERE home_id = {HOME} GROUP BY type",
+    'summary by type_code':
+        f"SELECT type_code, count(id), sum(status), sum(status * CASE type_code {WATTS_BY_CODE} ELSE 0 END) "
+        f"FROM devices WHERE home_id = {HOME} GROUP BY type_code",
+    'registry sync':
+        f"SELECT * FROM devices WHERE home_id = {HOME} AND version > (SELECT max(version) - 100 FROM devices)",
+}
+
+def seed(connection, count, homes):
+    names = list(DEVICE_TYPE_CODES)
+    rows = (
+        (i % homes + 1, f'{names[i % len(names)]} {i}', names[i % len(names)], i % 3 == 0, i + 1,
+         DEVICE_TYPE_CODES[names[i % len(names)]])
+        for i in range(count)
+    )
+    connection.execute(SCHEMA)
+    connection.executemany(
+        "INSERT INTO devices (home_id, name, type, status, version, type_code) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    connection.commit()
+
+def plan(connection, sql):
+    return '; '.join(row[-1] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}"))
+
+def time_query(connection, sql, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        connection.execute(sql).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def run(connection, repeat):
+    return {name: (plan(connection, sql), time_query(connection, sql, repeat)) for name, sql in QUERIES.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare devices query plans with and without the home indexes')
+    parser.add_argument('--devices', type=int, default=1_000_000)
+    parser.add_argument('--homes', type=int, default=4, help='Homes the devices are spread over')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        connection = sqlite3.connect(path)
+        start = time.perf_counter()
+        seed(connection, args.devices, args.homes)
+        print(f"Seeded {args.devices:,} devices over {args.homes} homes in {time.perf_counter() - start:.1f}s")
+
+        before = run(connection, args.repeat)
+        start = time.perf_counter()
+        for statement in INDEXES:
+            connection.execute(statement)
+        connection.execute("ANALYZE devices")
+        print(f"Built indexes in {time.perf_counter() - start:.1f}s")
+        after = run(connection, args.repeat)
+        connection.close()
+    finally:
+        os.remove(path)
+
+    print(f"{'query':<30}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in QUERIES:
+        old, new = before[name][1], after[name][1]
+        print(f"{name:<30}{old:>12.2f}{new:>12.2f}{old / new:>9.1f}x")
+    print()
+    for name in QUERIES:
+        print(f"{name}\n  before: {before[name][0]}\n  after:  {after[name][0]}")
+
+if __name__ == '__main__':
+    main()
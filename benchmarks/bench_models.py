@@ -0,0 +1,60 @@
+#Model Object Benchmark: python -m benchmarks.bench_models [--devices N]
+import argparse
+import time
+import tracemalloc
+from models import DEVICE_CLASSES, SmartDevice, SuperLight, SuperTemp, colour_from_string
+from registry import DeviceRecord
+
+TEMPERATURES = {'Thermostat': 20, 'Kettle': 80, 'Boiler': 50}
+
+#Dict-Backed Copies of Each Class, Built Through the Validating __init__ Chain
+DICT_CLASSES = {name: type(f'Dict{name}', (cls,), {'type': property(lambda self, name=name: name)}) #Keep the Type Name the Rules are Keyed by
+                for name, cls in DEVICE_CLASSES.items()}
+
+def make_rows(count):
+    names = list(DEVICE_CLASSES)
+    rows = []
+    for i in range(count):
+        device_type = names[i % len(names)]
+        rows.append(DeviceRecord(i, f'{device_type} {i}', device_type, bool(i % 2),
+                                 TEMPERATURES.get(device_type), 50, 'DEFAULT', i))
+    return rows
+
+def construct(row): #The Pre-Slots Path: Type Lookup Then Full __init__
+    cls = DICT_CLASSES[row.type]
+    if issubclass(cls, SuperLight):
+        return cls(row.name, row.brightness, colour_from_string(row.colour), row.status)
+    if issubclass(cls, SuperTemp):
+        return cls(row.name, temperature=row.temperature, status=row.status)
+    return cls(row.name, row.status)
+
+def measure(build, rows):
+    start = time.perf_counter()
+    for row in rows:
+        build(row)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(row) for row in rows]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return len(rows) / elapsed, size / len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare slotted from_db objects with dict-backed ones')
+    parser.add_argument('--devices', type=int, default=200_000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.devices)
+    results = {
+        'dict + __init__': measure(construct, rows),
+        'slots + from_db': measure(SmartDevice.from_db, rows),
+    }
+    print(f"{'variant':<18}{'objects/s':>14}{'bytes/device':>14}")
+    for variant, (rate, size) in results.items():
+        print(f"{variant:<18}{rate:>14,.0f}{size:>14.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#SQLite Write Load Test: python -m benchmarks.bench_sqlite_writes [--threads N] [--seconds S]
+#Request Threads Toggle Single Devices While a Scheduler Thread Runs Bulk Updates and Readers Page
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.exc import OperationalError
+from config import Config
+from database import Device
+from engines import apply_pragmas
+from models import DEVICE_TYPE_CODES
+
+def make_engine(path, tuned):
+    if not tuned:
+        return create_engine(f'sqlite:///{path}') #The Old Profile: Defaults Throughout
+    engine = create_engine(f'sqlite:///{path}', **Config.SQLALCHEMY_ENGINE_OPTIONS)
+    return apply_pragmas(engine, Config.SQLITE_PRAGMAS)
+
+def seed(engine, count):
+    names = list(DEVICE_TYPE_CODES)
+    Device.__table__.create(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Device), [
+            {'name': f'device {i}', 'type': names[i % len(names)], 'status': False,
+             'version': i + 1, 'type_code': DEVICE_TYPE_CODES[names[i % len(names)]]}
+            for i in range(count)
+        ])
+
+class Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.locked = 0
+        self.latencies = []
+
+    def add(self, latency=None, locked=False):
+        with self.lock:
+            if locked:
+                self.locked += 1
+            else:
+                self.writes += 1
+                self.latencies.append(latency)
+
+def request_writer(engine, devices, stop, counters):
+    while not stop.is_set():
+        device_id = random.randint(1, devices)
+        start = time.perf_counter()
+        try:
+            with engine.begin() as connection:
+                connection.execute(update(Device).where(Device.id == device_id)
+                                   .values(status=~Device.status).returning(Device.id)).all()
+        except OperationalError:
+            counters.add(locked=True)
+            continue
+        counters.add(time.perf_counter() - start)
+
+def scheduler_writer(engine, stop, counters): #A Bulk Command Every 50ms, Like a Busy Scheduler
+    while not stop.is_set():
+        try:
+            with engine.begin() as connection:
+                connection.execute(update(Device).where(Device.type.in_(('BasicLight', 'ColourLight')))
+                                   .values(status=random.random() < 0.5))
+        except OperationalError:
+            counters.add(locked=True)
+        time.sleep(0.05)
+
+def reader(engine, stop):
+    while not stop.is_set():
+        with engine.connect() as connection:
+            connection.execute(select(Device).where(Device.type == 'Camera').order_by(Device.id).limit(100)).all()
+
+def run(tuned, threads, seconds, devices):
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    os.remove(path)
+    engine = make_engine(path, tuned)
+    try:
+        seed(engine, devices)
+        counters, stop = Counters(), threading.Event()
+        workers = [threading.Thread(target=request_writer, args=(engine, devices, stop, counters))
+                   for _ in range(threads)]
+        workers.append(threading.Thread(target=scheduler_writer, args=(engine, stop, counters)))
+        workers += [threading.Thread(target=reader, args=(engine, stop)) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        time.sleep(seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+    finally:
+        engine.dispose()
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    latencies = sorted(counters.latencies) or [0.0]
+    return {
+        'writes/s': counters.writes / seconds,
+        'p50 ms': statistics.median(latencies) * 1000,
+        'p99 ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'locked': counters.locked,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare write throughput of the default and tuned SQLite profiles')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--devices', type=int, default=10_000)
+    args = parser.parse_args()
+
+    results = {
+        'default': run(False, args.threads, args.seconds, args.devices),
+        'tuned': run(True, args.threads, args.seconds, args.devices),
+    }
+    print(f"{'profile':<10}" + ''.join(f"{column:>12}" for column in results['default']))
+    for profile, result in results.items():
+        print(f"{profile:<10}" + ''.join(f"{value:>12,.1f}" for value in result.values()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#Startup Benchmark: python -m benchmarks.bench_startup [--runs N] [--devices N]
+#Each Run is a Fresh Interpreter on a Seeded Throwaway Database, Timed from Spawn to its First Request or Job
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from sqlalchemy import create_engine, insert
+from database import db, Device
+from models import DEVICE_TYPE_CODES
+
+SCENARIOS = {
+    'web: first request': 'web',
+    'cli: app loaded': 'cli',
+    'worker: first job': 'worker',
+}
+
+def seed(url, count):
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    names = list(DEVICE_TYPE_CODES)
+    with engine.begin() as connection:
+        connection.execute(insert(Device), [
+            {'name': f'device {i}', 'type': names[i % len(names)], 'status': False, 'version': i + 1,
+             'type_code': DEVICE_TYPE_CODES[names[i % len(names)]], 'temperature': None, 'brightness': 50}
+            for i in range(count)
+        ])
+    engine.dispose()
+
+#Child Process: Does One Scenario and Prints What it Loaded
+def run_web():
+    from app import create_app
+    app = create_app()
+    assert app.test_client().get('/alldevices').status_code == 200
+
+def run_cli(): #What Migrations and Import Commands Pay Before Their Own Work
+    from app import create_app
+    create_app(web=False)
+
+def run_worker():
+    from datetime import datetime, timezone
+    from apscheduler.events import EVENT_JOB_EXECUTED
+    from app import create_app
+    from worker import create_worker
+    worker = create_worker(create_app(web=False))
+    worker.add_listener(lambda event: worker.shutdown(wait=False), EVENT_JOB_EXECUTED)
+    worker.add_job('tasks:control_device', args=[1, 'on'], jobstore='local',
+                   next_run_time=datetime.now(timezone.utc))
+    worker.start()
+
+def child(scenario):
+    {'web': run_web, 'cli': run_cli, 'worker': run_worker}[scenario]()
+    print(json.dumps({
+        'modules': len(sys.modules),
+        'routes': 'routes' in sys.modules,
+        'wtforms': 'wtforms' in sys.modules,
+        'scheduler': 'apscheduler.schedulers.background' in sys.modules,
+    }))
+    sys.stdout.flush()
+    os._exit(0) #Skip Interpreter Teardown, Which is Not Startup
+
+def measure(scenario, env):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--child', scenario],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return time.perf_counter() - start, json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Time cold starts to first request and first job')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--child', choices=sorted(set(SCENARIOS.values())), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'devices.db')}"
+        seed(url, args.devices)
+        env = dict(os.environ, DATABASE_URL=url, DATABASE_SHARDS='',
+                   SCHEDULER_JOBSTORE_URL=f"sqlite:///{os.path.join(directory, 'jobs.sqlite')}",
+                   PYTHONWARNINGS='ignore')
+
+        print(f"{'scenario':<22}{'median ms':>11}{'min ms':>9}{'modules':>9}  loaded")
+        for name, scenario in SCENARIOS.items():
+            runs = [measure(scenario, env) for _ in range(args.runs)]
+            times = [elapsed * 1000 for elapsed, _ in runs]
+            loaded = runs[-1][1]
+            extras = ', '.join(part for part in ('routes', 'wtforms', 'scheduler') if loaded[part]) or '-'
+            print(f"{name:<22}{statistics.median(times):>11.0f}{min(times):>9.0f}{loaded['modules']:>9}  {extras}")
+
+if __name__ == '__main__':
+    main()
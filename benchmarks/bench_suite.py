@@ -0,0 +1,345 @@
+#Benchmark Suite: python -m benchmarks.bench_suite [--fleets 1000,100000,1000000] [--output FILE] [--compare FILE]
+#Each Fleet is Seeded into a Throwaway Database, Then Measured in Fresh Processes: Through the Flask Test
+#Client (Latency, SQL Statements per Operation, Peak RSS) and Through a Threaded Server Under Concurrent Clients
+#Results Go to a JSON File; --compare Prints the Change Against One Saved from Another Commit
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+from sqlalchemy import create_engine, event, insert
+from database import db, Device
+from models import DEVICE_TYPE_CODES
+from validation import RULES
+
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Route -> (Method, Path, Form Body); {id} Cycles Through the Fleet
+LATER = (datetime.now() + timedelta(days=365)).strftime('%Y-%m-%d %H:%M:%S') #Scheduled Jobs Never Fire
+ROUTES = {
+    'view_all': ('GET', '/alldevices', None),
+    'toggle_device': ('POST', '/toggle/{id}', None),
+    'turn_off_lights': ('POST', '/turn_off_lights', None),
+    'turn_on_lights': ('POST', '/turn_on_lights', None),
+    'lock_all_doors': ('POST', '/lock_all_doors', None),
+    'schedule': ('POST', '/schedule', {'device_id': '{id}', 'action': 'on', 'trigger': 'date',
+                                       'schedule_time': LATER}),
+}
+
+#Synthetic Fleets: Every Type in Turn, with Settings its Rule Accepts
+def device_row(i):
+    names = list(DEVICE_TYPE_CODES)
+    device_type = names[i % len(names)]
+    rule = RULES[device_type]
+    return {
+        'home_id': 1, 'name': f'{device_type} {i}', 'type': device_type, 'type_code': DEVICE_TYPE_CODES[device_type],
+        'status': i % 2 == 0, 'version': i + 1,
+        'temperature': rule.temperature[0] if rule.temperature else None,
+        'brightness': 50 if rule.brightness else None,
+        'colour': rule.colours[0] if rule.colours else None,
+    }
+
+def seed(url, count, chunk=50_000):
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for start in range(0, count, chunk):
+            connection.execute(insert(Device), [device_row(i) for i in range(start, min(count, start + chunk))])
+    engine.dispose()
+
+def device_id(i, fleet): #Spread Over the Fleet Rather Than Walking it in Order
+    return i * 7919 % fleet + 1
+
+def fill(form, i, fleet):
+    return {key: value.replace('{id}', str(device_id(i, fleet))) for key, value in form.items()} if form else None
+
+def peak_rss_mb(): #Linux Reports KiB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def summarize(latencies, elapsed, queries=None):
+    latencies = sorted(latencies)
+    result = {
+        'ops': len(latencies),
+        'ops_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3)
+        if latencies else None,
+    }
+    if queries is not None:
+        result['queries_per_op'] = round(queries / len(latencies), 2) if latencies else None
+    return result
+
+#In-Process: One Operation at a Time, so Latency and SQL Counts Belong to That Operation Alone
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+def timed(operation, requests, seconds, counter):
+    latencies = []
+    before = counter.count
+    started = time.perf_counter()
+    deadline = started + seconds
+    for i in range(requests):
+        start = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - start)
+        if time.perf_counter() > deadline and len(latencies) >= 3:
+            break #Big Fleets Stop on the Time Budget
+    result = summarize(latencies, time.perf_counter() - started, counter.count - before)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+def scheduled_burst(count, fleet, counter, timeout=120): #Jobs Due at Once, Through the Coalescing Executor
+    from apscheduler.events import EVENT_JOB_EXECUTED
+    from schedulers import schedulers
+    scheduler = schedulers.jobs
+    lags, finished = [], threading.Event()
+
+    def executed(event):
+        lags.append((datetime.now(timezone.utc) - event.scheduled_run_time).total_seconds())
+        if len(lags) >= count:
+            finished.set()
+
+    scheduler.add_listener(executed, EVENT_JOB_EXECUTED)
+    before = counter.count
+    started = time.perf_counter()
+    due = datetime.now(timezone.utc)
+    for i in range(count):
+        #Past the IDs the Routes and control_device Drove, Flipping the Seeded Status so Every Job Writes a Row
+        target = device_id(count + i, fleet)
+        action = 'off' if device_row(target - 1)['status'] else 'on'
+        scheduler.add_job('tasks:control_device', 'date', run_date=due, args=[target, action],
+                          kwargs={'home_id': 1}, id=f'bench-{i}', misfire_grace_time=None)
+    finished.wait(timeout)
+    result = summarize(lags, time.perf_counter() - started, counter.count - before)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+def run_in_process(args):
+    started = time.perf_counter()
+    from app import create_app
+    from tasks import control_device
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    results = {'startup': {'seconds': round(time.perf_counter() - started, 3), 'peak_rss_mb': peak_rss_mb()}}
+
+    counter = StatementCounter()
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'after_cursor_execute', counter)
+    client = app.test_client()
+
+    for name, (method, path, form) in ROUTES.items():
+        def call(i, method=method, path=path, form=form, name=name):
+            response = client.open(path.replace('{id}', str(device_id(i, args.fleet))), method=method,
+                                   data=fill(form, i, args.fleet))
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name} returned {response.status_code}")
+        results[name] = timed(call, args.requests, args.seconds, counter)
+
+    results['control_device'] = timed(lambda i: control_device(device_id(i, args.fleet), 'on', home_id=1),
+                                      args.requests, args.seconds, counter)
+    results['scheduled_burst'] = scheduled_burst(args.requests, args.fleet, counter)
+    return results
+
+#Over HTTP: a Threaded Server in its Own Process, Driven by Concurrent Connection-per-Request Clients
+def serve(port):
+    from werkzeug.serving import run_simple
+    from app import create_app
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    run_simple('127.0.0.1', port, app, threaded=True)
+
+async def request(port, method, path, form):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = urlencode(form).encode() if form else b''
+    head = (f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+            f"Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(payload)}\r\n\r\n")
+    writer.write(head.encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+async def drive(port, route, clients, seconds, fleet):
+    method, path, form = route
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+
+    async def client(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            i += 1
+            start = time.perf_counter()
+            try:
+                status = await request(port, method, path.replace('{id}', str(device_id(i, fleet))),
+                                       fill(form, i, fleet))
+            except OSError:
+                status = 0
+            if status >= 400 or status == 0:
+                errors.append(status)
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n * 1009) for n in range(clients)))
+    result = summarize(latencies, time.perf_counter() - started)
+    result['errors'] = len(errors)
+    return result
+
+def wait_for(port, timeout=600): #Large Fleets Take a While to Load into the Registry
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            asyncio.run(request(port, 'GET', '/', None))
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+def server_peak_rss_mb(pid): #High-Water Mark from /proc, Where There is One
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+def run_http(args, env):
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_suite', '--child', 'serve',
+                               '--port', str(args.port)], env=env, cwd=basedir,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(args.port)
+        results = {name: asyncio.run(drive(args.port, route, args.clients, args.http_seconds, args.fleet))
+                   for name, route in ROUTES.items()}
+        results['server'] = {'peak_rss_mb': server_peak_rss_mb(server.pid)}
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+#Driver
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=basedir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def child(args, env, mode): #A Fresh Interpreter per Fleet, so Peak RSS is That Fleet's
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_suite', '--child', mode,
+                             '--fleet', str(args.fleet), '--requests', str(args.requests),
+                             '--seconds', str(args.seconds)],
+                            env=env, cwd=basedir, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{output.stderr[-2000:]}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def run_fleet(args):
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'devices.db')}"
+        started = time.perf_counter()
+        seed(url, args.fleet)
+        result = {'seed_seconds': round(time.perf_counter() - started, 2)}
+        env = dict(os.environ, DATABASE_URL=url, DATABASE_SHARDS='', PYTHONWARNINGS='ignore',
+                   SCHEDULER_JOBSTORE_URL=f"sqlite:///{os.path.join(directory, 'jobs.sqlite')}",
+                   WRITE_BEHIND_DIRECTORY=os.path.join(directory, 'writes'))
+        result['in_process'] = child(args, dict(env, SCHEDULER_RUN_JOBS='1'), 'in-process')
+        if args.clients:
+            result['http'] = run_http(args, dict(env, SCHEDULER_RUN_JOBS='0'))
+        return result
+
+def report(fleet, result):
+    print(f"\n{fleet:,} devices (seeded in {result['seed_seconds']}s)")
+    print(f"{'mode':<11}{'operation':<18}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'SQL/op':>8}{'RSS MB':>9}")
+    for mode in ('in_process', 'http'):
+        for name, row in result.get(mode, {}).items():
+            if 'ops' not in row:
+                continue
+            print(f"{mode:<11}{name:<18}{row['ops_per_second']:>10,.1f}{row['p50_ms'] or 0:>10.2f}"
+                  f"{row['p99_ms'] or 0:>10.2f}{blank(row.get('queries_per_op')):>8}{blank(row.get('peak_rss_mb')):>9}")
+    if result.get('http', {}).get('server'):
+        print(f"server peak RSS {result['http']['server']['peak_rss_mb']} MB")
+
+def blank(value):
+    return '' if value is None else value
+
+def compare(baseline, results): #Percent Change per Operation, Where Both Runs Have it
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'}")
+    print(f"{'fleet':>10} {'mode':<11}{'operation':<18}{'ops/s':>10}{'p99':>10}{'SQL/op':>10}")
+    for fleet, result in results['fleets'].items():
+        for mode in ('in_process', 'http'):
+            for name, row in result.get(mode, {}).items():
+                old = baseline.get('fleets', {}).get(fleet, {}).get(mode, {}).get(name)
+                if not old or 'ops' not in row:
+                    continue
+                changes = [change(old.get(key), row.get(key)) for key in ('ops_per_second', 'p99_ms', 'queries_per_op')]
+                print(f"{int(fleet):>10,} {mode:<11}{name:<18}" + ''.join(f"{text:>10}" for text in changes))
+
+def change(old, new):
+    if not old or new is None:
+        return '-'
+    return f"{(new - old) / old * 100:+.1f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed synthetic fleets and benchmark the web and scheduler paths')
+    parser.add_argument('--fleets', default='1000,100000,1000000', help='Comma-separated device counts')
+    parser.add_argument('--requests', type=int, default=200, help='Operations per in-process scenario')
+    parser.add_argument('--seconds', type=float, default=10, help='Time budget per in-process scenario')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent HTTP clients; 0 skips the HTTP runs')
+    parser.add_argument('--http-seconds', type=float, default=5)
+    parser.add_argument('--port', type=int, default=8795)
+    parser.add_argument('--output', help='Defaults to benchmarks/results/<time>-<commit>.json')
+    parser.add_argument('--compare', help='Results file from an earlier run')
+    parser.add_argument('--child', choices=('in-process', 'serve'), help=argparse.SUPPRESS)
+    parser.add_argument('--fleet', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == 'serve':
+        return serve(args.port)
+    if args.child == 'in-process':
+        print(json.dumps(run_in_process(args)))
+        sys.stdout.flush()
+        os._exit(0) #Scheduler Threads Would Hold Up Exit
+
+    results = {
+        'commit': commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {'requests': args.requests, 'seconds': args.seconds, 'clients': args.clients,
+                     'http_seconds': args.http_seconds},
+        'fleets': {},
+    }
+    for fleet in (int(size) for size in args.fleets.split(',')):
+        args.fleet = fleet
+        results['fleets'][str(fleet)] = run_fleet(args)
+        report(fleet, results['fleets'][str(fleet)])
+
+    output = args.output or os.path.join(basedir, 'benchmarks', 'results',
+                                         f"{datetime.now():%Y%m%d-%H%M%S}-{results['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as target:
+        json.dump(results, target, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        with open(args.compare) as source:
+            compare(json.load(source), results)
+
+if __name__ == '__main__':
+    main()
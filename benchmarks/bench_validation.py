@@ -0,0 +1,47 @@
+#Validation Benchmark: python -m benchmarks.bench_validation [--rows N]
+#Checks the Same Mixed Batch One Value at a Time, Then as Whole Arrays
+import argparse
+import random
+import time
+from validation import RANGE_FIELDS, RULES, ValidationError, check, check_many
+
+def make_batch(count):
+    names = list(RULES)
+    types = [names[i % len(names)] for i in range(count)]
+    values = {field: [random.randint(-10, 120) for _ in range(count)] for field in RANGE_FIELDS}
+    return types, values
+
+def scalar(types, values): #Rows the Types Accept, via check()
+    passed = 0
+    for field in RANGE_FIELDS:
+        for device_type, value in zip(types, values[field]):
+            try:
+                check(device_type, field, value)
+                passed += 1
+            except ValidationError:
+                pass
+    return passed
+
+def vectorized(types, values):
+    return sum(int(check_many(field, types, values[field]).sum()) for field in RANGE_FIELDS)
+
+def measure(validate, types, values):
+    start = time.perf_counter()
+    passed = validate(types, values)
+    elapsed = time.perf_counter() - start
+    return len(types) * len(RANGE_FIELDS) / elapsed, passed
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-value and array validation of device settings')
+    parser.add_argument('--rows', type=int, default=500_000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    types, values = make_batch(args.rows)
+    results = {'check()': measure(scalar, types, values), 'check_many()': measure(vectorized, types, values)}
+    print(f"{'variant':<14}{'checks/s':>16}{'passed':>10}")
+    for variant, (rate, passed) in results.items():
+        print(f"{variant:<14}{rate:>16,.0f}{passed:>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+from sqlalchemy import update
+from database import db, Device, home_registry
+from registry import DeviceRecord
+from tenancy import current_home
+from telemetry import recorder
+from models import Colour, DEVICE_WATTAGE
+from validation import accepting, range_message, ranges
+from writebehind import writes
+from journal import journal
+from labels import LabelError, selector_condition
+
+#Device Groups Used by Bulk Commands, Read from the Constraint Table
+LIGHT_TYPES = tuple(ranges('brightness'))
+COLOUR_TYPES = accepting('colour', 'RED')
+TEMPERATURE_RANGES = ranges('temperature')
+
+ACTIONS = ('on', 'off', 'set_brightness', 'set_temperature', 'set_colour')
+#Fields Each Action Sets, to Journal What a Command Did
+ACTION_FIELDS = {
+    'on': ('status',),
+    'off': ('status',),
+    'set_brightness': ('brightness', 'status'),
+    'set_temperature': ('temperature',),
+    'set_colour': ('colour', 'status'),
+}
+
+#Named Groups That Scenes Can Target
+DEVICE_GROUPS = {
+    'lights': ('All Lights', LIGHT_TYPES),
+    'locks': ('All Door Locks', ('DoorLock',)),
+    'security': ('Security Devices', ('DoorLock', 'Camera')),
+    'heating': ('All Thermostats', ('Thermostat',)),
+    'all': ('All Devices', tuple(DEVICE_WATTAGE)),
+}
+
+#Error Handling
+class BulkCommandError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+def _as_int(value, action):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BulkCommandError(f"{action} needs a whole number value, got {value!r}")
+
+def _restrict(types, supported, action):
+    #Explicitly Targeted Types Must Support the Action
+    if types:
+        unsupported = [t for t in types if t not in supported]
+        if unsupported:
+            raise BulkCommandError(f"{action} is not supported for {', '.join(unsupported)}")
+    return Device.type.in_(supported)
+
+def build_command(action, value=None, types=None, ids=None, selector=None): #Validate and Build One UPDATE
+    if action not in ACTIONS:
+        raise BulkCommandError(f"Unknown action: {action}")
+    if not types and not ids and not selector:
+        raise BulkCommandError("A command needs at least one target type, device id or selector")
+    if types:
+        unknown = [t for t in types if t not in DEVICE_WATTAGE]
+        if unknown:
+            raise BulkCommandError(f"Unknown device type: {', '.join(unknown)}")
+
+    conditions = [Device.home_id == current_home()] #Never Reaches Another Home's Devices
+    if types:
+        conditions.append(Device.type.in_(types))
+    if ids:
+        conditions.append(Device.id.in_([_as_int(i, 'ids') for i in ids]))
+    if selector: #e.g. room:kitchen AND type:light
+        try:
+            conditions.append(selector_condition(selector))
+        except LabelError as error:
+            raise BulkCommandError(error.message)
+
+    if action == 'on':
+        values = {'status': True}
+    elif action == 'off':
+        values = {'status': False}
+    elif action in ('set_brightness', 'set_temperature'):
+        field = action[len('set_'):]
+        number = _as_int(value, action)
+        supported = accepting(field, number)
+        if not supported:
+            raise BulkCommandError(f"{field.capitalize()} {number} is outside the range of every device type")
+        for t in types or ():
+            if t in ranges(field) and t not in supported:
+                raise BulkCommandError(range_message(t, field))
+        conditions.append(_restrict(types, supported, action))
+        values = {field: number}
+        if field == 'brightness':
+            values['status'] = True
+    else:
+        try:
+            colour = Colour[str(value).upper()]
+        except KeyError:
+            raise BulkCommandError(f"Invalid colour: {value}")
+        conditions.append(_restrict(types, accepting('colour', colour.name), action))
+        values = {'colour': colour.name, 'status': True}
+
+    return (
+        update(Device)
+        .where(*conditions)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+def run_command(action, value=None, types=None, ids=None, selector=None): #Apply in One Transaction, Return Row Count
+    statement = build_command(action, value, types, ids, selector).returning(*Device.__table__.columns)
+    writes.flush(current_home()) #Queued Commands Land First, so This One Wins
+    try:
+        rows = db.session.execute(statement).all()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    records = [DeviceRecord.from_row(row) for row in rows]
+    home_registry().put_many(records)
+    recorder.record_many(records)
+    if records: #Every Device Got the Same Values, so the Whole Command is One Journal Row
+        journal.record([record.id for record in records],
+                       {field: getattr(records[0], field) for field in ACTION_FIELDS[action]}, action)
+    return len(records)
@@ -5,5 +5,73 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'devices.db')
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
+    #Pool Sized for a Multi-Threaded WSGI Server; Waits Rather Than Fails When Exhausted
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 10),
+        'max_overflow': 10,
+        'pool_timeout': 30,
+    }
+    DEFAULT_HOME_ID = 1 #Home Served When a Request Names None
+    #Extra Databases to Spread Homes Over, e.g. DATABASE_SHARDS=sqlite:///home2.db,sqlite:///home3.db
+    SQLALCHEMY_BINDS = {f'shard{number}': url.strip() for number, url in
+                        enumerate((os.environ.get('DATABASE_SHARDS') or '').split(','), 1) if url.strip()}
+    HOME_SHARDS = (None, *SQLALCHEMY_BINDS) #None is the Main Database
+    HOME_ROUTER = os.environ.get('HOME_ROUTER') or 'tenancy:route_home' #(home_id, shards) -> Shard
+    ASYNC_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URL') #Defaults to the Above Through aiosqlite
+    #Set on Each SQLite Connection (App and Jobstore); Empty Dict Keeps SQLite Defaults
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL', #Readers No Longer Block the Writer
+        'synchronous': 'NORMAL', #Durable at Checkpoints, Safe with WAL
+        'busy_timeout': 5000, #Milliseconds to Wait for the Write Lock
+        'cache_size': -64000, #Negative Means KiB, so About 64MB
+        'mmap_size': 268435456, #256MB of Memory-Mapped Reads
+        'temp_store': 'MEMORY',
+    } if os.environ.get('SQLITE_TUNED', '1') != '0' else {}
     SCHEDULER_API_ENABLED = True
+    SCHEDULER_JOBSTORE_URL = os.environ.get('SCHEDULER_JOBSTORE_URL') or 'sqlite:///jobs.sqlite'
+    SCHEDULER_JOBSTORE_ENGINE_OPTIONS = {'pool_size': 2, 'max_overflow': 4}
+    #Keep Jobs in the Devices Database and Reuse its Engine Instead of jobs.sqlite
+    SCHEDULER_JOBSTORE_SHARED_ENGINE = os.environ.get('SCHEDULER_JOBSTORE_SHARED_ENGINE', '0') == '1'
+    SCHEDULER_RUN_JOBS = os.environ.get('SCHEDULER_RUN_JOBS', '1') != '0' #Set to 0 When worker.py Runs Jobs
+    WORKER_POOL = os.environ.get('WORKER_POOL') or 'thread' #'thread' or 'process'
+    WORKER_MAX_WORKERS = int(os.environ.get('WORKER_MAX_WORKERS') or 10)
+    WORKER_COALESCE_WINDOW = 0.05 #Seconds Without a New Job Before a Batch Runs
+    WORKER_COALESCE_MAX_WAIT = 1.0 #Longest a Batch Stays Open
+    SCHEDULE_REFRESH_INTERVAL = 2 #Seconds Between Copies of next_run_time into the Schedules Table
+    SCHEDULES_PER_PAGE = 25
+    SCHEDULER_BATCHED_JOBS = {'tasks:control_device': 'tasks:control_devices'} #Job -> Batch Function
+    WORKER_POLL_INTERVAL = 1 #Seconds Between Checks for Jobs Added by the Web Process
+    #Devices Maximum Security Turns On; Any Selector, e.g. type:security OR tag:security
+    SECURITY_SELECTOR = os.environ.get('SECURITY_SELECTOR') or 'type:DoorLock OR type:Camera'
+    DASHBOARD_SECTION_SIZE = 25 #Rows Shown per Type on /alldevices
+    DEVICES_PER_PAGE = 100
+    API_MAX_PER_PAGE = 1000
+    INVENTORY_CHUNK_SIZE = 1000 #Rows per Import executemany and per Export Fetch
+    DEVICE_CACHE_SYNC_INTERVAL = 1.0 #Seconds Between Registry Checks for Other Workers' Writes
+    EVENTS_KEEPALIVE = 15 #Seconds Between Comments on an Idle /events Stream
+    EVENTS_SYNC_INTERVAL = 0.25 #Seconds Between Registry Syncs While /events Has Subscribers
+    #Flask /events Streams Open at Once; Each Holds a Worker Thread, so Keep This Below the Server's Thread Pool
+    #(a2wsgi's is 10 Under uvicorn). Further Streams Get 503; Under asgi.py /events is Served Without Threads
+    EVENTS_MAX_STREAMS = int(os.environ.get('EVENTS_MAX_STREAMS') or 4)
+    EVENTS_URL = '/events' #Stream the Dashboard Listens To; asgi.py Points it at /api/async/events
+    #Stack Sampling of Slow Requests; Once Enabled, POST /metrics/profiler Can Pause and Resume it
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'
+    PROFILER_INTERVAL = 0.005 #Seconds Between Samples
+    PROFILER_SLOW_SECONDS = float(os.environ.get('PROFILER_SLOW_SECONDS') or 0.5) #Slower Requests are Written Out
+    PROFILER_DIRECTORY = os.environ.get('PROFILER_DIRECTORY') or os.path.join(basedir, 'profiles')
+    #Write-Behind Device Commands: Acknowledged from Memory, Collapsed per Device, Written in Batches
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND', '0') == '1'
+    WRITE_BEHIND_INTERVAL = float(os.environ.get('WRITE_BEHIND_INTERVAL') or 1.0) #Seconds Between Flushes
+    WRITE_BEHIND_MAX_PENDING = 10000 #Devices Waiting Before a Writer Flushes Inline
+    WRITE_BEHIND_FSYNC = os.environ.get('WRITE_BEHIND_FSYNC', '1') != '0' #fsync the Log After Every Command
+    WRITE_BEHIND_DIRECTORY = os.environ.get('WRITE_BEHIND_DIRECTORY') or os.path.join(basedir, 'instance', 'writes')
+    #Append-Only Command Journal, for Auditing, Point-in-Time State and Undo of Bulk Commands
+    JOURNAL_ENABLED = os.environ.get('JOURNAL', '1') != '0'
+    JOURNAL_FLUSH_INTERVAL = 2 #Seconds Between Batched Writes
+    JOURNAL_SNAPSHOT_INTERVAL = 3600 #Seconds Between Snapshots, Taken Only Where Commands Were Recorded
+    JOURNAL_SNAPSHOT_LAG = 60 #Seconds Behind Now a Snapshot Stops, Leaving Time for Other Processes' Buffers
+    JOURNAL_RETENTION_DAYS = 90 #History Older Than This is Replaced by the Snapshot Before it
+    TELEMETRY_FLUSH_INTERVAL = 5 #Seconds
+    TELEMETRY_ACCRUAL_LAG = 15 #Seconds Behind Now That Devices Left On are Credited, Leaving Time for Buffered Samples
+    TELEMETRY_RETENTION_DAYS = {'raw': 7, 'minute': 2, 'hour': 90, 'day': 3650}
     
@@ -1,38 +1,303 @@
+import time
+from collections import namedtuple
+from flask import abort, current_app
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import case, column, delete, func, select, table, update
+from models import DEVICE_TYPE_CODES, DEVICE_TYPE_NAMES, DEVICE_WATTAGE
+from registry import DeviceRecord, registries
+from tenancy import current_home, shard_for
+from writebehind import writes
+from journal import journal, state_of
 
-db = SQLAlchemy()
+#Sends Every Statement to the Database Holding the Current Home, Unless a bind is Given
+class ShardSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            shard = shard_for(current_home())
+            if shard is not None:
+                return self._db.engines[shard]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': ShardSession})
+
+def shard_engines(): #Every Database Homes Live In, for Work Spanning All Homes
+    return [db.engines[shard] for shard in current_app.config['HOME_SHARDS']]
+
+#Global Change Sequence, Shared by Every Worker Using the Same Database
+NEXT_VERSION = select(func.coalesce(func.max(column('version')), 0) + 1) \
+    .select_from(table('devices')).scalar_subquery()
 
 class Device(db.Model):
     __tablename__ = "devices"
     id = db.Column(db.Integer, primary_key=True)
+    home_id = db.Column(db.Integer, nullable=False, server_default='1', default=current_home)
     name = db.Column(db.String(80), nullable=False)
     type = db.Column(db.String(20), nullable=False)
     status = db.Column(db.Boolean, default=False)
     temperature = db.Column(db.Integer, nullable=True)
     brightness = db.Column(db.Integer, nullable=True)
     colour = db.Column(db.String(20), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=NEXT_VERSION, onupdate=NEXT_VERSION,
+                        server_default='0', index=True)
+    #Integer Copy of type for Grouping, Filled from the Inserted type
+    type_code = db.Column(db.Integer, nullable=False, server_default='0',
+                          default=lambda context: DEVICE_TYPE_CODES.get(context.get_current_parameters()['type'], 0))
+
+    #Every Query is Scoped to One Home, so Each Index Leads with home_id
+    __table_args__ = (
+        db.Index('ix_devices_home_type_status', 'home_id', 'type', 'status'), #Bulk Commands by Type
+        db.Index('ix_devices_home_type_id', 'home_id', 'type', 'id'), #Per-Type Pages in ID Order
+        db.Index('ix_devices_home_type_code_status', 'home_id', 'type_code', 'status'), #Covers the Type Summary
+        db.Index('ix_devices_home_version', 'home_id', 'version'), #Registry Syncs
+        db.Index('ix_devices_home_id', 'home_id', 'id'), #API Pages in ID Order
+    )
 
     def toggle_status(self): #To Turn On and Off
         self.status = not self.status
 
-def get_all_devices(): #Retrieve All Devices
-        return Device.query.all()    
+#Scheduled Task Metadata, One Row per APScheduler Job
+class Schedule(db.Model):
+    __tablename__ = "schedules"
+    id = db.Column(db.Integer, primary_key=True)
+    home_id = db.Column(db.Integer, nullable=False, server_default='1', default=current_home)
+    job_id = db.Column(db.String(64), nullable=False, unique=True)
+    device_id = db.Column(db.Integer, nullable=True) #Null for Scene Jobs
+    device_group = db.Column(db.String(20), nullable=True)
+    action = db.Column(db.String(20), nullable=False)
+    value = db.Column(db.String(20), nullable=True)
+    trigger = db.Column(db.String(10), nullable=False, default='date')
+    trigger_spec = db.Column(db.String(64), nullable=True) #Minutes or Cron Expression
+    next_run_at = db.Column(db.DateTime, nullable=True)
+    selector = db.Column(db.String(255), nullable=True) #For Jobs Driving the Devices a Selector Matches
+
+    __table_args__ = (
+        db.Index('ix_schedules_home_next_run', 'home_id', 'next_run_at'),
+        db.Index('ix_schedules_home_device_next_run', 'home_id', 'device_id', 'next_run_at'),
+        db.Index('ix_schedules_home_action_next_run', 'home_id', 'action', 'next_run_at'),
+    )
 
-def get_device_by_id(device_id): #Query Database for a Device
-    return Device.query.get(device_id)
+    @property
+    def repeat(self): #Matches tasks.describe_trigger
+        if self.trigger == 'interval':
+            return f"Every {self.trigger_spec} Minutes"
+        if self.trigger == 'cron':
+            return f"Cron: {self.trigger_spec}"
+        return "Once"
 
-def save_device(device_id, device): #Saving Device Changes
-    db_device = Device.query.get(device_id)
-    if not db_device:
+#Rooms, Floors and Tags; the Primary Key Leads with What a Selector Looks Up, so it Holds the Rows Too
+class DeviceLabel(db.Model):
+    __tablename__ = "device_labels"
+    home_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    kind = db.Column(db.String(5), primary_key=True) #'room', 'floor' or 'tag'
+    name = db.Column(db.String(40), primary_key=True) #Lower Case
+    device_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    __table_args__ = (
+        db.Index('ix_device_labels_home_device', 'home_id', 'device_id'), #A Device's Labels, and Deletes
+        {'sqlite_with_rowid': False},
+    )
+
+#Append-Only Energy Samples, One per Device State Change
+class EnergySample(db.Model):
+    __tablename__ = "energy_samples"
+    id = db.Column(db.Integer, primary_key=True)
+    home_id = db.Column(db.Integer, nullable=False, server_default='1')
+    device_id = db.Column(db.Integer, nullable=False, index=True)
+    device_type = db.Column(db.String(20), nullable=False)
+    recorded_at = db.Column(db.DateTime, nullable=False, index=True)
+    status = db.Column(db.Boolean, nullable=False)
+    watts = db.Column(db.Integer, nullable=False)
+    energy_wh = db.Column(db.Float, nullable=False, default=0.0) #Used Since the Device's Previous Sample
+
+#Energy Totals per Minute, Hour and Day Bucket
+class EnergyRollup(db.Model):
+    __tablename__ = "energy_rollups"
+    home_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    resolution = db.Column(db.String(6), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    device_type = db.Column(db.String(20), primary_key=True)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    energy_wh = db.Column(db.Float, nullable=False, default=0.0)
+
+#Each Device's Open Interval: Watts Drawn Since its Latest Sample, and How Far That Energy is Credited
+class EnergyMeter(db.Model):
+    __tablename__ = "energy_meters"
+    home_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    device_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    device_type = db.Column(db.String(20), nullable=False)
+    watts = db.Column(db.Integer, nullable=False)
+    since = db.Column(db.DateTime, nullable=False) #Time of the Latest Sample
+    accrued_to = db.Column(db.DateTime, nullable=False) #Energy Before This is in the Rollups
+
+    __table_args__ = ({'sqlite_with_rowid': False},)
+
+#Append-Only Journal of Device Commands; Devices Given the Same Values by One Command Share a Row
+class DeviceCommand(db.Model):
+    __tablename__ = "device_commands"
+    id = db.Column(db.Integer, primary_key=True) #Journal Position
+    home_id = db.Column(db.Integer, nullable=False, server_default='1')
+    recorded_at = db.Column(db.DateTime, nullable=False)
+    source = db.Column(db.String(10), nullable=False) #'route', 'job', 'import' or 'undo'
+    action = db.Column(db.String(20), nullable=False)
+    device_ids = db.Column(db.Text, nullable=False) #JSON List
+    changes = db.Column(db.Text, nullable=False) #JSON Values Given to Every Device; a List for 'add'
+    undoes = db.Column(db.Integer, nullable=True) #Command This One Reverted
+
+    __table_args__ = (
+        db.Index('ix_device_commands_home_id', 'home_id', 'id'),
+        db.Index('ix_device_commands_home_recorded_at', 'home_id', 'recorded_at'),
+        db.Index('ix_device_commands_home_undoes', 'home_id', 'undoes'),
+    )
+
+#Every Device's State at a Journal Position, Replayed Forward from to Rebuild Later States
+class DeviceSnapshot(db.Model):
+    __tablename__ = "device_snapshots"
+    id = db.Column(db.Integer, primary_key=True)
+    home_id = db.Column(db.Integer, nullable=False, server_default='1')
+    command_id = db.Column(db.Integer, nullable=False) #Commands Up to This One are Included
+    command_at = db.Column(db.DateTime, nullable=True) #Its recorded_at, for Journal Order; None at Position 0
+    taken_at = db.Column(db.DateTime, nullable=False)
+    devices = db.Column(db.Integer, nullable=False)
+    state = db.Column(db.LargeBinary, nullable=False) #zlib-Compressed JSON
+
+    __table_args__ = (
+        db.Index('ix_device_snapshots_home_command', 'home_id', 'command_id'),
+    )
+
+#Device Registry Loading, One Home at a Time
+def home_registry():
+    return registries[current_home()]
+
+def home_devices(): #Devices Table Rows of the Current Home
+    return select(Device).where(Device.home_id == current_home())
+
+def load_devices(): #Fill the Home's Registry from the Devices Table
+    registry = home_registry()
+    registry.replace(db.session.execute(home_devices()).scalars())
+    registry.synced_at = time.monotonic()
+    journal.ensure_base(registry) #Once per Home, Before This Process Changes Anything
+    writes.overlay(registry) #Commands Still Waiting to be Written
+
+def sync_devices(force=False): #Pick Up Rows Changed by Other Workers
+    registry = home_registry()
+    if not registry.loaded:
+        load_devices()
+        return
+    now = time.monotonic()
+    if not force and now - registry.synced_at < current_app.config['DEVICE_CACHE_SYNC_INTERVAL']:
+        return
+    registry.synced_at = now
+    changed = db.session.execute(
+        home_devices().where(Device.version > registry.high_water)
+    ).scalars().all()
+    registry.merge(changed)
+    count = db.session.execute(
+        select(func.count(Device.id)).where(Device.home_id == current_home())).scalar()
+    if count != len(registry):
+        load_devices() #Rows Were Deleted Elsewhere
+
+def get_all_devices(): #Retrieve All of the Home's Devices
+    sync_devices()
+    return sorted(home_registry().values(), key=lambda d: d.id)
+
+TypeSummary = namedtuple('TypeSummary', 'type count on_count energy')
+
+def get_type_summary(where=None): #Per-Type Counts and Energy in One Grouped Query, of Devices Matching where
+    on = case((Device.status, 1), else_=0)
+    watts = case({code: DEVICE_WATTAGE[name] for name, code in DEVICE_TYPE_CODES.items()},
+                 value=Device.type_code, else_=0)
+    query = select(
+        Device.type_code,
+        func.count(Device.id).label("count"),
+        func.sum(on).label("on_count"),
+        func.sum(on * watts).label("energy"),
+    ).where(Device.home_id == current_home())
+    if where is not None:
+        query = query.where(where)
+    rows = db.session.execute(query.group_by(Device.type_code)).all()
+    summaries = [TypeSummary(DEVICE_TYPE_NAMES[row.type_code], row.count, row.on_count, row.energy)
+                 for row in rows if row.type_code in DEVICE_TYPE_NAMES]
+    return sorted(summaries, key=lambda summary: summary.type)
+
+def get_devices_page(device_type, page=1, per_page=50, count=True, where=None): #One Page of a Single Type
+    query = home_devices().filter_by(type=device_type)
+    if where is not None:
+        query = query.where(where)
+    return db.paginate(
+        query.order_by(Device.id),
+        page=page, per_page=per_page, error_out=False, count=count
+    )
+
+def get_schedules_page(device_id=None, action=None, start=None, end=None, page=1, per_page=50):
+    query = select(Schedule).filter_by(home_id=current_home())
+    if device_id is not None:
+        query = query.filter_by(device_id=device_id)
+    if action:
+        query = query.filter_by(action=action)
+    if start:
+        query = query.where(Schedule.next_run_at >= start)
+    if end:
+        query = query.where(Schedule.next_run_at < end)
+    query = query.order_by(Schedule.next_run_at.is_(None), Schedule.next_run_at, Schedule.id)
+    return db.paginate(query, page=page, per_page=per_page, error_out=False)
+
+def get_device_by_id(device_id): #Served from the Home's Registry, so Other Homes' IDs are Not Found
+    sync_devices()
+    return home_registry().get(int(device_id))
+
+def get_device_or_404(device_id):
+    device = get_device_by_id(device_id)
+    if device is None:
+        abort(404)
+    return device
+
+def add_device_row(**values): #Insert and Write Through
+    device = Device(**values)
+    db.session.add(device)
+    db.session.commit()
+    record = DeviceRecord.from_row(device)
+    home_registry().put(record)
+    journal.record([record.id], [state_of(record)], 'add')
+    return device
+
+def update_device(device_id, **values): #Single UPDATE, Written Through to the Registry
+    if writes.enabled: #Or Acknowledged Now and Written with the Next Flush
+        record = writes.submit(current_home(), int(device_id), values)
+        if record is None:
+            raise ValueError(f"No device found in DB with ID {device_id}")
+        journal.record([record.id], values)
+        return record
+    row = db.session.execute(
+        update(Device).where(Device.id == int(device_id), Device.home_id == current_home())
+        .values(**values).returning(Device)
+    ).scalar_one_or_none()
+    if row is None:
+        db.session.rollback()
         raise ValueError(f"No device found in DB with ID {device_id}")
+    record = DeviceRecord.from_row(row)
+    db.session.commit()
+    home_registry().put(record)
+    journal.record([record.id], values)
+    return record
 
-    db_device.status = device.is_on
+def delete_device_row(device_id):
+    db.session.execute(delete(Device).where(Device.id == int(device_id), Device.home_id == current_home()))
+    db.session.execute(delete(DeviceLabel).where(DeviceLabel.home_id == current_home(),
+                                                 DeviceLabel.device_id == int(device_id)))
+    db.session.execute(delete(EnergyMeter).where(EnergyMeter.home_id == current_home(),
+                                                 EnergyMeter.device_id == int(device_id)))
+    db.session.commit()
+    home_registry().discard(int(device_id))
+    journal.record([int(device_id)], {}, 'delete')
+
+def save_device(device_id, device): #Saving Device Changes
+    values = {'status': device.is_on}
     if hasattr(device, "temperature"):
-        db_device.temperature = device.temperature
+        values['temperature'] = device.temperature
     if hasattr(device, "brightness"):
-        db_device.brightness = device.brightness
+        values['brightness'] = device.brightness
     if hasattr(device, "colour") and device.colour:
-        db_device.colour = device.colour.name
-
-    db.session.commit()
+        values['colour'] = device.colour.name
+    return update_device(device_id, **values)
 
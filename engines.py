@@ -0,0 +1,22 @@
+from sqlalchemy import create_engine, event
+
+#Applied to Every New SQLite Connection; Ignored for Other Databases
+def apply_pragmas(engine, pragmas):
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return engine
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
+
+def jobstore_engine(app, db): #Engine for the APScheduler Jobstore
+    if app.config['SCHEDULER_JOBSTORE_SHARED_ENGINE']:
+        with app.app_context():
+            return db.engine #Jobs Table Lives in the Devices Database, One Pool for Both
+    engine = create_engine(app.config['SCHEDULER_JOBSTORE_URL'], **app.config['SCHEDULER_JOBSTORE_ENGINE_OPTIONS'])
+    return apply_pragmas(engine, app.config['SQLITE_PRAGMAS'])
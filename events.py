@@ -0,0 +1,131 @@
+import asyncio
+import json
+import queue
+import threading
+from collections import deque
+from registry import registries
+
+#One Subscriber's Pending Events; a Slow Reader Overflows and is Told to Reload
+class Subscription:
+    def __init__(self, maxsize, home_id):
+        self._queue = queue.Queue(maxsize)
+        self.home_id = home_id
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        if self.overflowed:
+            self.overflowed = False
+            return reset_event()
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+#The Same for an asyncio Reader, Fed from Whichever Thread Publishes
+class AsyncSubscription:
+    def __init__(self, maxsize, home_id, loop):
+        self._queue = asyncio.Queue(maxsize)
+        self.home_id = home_id
+        self._loop = loop
+        self.overflowed = False
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def put(self, event):
+        self._loop.call_soon_threadsafe(self._put, event)
+
+    async def get(self, timeout):
+        if self.overflowed:
+            self.overflowed = False
+            return reset_event()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+def reset_event(): #Tells the Client to Refetch /api/devices
+    return (None, 'reset', '{}')
+
+#Fans Registry Deltas Out to the Home's Subscribers, No Query per Subscriber
+class EventHub:
+    def __init__(self, backlog=1000, queue_size=256):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._backlog = deque(maxlen=backlog) #Recent (Home, Event) Pairs, for Last-Event-ID Resumes
+        self._queue_size = queue_size
+        self._threaded = 0 #Subscribers Each Holding a Worker Thread
+        self.sequence = 0 #Shared by Every Home, so a Home's Stream Skips Numbers
+
+    def publish(self, home_id, deltas): #Registry Listener
+        if deltas is None:
+            event_name, data = 'reset', '{}'
+        else:
+            event_name, data = 'devices', json.dumps(deltas, separators=(',', ':'))
+        with self._lock:
+            self.sequence += 1
+            event = (self.sequence, event_name, data)
+            self._backlog.append((home_id, event))
+            subscribers = [subscription for subscription in self._subscribers if subscription.home_id == home_id]
+        for subscription in subscribers:
+            subscription.put(event)
+
+    #Pass the Running loop for an asyncio Reader; Returns None When limit Threaded Readers Already Listen
+    def subscribe(self, home_id, last_event_id=None, loop=None, limit=None):
+        if loop is None:
+            subscription = Subscription(self._queue_size, home_id)
+        else:
+            subscription = AsyncSubscription(self._queue_size, home_id, loop)
+        with self._lock:
+            if loop is None:
+                if limit is not None and self._threaded >= limit:
+                    return None
+                self._threaded += 1
+            if last_event_id is not None:
+                oldest = self._backlog[0][1][0] if self._backlog else self.sequence + 1
+                if last_event_id > self.sequence or oldest > last_event_id + 1:
+                    missed = [reset_event()] #Too Far Behind for the Backlog, or From Before a Restart
+                else:
+                    missed = [event for home, event in self._backlog if home == home_id and event[0] > last_event_id]
+                for event in missed:
+                    subscription.put(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers and isinstance(subscription, Subscription):
+                self._threaded -= 1
+            self._subscribers.discard(subscription)
+
+    def homes(self): #Homes Someone is Listening To
+        with self._lock:
+            return {subscription.home_id for subscription in self._subscribers}
+
+    def __len__(self):
+        return len(self._subscribers)
+
+def format_event(event): #Server-Sent Events Wire Format
+    if event is None:
+        return ': ping\n\n' #Keeps Proxies from Closing an Idle Stream
+    sequence, name, data = event
+    lines = f"id: {sequence}\n" if sequence is not None else ''
+    return f"{lines}event: {name}\ndata: {data}\n\n"
+
+def last_event_id(header):
+    try:
+        return int(header) if header else None
+    except ValueError:
+        return None
+
+hub = EventHub()
+registries.subscribe(hub.publish)
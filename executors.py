@@ -0,0 +1,130 @@
+import concurrent.futures
+import multiprocessing
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from traceback import format_tb
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED, JobExecutionEvent
+from apscheduler.executors.base import BaseExecutor, run_job
+from apscheduler.util import ref_to_obj
+from metrics import job_lag, job_seconds
+
+def make_pool(kind, max_workers): #Thread or Process Pool for Running Jobs
+    if kind == 'process':
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers, mp_context=multiprocessing.get_context('spawn'))
+    if kind == 'thread':
+        return concurrent.futures.ThreadPoolExecutor(max_workers)
+    raise ValueError(f"Unknown worker pool: {kind}")
+
+#Gathers Jobs That Fire Together and Runs Them as One Batch Call
+class CoalescingExecutor(BaseExecutor):
+    #batch_funcs Maps a Job's func_ref to a Function Taking a List of its Args
+    #Jobs with Different kwargs Batch Separately, and the kwargs are Passed to the Batch Call
+    #A Batch Closes Once No Job Arrives for `window` Seconds, or After `max_wait`
+    def __init__(self, pool, batch_funcs, window=0.05, max_wait=1.0):
+        super().__init__()
+        self._pool = pool
+        self._batch_refs = dict(batch_funcs)
+        self._batch_funcs = {}
+        self._window = window
+        self._max_wait = max_wait
+        self._pending = {}
+        self._timer = None
+        self._opened_at = self._last_at = 0.0
+
+    def _do_submit_job(self, job, run_times):
+        if job.func_ref not in self._batch_refs:
+            self._submit_single(job, run_times)
+            return
+        key = (job.func_ref, tuple(sorted(job.kwargs.items())))
+        self._pending.setdefault(key, []).append((job, run_times))
+        self._last_at = time.monotonic()
+        if self._timer is None:
+            self._opened_at = self._last_at
+            self._start_timer(self._window)
+
+    def _start_timer(self, delay):
+        self._timer = threading.Timer(delay, self._flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _handed_off(self, func_ref, run_times): #Lag of Each Run Time, and When the Pool Got the Work
+        now = datetime.now(timezone.utc)
+        for run_time in run_times:
+            job_lag.observe(max((now - run_time).total_seconds(), 0.0), func_ref)
+        return time.perf_counter()
+
+    def _submit_single(self, job, run_times):
+        started = self._handed_off(job.func_ref, run_times)
+
+        def callback(future):
+            job_seconds.observe(time.perf_counter() - started, job.func_ref)
+            if future.exception():
+                self._run_job_error(job.id, future.exception(), future.exception().__traceback__)
+            else:
+                self._run_job_success(job.id, future.result())
+
+        future = self._pool.submit(run_job, job, job._jobstore_alias, run_times, self._logger.name)
+        future.add_done_callback(callback)
+
+    def _flush(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            quiet = now - self._last_at
+            if not force and quiet < self._window and now - self._opened_at < self._max_wait:
+                self._start_timer(self._window - quiet) #Jobs Still Arriving
+                return
+            pending, self._pending = self._pending, {}
+            self._timer = None
+        for (func_ref, kwargs), entries in pending.items():
+            self._submit_batch(func_ref, dict(kwargs), entries)
+
+    def _submit_batch(self, func_ref, kwargs, entries):
+        now = datetime.now(timezone.utc)
+        batch_args = []
+        outcomes = [] #(Job, Due Run Times, Events) per Submission
+        for job, run_times in entries:
+            due, events = [], []
+            for run_time in run_times:
+                grace = job.misfire_grace_time
+                if grace is not None and now - run_time > timedelta(seconds=grace):
+                    events.append(JobExecutionEvent(EVENT_JOB_MISSED, job.id, job._jobstore_alias, run_time))
+                    self._logger.warning('Run time of job "%s" was missed by %s', job, now - run_time)
+                else:
+                    due.append(run_time)
+                    batch_args.append(list(job.args))
+            outcomes.append((job, due, events))
+
+        started = self._handed_off(func_ref, [run_time for _, due, _ in outcomes for run_time in due])
+
+        def finish(exc=None):
+            if batch_args:
+                job_seconds.observe(time.perf_counter() - started, func_ref)
+            if exc is not None:
+                self._logger.error('Batch of %d "%s" jobs failed', len(batch_args), func_ref,
+                                   exc_info=(exc.__class__, exc, exc.__traceback__))
+            for job, due, events in outcomes:
+                for run_time in due:
+                    if exc is None:
+                        events.append(JobExecutionEvent(EVENT_JOB_EXECUTED, job.id, job._jobstore_alias, run_time))
+                    else:
+                        events.append(JobExecutionEvent(
+                            EVENT_JOB_ERROR, job.id, job._jobstore_alias, run_time,
+                            exception=exc, traceback=''.join(format_tb(exc.__traceback__))))
+                self._run_job_success(job.id, events)
+
+        if not batch_args:
+            finish()
+            return
+        if func_ref not in self._batch_funcs:
+            self._batch_funcs[func_ref] = ref_to_obj(self._batch_refs[func_ref])
+        self._logger.info('Running %d "%s" jobs as one batch', len(batch_args), func_ref)
+        future = self._pool.submit(self._batch_funcs[func_ref], batch_args, **kwargs)
+        future.add_done_callback(lambda done: finish(done.exception()))
+
+    def shutdown(self, wait=True):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._flush(force=True)
+        self._pool.shutdown(wait)
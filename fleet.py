@@ -0,0 +1,104 @@
+from collections import namedtuple
+import numpy as np
+
+FleetRow = namedtuple('FleetRow', 'name type status temperature brightness colour')
+
+NO_VALUE = -1 #Stored When a Device Has No Temperature, Brightness or Colour
+
+#Columnar Device State: One NumPy Array per Field, Indexed by Position
+class FleetStore:
+    COLUMNS = ('type_code', 'status', 'temperature', 'brightness', 'colour')
+
+    #type_codes is {Type Name: Code}, the Same Codes Stored in devices.type_code; wattages is {Type Name: Watts}
+    def __init__(self, type_codes, wattages, colour_names, capacity=1024):
+        self.type_codes = dict(type_codes)
+        self.type_names = [None] * (max(self.type_codes.values()) + 1) #Code -> Name; Unused Codes are None
+        for name, code in self.type_codes.items():
+            self.type_names[code] = name
+        self.colour_names = tuple(colour_names)
+        self.colour_codes = {name: code for code, name in enumerate(self.colour_names)}
+        self._wattage = np.zeros(len(self.type_names), dtype=np.int64)
+        for name, code in self.type_codes.items():
+            self._wattage[code] = wattages[name]
+
+        self.size = 0
+        self.names = []
+        self.index = {} #Name -> Position
+        self.type_code = np.zeros(capacity, dtype=np.int8)
+        self.status = np.zeros(capacity, dtype=bool)
+        self.temperature = np.full(capacity, NO_VALUE, dtype=np.int16)
+        self.brightness = np.full(capacity, NO_VALUE, dtype=np.int16)
+        self.colour = np.full(capacity, NO_VALUE, dtype=np.int8)
+
+    def _grow(self):
+        for column in self.COLUMNS:
+            old = getattr(self, column)
+            new = np.empty(len(old) * 2, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, column, new)
+
+    def append(self, name, type_name, status=False, temperature=None, brightness=None, colour=None):
+        if name in self.index:
+            raise ValueError(f"A device named {name} is already in the system")
+        if self.size == len(self.status):
+            self._grow()
+        i = self.size
+        self.type_code[i] = self.type_codes[type_name]
+        self.status[i] = status
+        self.temperature[i] = NO_VALUE if temperature is None else temperature
+        self.brightness[i] = NO_VALUE if brightness is None else brightness
+        self.colour[i] = self.colour_codes.get(colour, NO_VALUE)
+        self.names.append(name)
+        self.index[name] = i
+        self.size += 1
+
+    #Swap the Last Device into the Gap, So Removal is O(1)
+    def remove(self, name):
+        i = self.index.pop(name, None)
+        if i is None:
+            return False
+        last = self.size - 1
+        if i != last:
+            for column in self.COLUMNS:
+                array = getattr(self, column)
+                array[i] = array[last]
+            moved = self.names[last]
+            self.names[i] = moved
+            self.index[moved] = i
+        self.names.pop()
+        self.size = last
+        return True
+
+    def row(self, name):
+        i = self.index[name]
+        temperature = int(self.temperature[i])
+        brightness = int(self.brightness[i])
+        colour = int(self.colour[i])
+        return FleetRow(
+            name,
+            self.type_names[self.type_code[i]],
+            bool(self.status[i]),
+            None if temperature == NO_VALUE else temperature,
+            None if brightness == NO_VALUE else brightness,
+            None if colour == NO_VALUE else self.colour_names[colour],
+        )
+
+    #Vectorised Fleet Operations
+    def set_all_status(self, status):
+        self.status[:self.size] = status
+
+    def energy_per_device(self):
+        n = self.size
+        return self._wattage[self.type_code[:n]] * self.status[:n]
+
+    def total_energy(self):
+        return int(self.energy_per_device().sum())
+
+    def energy_by_type(self):
+        totals = np.bincount(self.type_code[:self.size], weights=self.energy_per_device(),
+                             minlength=len(self.type_names))
+        return {name: int(totals[code]) for name, code in self.type_codes.items()}
+
+    def count_by_type(self):
+        counts = np.bincount(self.type_code[:self.size], minlength=len(self.type_names))
+        return {name: int(counts[code]) for name, code in self.type_codes.items()}
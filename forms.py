@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, SelectField, IntegerField, SubmitField, DateTimeField
-from wtforms.validators import DataRequired, Optional
+from wtforms.validators import DataRequired, Length, Optional
 from models import Colour
 
 class AddDeviceForm(FlaskForm):
@@ -24,9 +24,14 @@ class UpdateNameForm(FlaskForm):
     submit = SubmitField('Change Name')
 
 class ScheduleForm(FlaskForm):
-    device_id = SelectField('Device', choices=[], validators=[DataRequired()])
+    target = SelectField('Device or Group', choices=[], default='device', validators=[DataRequired()])
+    device_id = IntegerField('Device ID (for one device)', validators=[Optional()])
     action = SelectField('Action', choices=[('on', 'Turn On'), ('off', 'Turn Off'), ('set_brightness', 'Set Brightness'), ('set_temperature', 'Set Temperature'), ('set_colour', 'Set Colour')], validators=[DataRequired()])
     value = IntegerField('Value (for temperature or brightness)', validators=[Optional()])
     colour = SelectField('Set Colour (if applicable)', choices=[(c.name, c.value.title()) for c in Colour], validators=[Optional()])
-    schedule_time = DateTimeField('Schedule Time', format='%Y-%m-%d %H:%M:%S', validators=[DataRequired()])
+    trigger = SelectField('Repeat', choices=[('date', 'Once'), ('interval', 'Every N Minutes'), ('cron', 'Cron Schedule')], default='date')
+    schedule_time = DateTimeField('Schedule Time (start time if repeating)', format='%Y-%m-%d %H:%M:%S', validators=[Optional()])
+    interval_minutes = IntegerField('Every N Minutes', validators=[Optional()])
+    cron = StringField('Cron Expression (minute hour day month weekday)', validators=[Optional()])
+    selector = StringField('Selector (e.g. room:kitchen AND type:light)', validators=[Optional(), Length(max=255)])
     submit = SubmitField('Schedule Task')
\ No newline at end of file
@@ -0,0 +1,28 @@
+import threading
+from markupsafe import Markup
+
+#Rendered HTML per Key, Reused Until the Version Passed With it Changes
+class FragmentCache:
+    def __init__(self):
+        self._fragments = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    #Read version Before Rendering, so a Change Made Mid-Render Misses Next Time
+    def get(self, key, version, render):
+        cached = self._fragments.get(key)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        html = Markup(render())
+        with self._lock:
+            self._fragments[key] = (version, html)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._fragments = {}
+
+sections = FragmentCache() #One Entry per Device Type on /alldevices
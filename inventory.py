@@ -0,0 +1,225 @@
+import csv
+import io
+import json
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select
+from database import db, Device, load_devices
+from journal import journal, state_of, using_source
+from models import DEVICE_CLASSES, DEVICE_TYPE_CODES, SuperLight, SuperTemp
+from tenancy import current_home, shard_for, using_home
+from validation import RANGE_FIELDS, ValidationError, check, range_message, rejected
+
+FIELDS = ('id', 'name', 'type', 'status', 'temperature', 'brightness', 'colour', 'version')
+FORMATS = ('csv', 'ndjson')
+TRUE_TEXT = ('1', 'true', 'yes', 'on')
+FALSE_TEXT = ('', '0', 'false', 'no', 'off')
+
+#Error Handling
+class InventoryError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+def detect_format(filename=None, mimetype=None, requested=None):
+    if requested:
+        if requested not in FORMATS:
+            raise InventoryError(f"Unknown format: {requested}. Use csv or ndjson")
+        return requested
+    if (filename or '').endswith(('.ndjson', '.jsonl')) or 'ndjson' in (mimetype or ''):
+        return 'ndjson'
+    return 'csv'
+
+#Parsing: Both Yield (Line Number, Dict) One Row at a Time
+def parse_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+def parse_ndjson(stream):
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, InventoryError(f"Invalid JSON: {error}")
+            continue
+        yield line_number, row if isinstance(row, dict) else InventoryError("Each line must be a JSON object")
+
+def _whole_number(value, field):
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InventoryError(f"{field} must be a whole number, got {value!r}")
+
+def _status(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value if value is not None else '').strip().lower()
+    if text in TRUE_TEXT:
+        return True
+    if text in FALSE_TEXT:
+        return False
+    raise InventoryError(f"status must be true or false, got {value!r}")
+
+def validate_row(row): #Column Values for One Device; Ranges are Checked a Chunk at a Time by out_of_range
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise InventoryError("name is required")
+    if len(name) > 80:
+        raise InventoryError("name must be at most 80 characters")
+    device_type = str(row.get('type') or '').strip()
+    device_class = DEVICE_CLASSES.get(device_type)
+    if device_class is None:
+        raise InventoryError(f"Unknown device type: {device_type!r}")
+
+    values = {'name': name, 'type': device_type, 'type_code': DEVICE_TYPE_CODES[device_type],
+              'status': _status(row.get('status')), 'temperature': None, 'brightness': None, 'colour': None}
+
+    temperature = _whole_number(row.get('temperature'), 'temperature')
+    if issubclass(device_class, SuperTemp):
+        values['temperature'] = device_class.DEFAULT_TEMPERATURE if temperature is None else temperature
+
+    brightness = _whole_number(row.get('brightness'), 'brightness')
+    colour = str(row.get('colour') or '').strip()
+    if issubclass(device_class, SuperLight):
+        values['brightness'] = device_class.DEFAULT_BRIGHTNESS if brightness is None else brightness
+        if colour:
+            try:
+                values['colour'] = check(device_type, 'colour', colour)
+            except ValidationError as error:
+                raise InventoryError(error.message)
+    return values #Fields the Type Does Not Have are Dropped, as the Add Form Fills Them
+
+def out_of_range(chunk): #{Index: Message} for Rows Breaking a Range, One Array Pass per Field
+    types = [values['type'] for values in chunk]
+    failures = {}
+    for field in RANGE_FIELDS:
+        for index in rejected(field, types, [values[field] for values in chunk]):
+            failures.setdefault(int(index), range_message(types[index], field))
+    return failures
+
+#Import Outcome; Only the First Few Errors are Kept
+class ImportResult:
+    MAX_ERRORS = 100
+
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+
+    def reject(self, line_number, error):
+        self.skipped += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append({'line': line_number, 'error': error.message})
+
+    def as_dict(self):
+        return {'imported': self.imported, 'skipped': self.skipped,
+                'errors': sorted(self.errors, key=lambda error: error['line'])} #Range Errors Surface per Chunk
+
+#Validate Row by Row, Insert Each Full Chunk as One Batched INSERT and Commit; Rows Join the Current Home
+def import_devices(rows, chunk_size=1000, stop_on_error=False):
+    result = ImportResult()
+    chunk, lines = [], []
+
+    def write(): #False Once stop_on_error Should End the Import
+        failures = out_of_range(chunk)
+        if stop_on_error and failures:
+            first = min(failures)
+            result.reject(lines[first], InventoryError(failures[first]))
+            del chunk[first:]
+        else:
+            for index in sorted(failures):
+                result.reject(lines[index], InventoryError(failures[index]))
+            chunk[:] = [values for index, values in enumerate(chunk) if index not in failures]
+        if chunk:
+            try:
+                ids = db.session.execute(insert(Device).returning(Device.id, sort_by_parameter_order=True),
+                                         chunk).scalars().all()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            with using_source('import'):
+                journal.record(ids, [state_of(values) for values in chunk], 'add')
+        result.imported += len(chunk)
+        chunk.clear()
+        lines.clear()
+        return not (stop_on_error and failures)
+
+    for line_number, row in rows:
+        try:
+            if isinstance(row, InventoryError):
+                raise row
+            chunk.append(validate_row(row))
+            lines.append(line_number)
+        except InventoryError as error:
+            result.reject(line_number, error)
+            if stop_on_error:
+                break
+            continue
+        if len(chunk) >= chunk_size and not write():
+            break
+    if chunk:
+        write()
+    if result.imported:
+        load_devices() #One Reload Rather Than a Delta per Imported Device
+        journal.flush() #A Command Line Import Exits Before the Next Scheduled Flush
+    return result
+
+def read_devices(stream, fmt, chunk_size=1000, stop_on_error=False):
+    parse = parse_ndjson if fmt == 'ndjson' else parse_csv
+    return import_devices(parse(stream), chunk_size, stop_on_error)
+
+#Export: Rows are Fetched in yield_per Batches and Written Out as They Arrive
+def export_devices(fmt, chunk_size=1000, home_id=None): #Pass home_id When the Generator Outlives the Request
+    home_id = home_id or current_home()
+    rows = db.session.execute(
+        select(*(getattr(Device, field) for field in FIELDS))
+        .where(Device.home_id == home_id)
+        .order_by(Device.id)
+        .execution_options(yield_per=chunk_size),
+        bind_arguments={'bind': db.engines[shard_for(home_id)]},
+    )
+    if fmt == 'ndjson':
+        for partition in rows.partitions():
+            yield ''.join(json.dumps(dict(zip(FIELDS, row)), separators=(',', ':')) + '\n' for row in partition)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for partition in rows.partitions():
+        writer.writerows(partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue() #Header Only, for an Empty Table
+
+#Command Line: flask devices-import FILE / flask devices-export [FILE]
+@click.command('devices-import')
+@with_appcontext
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults from the file extension')
+@click.option('--chunk-size', type=int, default=None)
+@click.option('--stop-on-error', is_flag=True)
+@click.option('--home', 'home_id', type=int, default=None, help='Home the devices join')
+def import_command(source, fmt, chunk_size, stop_on_error, home_id):
+    fmt = detect_format(source.name, requested=fmt)
+    with using_home(home_id):
+        result = read_devices(source, fmt, chunk_size or current_app.config['INVENTORY_CHUNK_SIZE'], stop_on_error)
+    for error in result.errors:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    click.echo(f"Imported {result.imported} devices, skipped {result.skipped}")
+
+@click.command('devices-export')
+@with_appcontext
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv')
+@click.option('--home', 'home_id', type=int, default=None)
+def export_command(target, fmt, home_id):
+    for text in export_devices(fmt, current_app.config['INVENTORY_CHUNK_SIZE'], home_id):
+        target.write(text)
@@ -0,0 +1,384 @@
+import json
+import threading
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, literal, or_, select, tuple_, update
+from tenancy import current_home, using_home
+
+#Fields a Snapshot Keeps per Device, in Order
+STATE_FIELDS = ('name', 'type', 'status', 'temperature', 'brightness', 'colour')
+FIELD_INDEX = {field: index for index, field in enumerate(STATE_FIELDS)}
+UNDO_CHUNK = 5000 #IDs per IN (...) List
+
+#Where Recorded Commands Came From; Requests are 'route', Scheduled Work Sets 'job'
+_current_source = ContextVar('journal_source', default='route')
+
+#Error Handling
+class JournalError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+@contextmanager
+def using_source(source): #Label Every Command Recorded Inside
+    token = _current_source.set(source)
+    try:
+        yield
+    finally:
+        _current_source.reset(token)
+
+def describe(values): #Action Name for a Change, the Bulk Command's Name Where One Fits
+    if set(values) == {'status'}:
+        return 'on' if values['status'] else 'off'
+    for field in ('brightness', 'temperature', 'colour'):
+        if field in values:
+            return f'set_{field}'
+    if set(values) == {'name'}:
+        return 'rename'
+    return 'update'
+
+def state_of(device): #Snapshot Values of a Record, Row or Dict of Columns
+    if isinstance(device, dict):
+        return {field: device.get(field) for field in STATE_FIELDS}
+    return {field: getattr(device, field) for field in STATE_FIELDS}
+
+def encode(value):
+    return json.dumps(value, separators=(',', ':'))
+
+#Append-Only Log of Device Commands, Buffered in Memory and Written in Large Batches by the Housekeeping
+#Scheduler; Devices Given the Same Values by One Command Share a Row, so a Bulk Command is One Row
+#Values are Absolute (a Toggle is Recorded as 'on' or 'off'), so Replaying a Command Twice Changes Nothing
+#Journal Order is (recorded_at, id): When Commands Were Made, Not When Their Process Flushed Them, so the Web
+#Process's and worker.py's Commands Interleave Correctly; a Position is Still Named by a Command's id
+class CommandJournal:
+    def __init__(self):
+        self.enabled = False
+        self._buffer = []
+        self._based = set() #Homes Known to Have a Snapshot to Replay From
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.recorded = 0
+        self.written = 0
+
+    def configure(self, enabled):
+        self.enabled = enabled
+
+    def pending(self):
+        return len(self._buffer)
+
+    #Recording
+    def record(self, device_ids, values, action=None, undoes=None): #values is a List of Dicts for 'add'
+        if not self.enabled or not device_ids:
+            return
+        entry = {
+            'home_id': current_home(),
+            'recorded_at': datetime.now(),
+            'source': _current_source.get(),
+            'action': action or describe(values),
+            'device_ids': list(device_ids),
+            'changes': values,
+            'undoes': undoes,
+        }
+        with self._lock:
+            self._buffer.append(entry)
+            self.recorded += 1
+
+    def record_rows(self, records, fields, undoes=None): #Records Left with Equal Values Share a Row
+        groups = defaultdict(list)
+        for record in records:
+            groups[tuple(getattr(record, field) for field in fields)].append(record.id)
+        for values, ids in groups.items():
+            self.record(ids, dict(zip(fields, values)), undoes=undoes)
+
+    #Writing
+    def flush(self): #Write Buffered Commands Home by Home; Returns Commands Written
+        from database import db
+        with self._flush_lock:
+            with self._lock:
+                entries, self._buffer = self._buffer, []
+            homes = defaultdict(list)
+            for entry in entries:
+                homes[entry['home_id']].append(entry)
+
+            written = set()
+            for home_id, home_entries in homes.items():
+                try:
+                    with using_home(home_id): #Each Home's Rows Go to its Own Shard
+                        self._write(home_entries)
+                except Exception:
+                    db.session.rollback()
+                    with self._lock: #Retry This and the Remaining Homes on the Next Flush
+                        self._buffer[:0] = [entry for entry in entries if entry['home_id'] not in written]
+                    raise
+                written.add(home_id)
+            self.written += len(entries)
+            return len(entries)
+
+    def _write(self, entries):
+        from database import db, DeviceCommand
+        self.ensure_base() #From the Table, Which May Already Hold These Commands; Replaying Them Again is Harmless
+        db.session.execute(insert(DeviceCommand), [
+            dict(entry, device_ids=encode(entry['device_ids']), changes=encode(entry['changes']))
+            for entry in entries
+        ])
+        db.session.commit()
+
+    def ensure_base(self, registry=None): #First Snapshot of the Current Home, from a Fresh Registry or the Table
+        home_id = current_home()
+        if not self.enabled or home_id in self._based or (registry is not None and not len(registry)):
+            return #An Empty Home Gets its Base with its First Commands, so Out-of-Band Seeding Counts
+        from database import db, Device, DeviceSnapshot
+        if db.session.execute(select(DeviceSnapshot.id).filter_by(home_id=home_id).limit(1)).first() is None:
+            if registry is not None:
+                records = registry.values()
+            else:
+                records = db.session.execute(
+                    select(Device.id, *(getattr(Device, field) for field in STATE_FIELDS))
+                    .where(Device.home_id == home_id)).all()
+            save_snapshot(position(), {record.id: [getattr(record, field) for field in STATE_FIELDS]
+                                       for record in records})
+        self._based.add(home_id)
+
+journal = CommandJournal()
+
+#Snapshots: Every Device's State as of One Journal Position, as Compressed JSON Rows [id, name, type, ...]
+def pack(state):
+    return zlib.compress(encode([[device_id, *values] for device_id, values in state.items()]).encode())
+
+def unpack(blob):
+    return {row[0]: row[1:] for row in json.loads(zlib.decompress(blob))}
+
+def save_snapshot(command_id, state):
+    from database import db, DeviceSnapshot
+    key = command_key(command_id)
+    db.session.add(DeviceSnapshot(home_id=current_home(), command_id=command_id, command_at=key and key[0],
+                                  taken_at=datetime.now(), devices=len(state), state=pack(state)))
+    db.session.commit()
+
+def position(at=None): #Last Command in Journal Order Recorded at or Before at (Default Now), 0 for None
+    from database import db, DeviceCommand
+    query = select(DeviceCommand.id).where(DeviceCommand.home_id == current_home())
+    if at is not None:
+        query = query.where(DeviceCommand.recorded_at <= at)
+    return db.session.execute(
+        query.order_by(DeviceCommand.recorded_at.desc(), DeviceCommand.id.desc()).limit(1)).scalar() or 0
+
+def command_key(command_id): #(Recorded At, ID) of a Position, None for Position 0
+    from database import db, DeviceCommand
+    if not command_id:
+        return None
+    key = db.session.execute(select(DeviceCommand.recorded_at, DeviceCommand.id)
+                             .filter_by(id=command_id, home_id=current_home())).first()
+    if key is None:
+        raise JournalError(f"No command {command_id} in this home's journal")
+    return tuple(key)
+
+def journal_order(model): #Columns Ordering Rows of DeviceCommand or DeviceSnapshot by Position
+    from database import DeviceCommand
+    if model is DeviceCommand:
+        return tuple_(DeviceCommand.recorded_at, DeviceCommand.id)
+    return tuple_(model.command_at, model.command_id)
+
+def fold(state, action, device_ids, changes): #Apply One Journal Row to a State
+    if action == 'add':
+        for device_id, values in zip(device_ids, changes):
+            state[device_id] = [values.get(field) for field in STATE_FIELDS]
+    elif action == 'delete':
+        for device_id in device_ids:
+            state.pop(device_id, None)
+    else:
+        updates = [(FIELD_INDEX[field], value) for field, value in changes.items()]
+        for device_id in device_ids:
+            values = state.get(device_id)
+            if values is not None:
+                for index, value in updates:
+                    values[index] = value
+
+#Point-in-Time State: the Nearest Snapshot at or Before the Position, Plus the Commands Since
+#{Device ID: [Values in STATE_FIELDS Order]} After command_id (Default the Latest), or Just Before it
+def replay(command_id=None, inclusive=True):
+    from database import db, DeviceCommand, DeviceSnapshot
+    journal.flush()
+    command_id = position() if command_id is None else command_id
+    key = command_key(command_id)
+    if key is None:
+        reached = DeviceSnapshot.command_id == 0
+    else:
+        reached = or_(DeviceSnapshot.command_id == 0, journal_order(DeviceSnapshot) <= key if inclusive else
+                      journal_order(DeviceSnapshot) < key)
+    snapshot = db.session.execute(
+        select(DeviceSnapshot)
+        .where(DeviceSnapshot.home_id == current_home(), reached)
+        .order_by(DeviceSnapshot.command_at.desc(), DeviceSnapshot.command_id.desc()) #Position 0 Sorts Last
+        .limit(1)
+    ).scalar_one_or_none()
+    if snapshot is None:
+        raise JournalError(f"No snapshot at or before command {command_id}; history starts later")
+    state = unpack(snapshot.state)
+    if key is None:
+        return state
+    since = [DeviceCommand.home_id == current_home(),
+             journal_order(DeviceCommand) <= key if inclusive else journal_order(DeviceCommand) < key]
+    if snapshot.command_id:
+        since.append(journal_order(DeviceCommand) > (snapshot.command_at, snapshot.command_id))
+    rows = db.session.execute(
+        select(DeviceCommand.action, DeviceCommand.device_ids, DeviceCommand.changes)
+        .where(*since)
+        .order_by(DeviceCommand.recorded_at, DeviceCommand.id)
+        .execution_options(yield_per=1000)
+    )
+    for action, device_ids, changes in rows:
+        fold(state, action, json.loads(device_ids), json.loads(changes))
+    return state
+
+#Fold the Commands Since the Current Home's Latest Snapshot into a New One
+#Only Up to JOURNAL_SNAPSHOT_LAG Ago: Another Process May Still Hold Newer Commands in its Buffer, and One
+#Flushed After the Snapshot Must Not Land Before its Position
+def take_snapshot():
+    from database import db, DeviceSnapshot
+    journal.ensure_base()
+    latest = db.session.execute(
+        select(DeviceSnapshot.command_at, DeviceSnapshot.command_id)
+        .where(DeviceSnapshot.home_id == current_home())
+        .order_by(DeviceSnapshot.command_at.desc(), DeviceSnapshot.command_id.desc())
+        .limit(1)).first()
+    command_id = position(datetime.now() - timedelta(seconds=current_app.config['JOURNAL_SNAPSHOT_LAG']))
+    key = command_key(command_id)
+    if key is None or (latest is not None and latest.command_id and tuple(latest) >= key):
+        return None #Nothing New
+    save_snapshot(command_id, replay(command_id))
+    return command_id
+
+def snapshot_homes(): #Every Home With Commands, in Every Shard
+    from database import db, DeviceCommand, shard_engines
+    homes = set()
+    for engine in shard_engines():
+        homes.update(db.session.execute(select(DeviceCommand.home_id).distinct(),
+                                        bind_arguments={'bind': engine}).scalars())
+    taken = 0
+    for home_id in sorted(homes):
+        with using_home(home_id):
+            taken += take_snapshot() is not None
+    return taken
+
+def prune(retention_days, now=None): #Drop History Older Than the Retention, Keeping a Snapshot to Replay From
+    from database import db, DeviceCommand, DeviceSnapshot, shard_engines
+    cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+    for engine in shard_engines():
+        shard = {'bind': engine}
+        keep = {} #Home -> (Recorded At, ID) of its Latest Snapshot Older Than the Cutoff
+        for home_id, command_at, command_id in db.session.execute(
+                select(DeviceSnapshot.home_id, DeviceSnapshot.command_at, DeviceSnapshot.command_id)
+                .where(DeviceSnapshot.taken_at < cutoff, DeviceSnapshot.command_id != 0), bind_arguments=shard):
+            keep[home_id] = max(keep.get(home_id, (command_at, command_id)), (command_at, command_id))
+        for home_id, key in keep.items():
+            db.session.execute(delete(DeviceSnapshot).where(
+                DeviceSnapshot.home_id == home_id,
+                or_(DeviceSnapshot.command_id == 0, journal_order(DeviceSnapshot) < key)), bind_arguments=shard)
+            db.session.execute(delete(DeviceCommand).where(
+                DeviceCommand.home_id == home_id, journal_order(DeviceCommand) <= key), bind_arguments=shard)
+    db.session.commit()
+
+#Auditing
+def as_json(command):
+    return {
+        'id': command.id,
+        'recorded_at': command.recorded_at.isoformat(),
+        'source': command.source,
+        'action': command.action,
+        'device_ids': json.loads(command.device_ids),
+        'changes': json.loads(command.changes),
+        'undoes': command.undoes,
+    }
+
+def recent(device_id=None, before=None, limit=50): #Newest First
+    from database import db, DeviceCommand
+    journal.flush()
+    query = select(DeviceCommand).where(DeviceCommand.home_id == current_home())
+    if device_id is not None: #SQLite's json_each Looks Inside the ID List
+        ids = func.json_each(DeviceCommand.device_ids).table_valued('value')
+        query = query.where(select(literal(1)).select_from(ids).where(ids.c.value == device_id).exists())
+    if before is not None:
+        query = query.where(journal_order(DeviceCommand) < command_key(before))
+    return db.session.execute(query.order_by(DeviceCommand.recorded_at.desc(), DeviceCommand.id.desc())
+                              .limit(limit)).scalars().all()
+
+#Undo: Devices a Command Changed Go Back to Their Values Just Before it, Unless Changed Again Since
+def undo(command_id): #(Devices Restored, Devices Skipped)
+    from database import db, Device, DeviceCommand, home_registry, sync_devices
+    from registry import DeviceRecord
+    from telemetry import recorder
+    from writebehind import writes
+    journal.flush()
+    command = db.session.execute(
+        select(DeviceCommand).filter_by(id=command_id, home_id=current_home())).scalar_one_or_none()
+    if command is None:
+        raise JournalError(f"No command {command_id} in this home's journal")
+    if command.action in ('add', 'delete'):
+        raise JournalError(f"Command {command_id} {'added' if command.action == 'add' else 'deleted'} "
+                           f"devices and can't be undone")
+    if db.session.execute(select(DeviceCommand.id).filter_by(home_id=current_home(), undoes=command_id)
+                          .limit(1)).first() is not None:
+        raise JournalError(f"Command {command_id} has already been undone")
+
+    changes = json.loads(command.changes)
+    before = replay(command_id, inclusive=False)
+    writes.flush(current_home()) #Queued Commands Land First
+    sync_devices(force=True)
+    registry = home_registry()
+    groups = defaultdict(list)
+    skipped = 0
+    for device_id in json.loads(command.device_ids):
+        current, prior = registry.get(device_id), before.get(device_id)
+        if current is None or prior is None or any(getattr(current, field) != value
+                                                   for field, value in changes.items()):
+            skipped += 1 #Deleted, Added Since, or Changed Again
+            continue
+        restore = {field: prior[FIELD_INDEX[field]] for field in changes}
+        groups[tuple(sorted(restore.items()))].append(device_id)
+
+    rows = []
+    try:
+        for values, ids in groups.items():
+            for start in range(0, len(ids), UNDO_CHUNK):
+                rows.extend(db.session.execute(
+                    update(Device)
+                    .where(Device.id.in_(ids[start:start + UNDO_CHUNK]), Device.home_id == current_home())
+                    .values(**dict(values))
+                    .returning(*Device.__table__.columns)
+                    .execution_options(synchronize_session=False)
+                ).all())
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    records = [DeviceRecord.from_row(row) for row in rows]
+    registry.put_many(records)
+    recorder.record_many(records)
+    with using_source('undo'):
+        journal.record_rows(records, tuple(changes), undoes=command_id)
+    journal.flush() #Written Now, so the Same Command Can't be Undone Twice
+    return len(records), skipped
+
+#Command Line: flask journal-snapshot / flask journal-undo COMMAND_ID
+@click.command('journal-snapshot')
+@with_appcontext
+def snapshot_command():
+    click.echo(f"Took {snapshot_homes()} snapshots")
+
+@click.command('journal-undo')
+@with_appcontext
+@click.argument('command_id', type=int)
+@click.option('--home', 'home_id', type=int, default=None)
+def undo_command(command_id, home_id):
+    with using_home(home_id):
+        try:
+            restored, skipped = undo(command_id)
+        except JournalError as error:
+            raise click.ClickException(error.message)
+    click.echo(f"Restored {restored} devices, skipped {skipped} changed since")
@@ -0,0 +1,225 @@
+import re
+from functools import lru_cache
+from sqlalchemy import and_, delete, func, insert, literal, not_, or_, select
+from database import db, Device, DeviceLabel
+from models import DEVICE_WATTAGE
+from tenancy import current_home
+
+LABEL_KINDS = ('room', 'floor', 'tag')
+SINGLE_KINDS = ('room', 'floor') #A Device is in One Room and on One Floor, but Can Have Many Tags
+SELECTOR_KEYS = (*LABEL_KINDS, 'type', 'status', 'id')
+MAX_NAME = 40
+MAX_SELECTOR = 255
+TYPE_NAMES = {name.lower(): name for name in DEVICE_WATTAGE}
+
+#Error Handling
+class LabelError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+def label_name(value): #Names are Matched Case-Insensitively, so are Stored Lower Case
+    name = ' '.join(str(value if value is not None else '').split()).lower()
+    if not name:
+        raise LabelError("A label needs a name")
+    if len(name) > MAX_NAME:
+        raise LabelError(f"Label names must be at most {MAX_NAME} characters")
+    return name
+
+def device_types(value): #type:Camera, or a Device Group Such as type:light or type:security
+    from commands import DEVICE_GROUPS
+    key = value.lower()
+    if key in TYPE_NAMES:
+        return (TYPE_NAMES[key],)
+    for group in (key, key + 's'):
+        if group in DEVICE_GROUPS:
+            return DEVICE_GROUPS[group][1]
+    raise LabelError(f"Unknown device type or group: {value!r}")
+
+#Selectors: key:value Terms Joined by AND, OR, NOT and Parentheses; Terms Side by Side are ANDed
+#e.g. room:kitchen AND type:light, floor:1 AND NOT (tag:"night light" OR status:off)
+TOKEN = re.compile(r'\s*(?:(?P<open>\()|(?P<close>\))|(?P<key>\w+):(?:"(?P<quoted>[^"]*)"|(?P<value>[^\s()"]+))'
+                   r'|(?P<word>[^\s()]+))')
+OPERATORS = ('and', 'or', 'not')
+
+def tokenize(text):
+    tokens = []
+    position, text = 0, text.rstrip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            raise LabelError(f"Can't read the selector from {text[position:]!r}")
+        position = match.end()
+        if match['open'] or match['close']:
+            tokens.append((match['open'] or match['close'], None))
+        elif match['key']:
+            tokens.append(('term', (match['key'].lower(), match['quoted'] if match['quoted'] is not None
+                                    else match['value'])))
+        elif match['word'].lower() in OPERATORS:
+            tokens.append((match['word'].lower(), None))
+        else:
+            raise LabelError(f"Expected key:value, AND, OR or NOT, got {match['word']!r}")
+    return tokens
+
+def term(key, value): #Checked While Parsing, so a Bad Selector Fails Before Any Query
+    if key not in SELECTOR_KEYS:
+        raise LabelError(f"Unknown selector key: {key}. Choose from {', '.join(SELECTOR_KEYS)}")
+    if key in LABEL_KINDS:
+        return ('label', key, label_name(value))
+    if key == 'type':
+        return ('type', device_types(value))
+    if key == 'status':
+        if value.lower() not in ('on', 'off'):
+            raise LabelError(f"status must be on or off, got {value!r}")
+        return ('status', value.lower() == 'on')
+    try:
+        return ('id', int(value))
+    except ValueError:
+        raise LabelError(f"id must be a whole number, got {value!r}")
+
+class SelectorParser: #Recursive Descent; NOT Binds Tightest, Then AND, Then OR
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.index = 0
+
+    def peek(self):
+        return self.tokens[self.index][0] if self.index < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise LabelError("The selector is empty")
+        node = self.any_of()
+        if self.peek() is not None:
+            raise LabelError(f"Unexpected {self.peek()!r} in the selector")
+        return node
+
+    def any_of(self):
+        nodes = [self.all_of()]
+        while self.peek() == 'or':
+            self.take()
+            nodes.append(self.all_of())
+        return nodes[0] if len(nodes) == 1 else ('or', tuple(nodes))
+
+    def all_of(self):
+        nodes = [self.factor()]
+        while self.peek() in ('and', 'not', 'term', '('):
+            if self.peek() == 'and':
+                self.take()
+            nodes.append(self.factor())
+        return nodes[0] if len(nodes) == 1 else ('and', tuple(nodes))
+
+    def factor(self):
+        kind = self.peek()
+        if kind == 'not':
+            self.take()
+            return ('not', self.factor())
+        if kind == '(':
+            self.take()
+            node = self.any_of()
+            if self.peek() != ')':
+                raise LabelError("Missing ) in the selector")
+            self.take()
+            return node
+        if kind == 'term':
+            return term(*self.take()[1])
+        raise LabelError("The selector ends early" if kind is None else f"Unexpected {kind!r} in the selector")
+
+@lru_cache(maxsize=256)
+def parse(text): #Selector Text -> Tree of Tuples
+    if len(text) > MAX_SELECTOR:
+        raise LabelError(f"Selectors must be at most {MAX_SELECTOR} characters")
+    return SelectorParser(tokenize(text)).parse()
+
+def compile_node(node, home_id):
+    kind = node[0]
+    if kind in ('and', 'or'):
+        return (and_ if kind == 'and' else or_)(*(compile_node(child, home_id) for child in node[1]))
+    if kind == 'not':
+        return not_(compile_node(node[1], home_id))
+    if kind == 'label': #Answered from the Label Table's Primary Key
+        return Device.id.in_(select(DeviceLabel.device_id).where(
+            DeviceLabel.home_id == home_id, DeviceLabel.kind == node[1], DeviceLabel.name == node[2]))
+    if kind == 'type':
+        return Device.type.in_(node[1])
+    if kind == 'status':
+        return Device.status.is_(node[1])
+    return Device.id == node[1]
+
+def selector_condition(text): #WHERE Clause for the Current Home's Devices the Selector Matches
+    return compile_node(parse(text.strip()), current_home())
+
+def select_ids(text): #IDs of Matching Devices, in One Query
+    return db.session.execute(
+        select(Device.id).where(Device.home_id == current_home(), selector_condition(text)).order_by(Device.id)
+    ).scalars().all()
+
+#Labelling: Targets are a Selector and/or Device IDs, Always Within the Current Home
+def _targets(selector=None, ids=None):
+    conditions = [Device.home_id == current_home()]
+    if selector:
+        conditions.append(selector_condition(selector))
+    if ids:
+        try:
+            conditions.append(Device.id.in_([int(device_id) for device_id in ids]))
+        except (TypeError, ValueError):
+            raise LabelError("ids must be whole numbers")
+    if len(conditions) == 1:
+        raise LabelError("Labelling needs a selector or device ids")
+    return select(Device.id).where(*conditions)
+
+def _kind(kind):
+    if kind not in LABEL_KINDS:
+        raise LabelError(f"Unknown label kind: {kind!r}. Choose from {', '.join(LABEL_KINDS)}")
+    return kind
+
+def add_label(kind, name, selector=None, ids=None): #Devices Labelled; a New Room or Floor Replaces the Old
+    kind, name = _kind(kind), label_name(name)
+    targets = _targets(selector, ids)
+    try:
+        if kind in SINGLE_KINDS:
+            db.session.execute(delete(DeviceLabel).where(
+                DeviceLabel.home_id == current_home(), DeviceLabel.kind == kind, DeviceLabel.name != name,
+                DeviceLabel.device_id.in_(targets)))
+        count = db.session.execute(insert(DeviceLabel).prefix_with('OR IGNORE').from_select(
+            ['home_id', 'kind', 'name', 'device_id'],
+            targets.with_only_columns(literal(current_home()), literal(kind), literal(name), Device.id))).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return count
+
+def remove_label(kind, name=None, selector=None, ids=None): #Every Label of the Kind When name is None
+    kind = _kind(kind)
+    conditions = [DeviceLabel.home_id == current_home(), DeviceLabel.kind == kind,
+                  DeviceLabel.device_id.in_(_targets(selector, ids))]
+    if name is not None:
+        conditions.append(DeviceLabel.name == label_name(name))
+    count = db.session.execute(delete(DeviceLabel).where(*conditions)).rowcount
+    db.session.commit()
+    return count
+
+def device_labels(device_id): #{'room': Name or None, 'floor': Name or None, 'tags': [Names]}
+    labels = {'room': None, 'floor': None, 'tags': []}
+    for kind, name in db.session.execute(
+            select(DeviceLabel.kind, DeviceLabel.name)
+            .where(DeviceLabel.home_id == current_home(), DeviceLabel.device_id == device_id)
+            .order_by(DeviceLabel.kind, DeviceLabel.name)):
+        if kind == 'tag':
+            labels['tags'].append(name)
+        else:
+            labels[kind] = name
+    return labels
+
+def label_counts(): #{'room': {Name: Devices}, 'floor': {...}, 'tag': {...}} for the Current Home
+    counts = {kind: {} for kind in LABEL_KINDS}
+    for kind, name, count in db.session.execute(
+            select(DeviceLabel.kind, DeviceLabel.name, func.count())
+            .where(DeviceLabel.home_id == current_home())
+            .group_by(DeviceLabel.kind, DeviceLabel.name)):
+        counts[kind][name] = count
+    return counts
@@ -0,0 +1,238 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+INFINITY = 'le="+Inf"'
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+#Cumulative Histogram per Label Set, Rendered in the Prometheus Text Format
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {} #Label Values -> [Bucket Counts..., Sum, Count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labels, key, le)} {count}"
+            yield f"{self.name}_bucket{_labels(self.labels, key, INFINITY)} {values[-1]}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {_number(values[-2])}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {values[-1]}"
+
+#Value Read When /metrics is Scraped; kind='counter' for Totals That Only Grow
+class Gauge:
+    def __init__(self, name, help, read, kind='gauge'):
+        self.name = name
+        self.help = help
+        self._read = read
+        self.kind = kind
+
+    def samples(self):
+        yield f"{self.name} {_number(self._read())}"
+
+class Metrics:
+    def __init__(self):
+        self._metrics = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        return self.add(Histogram(*args, **kwargs))
+
+    def gauge(self, name, help, read, kind='gauge'):
+        return self.add(Gauge(name, help, read, kind))
+
+    def render(self): #Prometheus Text Exposition Format 0.0.4
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+request_seconds = metrics.histogram(
+    'smarthome_http_request_duration_seconds', 'Time to build each response', ('route', 'method', 'status'))
+request_queries = metrics.histogram(
+    'smarthome_http_request_queries', 'SQL statements run per request', ('route',), QUERY_BUCKETS)
+request_query_seconds = metrics.histogram(
+    'smarthome_http_request_query_seconds', 'Time spent in SQL per request', ('route',))
+query_seconds = metrics.histogram(
+    'smarthome_db_query_duration_seconds', 'Every SQL statement, in or out of a request', ('database',))
+job_lag = metrics.histogram(
+    'smarthome_job_lag_seconds', 'Scheduled run time to hand-off to the worker pool', ('job',), LAG_BUCKETS)
+job_seconds = metrics.histogram(
+    'smarthome_job_duration_seconds', 'Hand-off to the worker pool until the job or batch finished', ('job',),
+    LAG_BUCKETS)
+
+#SQL Time and Count for the Request Being Served in This Context
+class QueryTally:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+_tally = ContextVar('query_tally', default=None)
+
+def instrument_engine(engine, name='main'): #Time Every Statement Run Through engine
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        query_seconds.observe(elapsed, name)
+        tally = _tally.get()
+        if tally is not None:
+            tally.count += 1
+            tally.seconds += elapsed
+
+    @event.listens_for(engine, 'handle_error')
+    def failed_query(context):
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    return engine
+
+#One Request's Timing, from begin_request to finish_request
+class RequestTimer:
+    __slots__ = ('started', 'tally')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.tally = QueryTally()
+
+def begin_request():
+    timer = RequestTimer()
+    _tally.set(timer.tally)
+    profiler.begin()
+    return timer
+
+def finish_request(timer, route, method, status):
+    elapsed = time.perf_counter() - timer.started
+    _tally.set(None)
+    request_seconds.observe(elapsed, route, method, status)
+    request_queries.observe(timer.tally.count, route)
+    request_query_seconds.observe(timer.tally.seconds, route)
+    profiler.end(f"{method} {route}", elapsed)
+    return elapsed
+
+#Samples the Stacks of Threads Serving Requests; Slow Requests are Written Out as Folded Stacks
+#Each Output Line is "frame;frame;...;frame count", as flamegraph.pl and speedscope Read
+class SamplingProfiler:
+    def __init__(self, interval=0.005, slow_seconds=0.5, directory='profiles'):
+        self.interval = interval
+        self.slow_seconds = slow_seconds
+        self.directory = directory
+        self.enabled = False
+        self.written = 0
+        self._active = {} #Thread ID -> Counter of Folded Stacks
+        self._lock = threading.Lock()
+        self._wake = threading.Event() #Set While Enabled, so an Idle Sampler Just Waits
+        self._thread = None
+
+    def configure(self, interval, slow_seconds, directory):
+        self.interval = interval
+        self.slow_seconds = slow_seconds
+        self.directory = directory
+
+    def start(self):
+        with self._lock:
+            self.enabled = True
+            self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self.enabled = False
+            self._wake.clear()
+            self._active = {}
+
+    def begin(self):
+        if self.enabled:
+            with self._lock:
+                self._active[threading.get_ident()] = Counter()
+
+    def end(self, name, elapsed): #Path of the Written Profile, if the Request was Slow
+        with self._lock:
+            stacks = self._active.pop(threading.get_ident(), None)
+        if not stacks or elapsed < self.slow_seconds:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        path = os.path.join(self.directory, f"{stamp}-{re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_')}"
+                                            f"-{elapsed * 1000:.0f}ms.folded")
+        with open(path, 'w') as output:
+            for stack, count in stacks.most_common():
+                output.write(f"{stack} {count}\n")
+        self.written += 1
+        return path
+
+    def _run(self):
+        while self._wake.wait():
+            with self._lock: #Snapshot Under the Lock, so Stacks Only Count After begin()
+                frames = sys._current_frames()
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[fold(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+def fold(frame): #Root-First "file:function" Frames Joined by ";"
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+profiler = SamplingProfiler()
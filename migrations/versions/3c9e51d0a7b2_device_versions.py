@@ -0,0 +1,31 @@
+"""device versions
+
+Revision ID: 3c9e51d0a7b2
+Revises: 8088a198f0fb
+Create Date: 2026-10-18 10:12:40.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e51d0a7b2'
+down_revision = '8088a198f0fb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('devices', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index(batch_op.f('ix_devices_version'), ['version'], unique=False)
+
+    # Number existing rows so the registry can sync from them
+    op.execute("UPDATE devices SET version = id")
+
+
+def downgrade():
+    with op.batch_alter_table('devices', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_devices_version'))
+        batch_op.drop_column('version')
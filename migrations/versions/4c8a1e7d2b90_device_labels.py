@@ -0,0 +1,43 @@
+"""device labels
+
+Revision ID: 4c8a1e7d2b90
+Revises: 9f4d6b2a8e15
+Create Date: 2026-10-18 21:14:52.730194
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8a1e7d2b90'
+down_revision = '9f4d6b2a8e15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The primary key is the lookup index, so the table is stored in it
+    op.create_table('device_labels',
+    sa.Column('home_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('kind', sa.String(length=5), nullable=False),
+    sa.Column('name', sa.String(length=40), nullable=False),
+    sa.Column('device_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.PrimaryKeyConstraint('home_id', 'kind', 'name', 'device_id'),
+    sqlite_with_rowid=False
+    )
+    with op.batch_alter_table('device_labels', schema=None) as batch_op:
+        batch_op.create_index('ix_device_labels_home_device', ['home_id', 'device_id'], unique=False)
+
+    with op.batch_alter_table('schedules', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('selector', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('schedules', schema=None) as batch_op:
+        batch_op.drop_column('selector')
+
+    with op.batch_alter_table('device_labels', schema=None) as batch_op:
+        batch_op.drop_index('ix_device_labels_home_device')
+
+    op.drop_table('device_labels')
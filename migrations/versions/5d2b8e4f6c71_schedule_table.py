@@ -0,0 +1,45 @@
+"""schedule table
+
+Revision ID: 5d2b8e4f6c71
+Revises: a41f7c2e9d03
+Create Date: 2026-10-18 14:05:27.330814
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2b8e4f6c71'
+down_revision = 'a41f7c2e9d03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('schedules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.String(length=64), nullable=False),
+    sa.Column('device_id', sa.Integer(), nullable=True),
+    sa.Column('device_group', sa.String(length=20), nullable=True),
+    sa.Column('action', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.String(length=20), nullable=True),
+    sa.Column('trigger', sa.String(length=10), nullable=False),
+    sa.Column('trigger_spec', sa.String(length=64), nullable=True),
+    sa.Column('next_run_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('job_id')
+    )
+    with op.batch_alter_table('schedules', schema=None) as batch_op:
+        batch_op.create_index('ix_schedules_action_next_run', ['action', 'next_run_at'], unique=False)
+        batch_op.create_index('ix_schedules_device_next_run', ['device_id', 'next_run_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_schedules_next_run_at'), ['next_run_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('schedules', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_schedules_next_run_at'))
+        batch_op.drop_index('ix_schedules_device_next_run')
+        batch_op.drop_index('ix_schedules_action_next_run')
+
+    op.drop_table('schedules')
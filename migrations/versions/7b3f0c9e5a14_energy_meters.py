@@ -0,0 +1,37 @@
+"""energy meters
+
+Revision ID: 7b3f0c9e5a14
+Revises: 4c8a1e7d2b90
+Create Date: 2026-10-19 10:02:18.415307
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3f0c9e5a14'
+down_revision = '4c8a1e7d2b90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('energy_meters',
+    sa.Column('home_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('device_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('device_type', sa.String(length=20), nullable=False),
+    sa.Column('watts', sa.Integer(), nullable=False),
+    sa.Column('since', sa.DateTime(), nullable=False),
+    sa.Column('accrued_to', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('home_id', 'device_id'),
+    sqlite_with_rowid=False
+    )
+    # Each device's interval opens at its latest stored sample, and is credited from there
+    op.execute("INSERT INTO energy_meters (home_id, device_id, device_type, watts, since, accrued_to) "
+               "SELECT home_id, device_id, device_type, watts, recorded_at, recorded_at FROM energy_samples "
+               "WHERE id IN (SELECT max(id) FROM energy_samples GROUP BY home_id, device_id)")
+
+
+def downgrade():
+    op.drop_table('energy_meters')
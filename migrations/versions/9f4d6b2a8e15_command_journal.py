@@ -0,0 +1,60 @@
+"""command journal
+
+Revision ID: 9f4d6b2a8e15
+Revises: e2c4a9d1f357
+Create Date: 2026-10-18 19:05:37.208416
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f4d6b2a8e15'
+down_revision = 'e2c4a9d1f357'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('device_commands',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('home_id', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('recorded_at', sa.DateTime(), nullable=False),
+    sa.Column('source', sa.String(length=10), nullable=False),
+    sa.Column('action', sa.String(length=20), nullable=False),
+    sa.Column('device_ids', sa.Text(), nullable=False),
+    sa.Column('changes', sa.Text(), nullable=False),
+    sa.Column('undoes', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('device_commands', schema=None) as batch_op:
+        batch_op.create_index('ix_device_commands_home_id', ['home_id', 'id'], unique=False)
+        batch_op.create_index('ix_device_commands_home_recorded_at', ['home_id', 'recorded_at'], unique=False)
+        batch_op.create_index('ix_device_commands_home_undoes', ['home_id', 'undoes'], unique=False)
+
+    # The first snapshot of each home is taken by the app, from the devices table
+    op.create_table('device_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('home_id', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('command_id', sa.Integer(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), nullable=False),
+    sa.Column('devices', sa.Integer(), nullable=False),
+    sa.Column('state', sa.LargeBinary(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('device_snapshots', schema=None) as batch_op:
+        batch_op.create_index('ix_device_snapshots_home_command', ['home_id', 'command_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('device_snapshots', schema=None) as batch_op:
+        batch_op.drop_index('ix_device_snapshots_home_command')
+
+    op.drop_table('device_snapshots')
+    with op.batch_alter_table('device_commands', schema=None) as batch_op:
+        batch_op.drop_index('ix_device_commands_home_undoes')
+        batch_op.drop_index('ix_device_commands_home_recorded_at')
+        batch_op.drop_index('ix_device_commands_home_id')
+
+    op.drop_table('device_commands')
@@ -0,0 +1,33 @@
+"""snapshot command at
+
+Revision ID: a3c9e5f1b724
+Revises: d6a2f8c41e93
+Create Date: 2026-10-19 14:02:17.408351
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e5f1b724'
+down_revision = 'd6a2f8c41e93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Journal order is (recorded_at, id), so a snapshot keeps the time of the command it stops at
+    with op.batch_alter_table('device_snapshots', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('command_at', sa.DateTime(), nullable=True))
+
+    op.execute(
+        "UPDATE device_snapshots SET command_at = "
+        "(SELECT recorded_at FROM device_commands WHERE device_commands.id = device_snapshots.command_id) "
+        "WHERE command_id != 0"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('device_snapshots', schema=None) as batch_op:
+        batch_op.drop_column('command_at')
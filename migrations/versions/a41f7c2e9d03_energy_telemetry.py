@@ -0,0 +1,50 @@
+"""energy telemetry
+
+Revision ID: a41f7c2e9d03
+Revises: 3c9e51d0a7b2
+Create Date: 2026-10-18 11:40:02.561937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41f7c2e9d03'
+down_revision = '3c9e51d0a7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('energy_samples',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('device_type', sa.String(length=20), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(), nullable=False),
+    sa.Column('status', sa.Boolean(), nullable=False),
+    sa.Column('watts', sa.Integer(), nullable=False),
+    sa.Column('energy_wh', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('energy_samples', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_energy_samples_device_id'), ['device_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_energy_samples_recorded_at'), ['recorded_at'], unique=False)
+
+    op.create_table('energy_rollups',
+    sa.Column('resolution', sa.String(length=6), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('device_type', sa.String(length=20), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('energy_wh', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('resolution', 'bucket', 'device_type')
+    )
+
+
+def downgrade():
+    op.drop_table('energy_rollups')
+    with op.batch_alter_table('energy_samples', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_energy_samples_recorded_at'))
+        batch_op.drop_index(batch_op.f('ix_energy_samples_device_id'))
+
+    op.drop_table('energy_samples')
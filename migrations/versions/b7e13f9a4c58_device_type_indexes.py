@@ -0,0 +1,43 @@
+"""device type indexes
+
+Revision ID: b7e13f9a4c58
+Revises: 5d2b8e4f6c71
+Create Date: 2026-10-18 15:32:09.514620
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e13f9a4c58'
+down_revision = '5d2b8e4f6c71'
+branch_labels = None
+depends_on = None
+
+# Copied from models.DEVICE_TYPE_CODES so later model changes cannot alter this revision
+TYPE_CODES = {
+    'BasicLight': 1, 'ColourLight': 2, 'Thermostat': 3, 'Camera': 4,
+    'DoorLock': 5, 'Kettle': 6, 'Boiler': 7, 'Appliance': 8,
+}
+
+
+def upgrade():
+    with op.batch_alter_table('devices', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('type_code', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_devices_type_status', ['type', 'status'], unique=False)
+        batch_op.create_index('ix_devices_type_id', ['type', 'id'], unique=False)
+        batch_op.create_index('ix_devices_type_code_status', ['type_code', 'status'], unique=False)
+
+    # Backfill the code for existing rows
+    devices = sa.table('devices', sa.column('type', sa.String), sa.column('type_code', sa.Integer))
+    op.execute(devices.update().values(type_code=sa.case(TYPE_CODES, value=devices.c.type, else_=0)))
+    op.execute("ANALYZE devices")
+
+
+def downgrade():
+    with op.batch_alter_table('devices', schema=None) as batch_op:
+        batch_op.drop_index('ix_devices_type_code_status')
+        batch_op.drop_index('ix_devices_type_id')
+        batch_op.drop_index('ix_devices_type_status')
+        batch_op.drop_column('type_code')
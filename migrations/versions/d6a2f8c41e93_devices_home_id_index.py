@@ -0,0 +1,27 @@
+"""devices home id index
+
+Revision ID: d6a2f8c41e93
+Revises: 7b3f0c9e5a14
+Create Date: 2026-10-19 11:26:40.182635
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6a2f8c41e93'
+down_revision = '7b3f0c9e5a14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # API pages walk a home's devices in id order from here, without sorting the home
+    with op.batch_alter_table('devices', schema=None) as batch_op:
+        batch_op.create_index('ix_devices_home_id', ['home_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('devices', schema=None) as batch_op:
+        batch_op.drop_index('ix_devices_home_id')
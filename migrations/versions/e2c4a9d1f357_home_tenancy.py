@@ -0,0 +1,95 @@
+"""home tenancy
+
+Revision ID: e2c4a9d1f357
+Revises: b7e13f9a4c58
+Create Date: 2026-10-18 17:21:46.208193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c4a9d1f357'
+down_revision = 'b7e13f9a4c58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows all belong to the first home
+    with op.batch_alter_table('devices', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('home_id', sa.Integer(), server_default='1', nullable=False))
+        batch_op.drop_index('ix_devices_type_status')
+        batch_op.drop_index('ix_devices_type_id')
+        batch_op.drop_index('ix_devices_type_code_status')
+        batch_op.create_index('ix_devices_home_type_status', ['home_id', 'type', 'status'], unique=False)
+        batch_op.create_index('ix_devices_home_type_id', ['home_id', 'type', 'id'], unique=False)
+        batch_op.create_index('ix_devices_home_type_code_status', ['home_id', 'type_code', 'status'], unique=False)
+        batch_op.create_index('ix_devices_home_version', ['home_id', 'version'], unique=False)
+
+    with op.batch_alter_table('schedules', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('home_id', sa.Integer(), server_default='1', nullable=False))
+        batch_op.drop_index('ix_schedules_next_run_at')
+        batch_op.drop_index('ix_schedules_device_next_run')
+        batch_op.drop_index('ix_schedules_action_next_run')
+        batch_op.create_index('ix_schedules_home_next_run', ['home_id', 'next_run_at'], unique=False)
+        batch_op.create_index('ix_schedules_home_device_next_run', ['home_id', 'device_id', 'next_run_at'], unique=False)
+        batch_op.create_index('ix_schedules_home_action_next_run', ['home_id', 'action', 'next_run_at'], unique=False)
+
+    with op.batch_alter_table('energy_samples', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('home_id', sa.Integer(), server_default='1', nullable=False))
+
+    # home_id joins the rollup primary key, so the table is rebuilt
+    op.create_table('energy_rollups_new',
+    sa.Column('home_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('resolution', sa.String(length=6), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('device_type', sa.String(length=20), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('energy_wh', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('home_id', 'resolution', 'bucket', 'device_type')
+    )
+    op.execute("INSERT INTO energy_rollups_new (home_id, resolution, bucket, device_type, samples, energy_wh) "
+               "SELECT 1, resolution, bucket, device_type, samples, energy_wh FROM energy_rollups")
+    op.drop_table('energy_rollups')
+    op.rename_table('energy_rollups_new', 'energy_rollups')
+    op.execute("ANALYZE")
+
+
+def downgrade():
+    op.create_table('energy_rollups_old',
+    sa.Column('resolution', sa.String(length=6), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('device_type', sa.String(length=20), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('energy_wh', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('resolution', 'bucket', 'device_type')
+    )
+    op.execute("INSERT INTO energy_rollups_old (resolution, bucket, device_type, samples, energy_wh) "
+               "SELECT resolution, bucket, device_type, SUM(samples), SUM(energy_wh) FROM energy_rollups "
+               "GROUP BY resolution, bucket, device_type")
+    op.drop_table('energy_rollups')
+    op.rename_table('energy_rollups_old', 'energy_rollups')
+
+    with op.batch_alter_table('energy_samples', schema=None) as batch_op:
+        batch_op.drop_column('home_id')
+
+    with op.batch_alter_table('schedules', schema=None) as batch_op:
+        batch_op.drop_index('ix_schedules_home_action_next_run')
+        batch_op.drop_index('ix_schedules_home_device_next_run')
+        batch_op.drop_index('ix_schedules_home_next_run')
+        batch_op.create_index('ix_schedules_action_next_run', ['action', 'next_run_at'], unique=False)
+        batch_op.create_index('ix_schedules_device_next_run', ['device_id', 'next_run_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_schedules_next_run_at'), ['next_run_at'], unique=False)
+        batch_op.drop_column('home_id')
+
+    with op.batch_alter_table('devices', schema=None) as batch_op:
+        batch_op.drop_index('ix_devices_home_version')
+        batch_op.drop_index('ix_devices_home_type_code_status')
+        batch_op.drop_index('ix_devices_home_type_id')
+        batch_op.drop_index('ix_devices_home_type_status')
+        batch_op.create_index('ix_devices_type_code_status', ['type_code', 'status'], unique=False)
+        batch_op.create_index('ix_devices_type_id', ['type', 'id'], unique=False)
+        batch_op.create_index('ix_devices_type_status', ['type', 'status'], unique=False)
+        batch_op.drop_column('home_id')
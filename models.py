@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 from enum import Enum
+from fleet import FleetStore
+from validation import RULES, check
 
 #Colour Options for Lights
 class Colour(Enum):
@@ -21,6 +23,9 @@ def colour_from_string(colour_str):
 
 #Light Base Class
 class SuperLight:
+    __slots__ = () #Storage Declared by Each Light Class
+    DEFAULT_BRIGHTNESS = 50
+
     def __init__(self, brightness, colour: Colour):
         self._colour = None
         self.colour = colour
@@ -36,12 +41,11 @@ class SuperLight:
     def colour(self, colour):
         if not isinstance(colour, Colour):
             raise TypeError("Colour must be a valid Colour enum")
-        if not self._is_colour_allowed(colour):
-            raise ValueError(f"This Device cannot change colours")
+        check(self.type, 'colour', colour)
         self._colour = colour
 
-    def _is_colour_allowed(self, colour: Colour) -> bool:
-        return True  #Overridden by Subclasses
+    def _is_colour_allowed(self, colour: Colour) -> bool: #Per-Type Colours Come from validation.RULES
+        return colour.name in RULES[self.type].colours
 
 
     @property
@@ -51,13 +55,19 @@ class SuperLight:
     #Brightness Validation
     @brightness.setter
     def brightness(self, value):
-        if 0 <= value <= 100:
-            self._brightness = value
-        else:
-            raise ValueError("Brightness must be between 0 and 100")
+        self._brightness = check(self.type, 'brightness', value)
+
+    def _load(self, device_row): #Stored Values Were Validated When Written
+        brightness = device_row.brightness
+        self._brightness = self.DEFAULT_BRIGHTNESS if brightness is None else brightness
+        colour = colour_from_string(device_row.colour)
+        self._colour = colour if self._is_colour_allowed(colour) else Colour.DEFAULT
 
 #Temperature Base Class
 class SuperTemp:
+    __slots__ = ()
+    DEFAULT_TEMPERATURE = 20
+
     def __init__(self, temperature):
         self._temperature = 0
         self.temperature = temperature 
@@ -69,20 +79,20 @@ class SuperTemp:
     #Temperature Validation
     @temperature.setter
     def temperature(self, value):
-        if 0 <= value <= 100:
-            self._temperature = value
-        else:
-            raise ValueError("Temperature must be between 0 and 100")
+        self._temperature = check(self.type, 'temperature', value) #Range Depends on the Type
+
+    def _load(self, device_row):
+        temperature = device_row.temperature
+        self._temperature = self.DEFAULT_TEMPERATURE if temperature is None else temperature
 
 #Device Base Class
 class SmartDevice(ABC):
-    total_devices = 0  
+    __slots__ = ('_name', '_status')
 
     #Initialising
     def __init__(self, name, status=False):
         self._name = name
         self._status = status
-        SmartDevice.total_devices += 1
 
     #Getter Methods
     @property
@@ -108,35 +118,22 @@ class SmartDevice(ABC):
     def get_energy_usage(self):
         pass
 
+    def _load(self, device_row): #Extra Fields Set by Light and Temperature Classes
+        pass
+
     @classmethod
     def from_db(cls, device_row): # Factory Method
-        device_type = device_row.type
-        name = device_row.name
-        status = device_row.status
-        temp = device_row.temperature
-        brightness = device_row.brightness
-        colour_str = device_row.colour or "DEFAULT"
-
-        colour_enum = colour_from_string(colour_str)
-
-        if device_type == 'BasicLight':
-            return BasicLight(name, brightness or 50, colour_enum, status)
-        elif device_type == 'ColourLight':
-            return ColourLight(name, brightness or 50, colour_enum, status)
-        elif device_type == 'Thermostat':
-            return Thermostat(name, temperature=temp, status=status)
-        elif device_type == 'Camera':
-            return Camera(name, status)
-        elif device_type == 'DoorLock':
-            return DoorLock(name, status)
-        elif device_type == 'Kettle':
-            return Kettle(name, temperature=temp, status=status)
-        elif device_type == 'Boiler':
-            return Boiler(name, temperature=temp, status=status)
-        elif device_type == 'Appliance':
-            return Appliance(name, status)
-        else:
-            raise ValueError(f"Unsupported device type: {device_type}")
+        try:
+            device_class = DEVICE_CLASSES[device_row.type]
+        except KeyError:
+            raise ValueError(f"Unsupported device type: {device_row.type}")
+
+        #Skip the Validating __init__ Chain for Stored Rows
+        device = object.__new__(device_class)
+        device._name = device_row.name
+        device._status = bool(device_row.status)
+        device._load(device_row)
+        return device
 
     def __str__(self):
         return f"{self._name} ({'On' if self._status else 'Off'})"
@@ -144,126 +141,156 @@ class SmartDevice(ABC):
 
 #Device Subclasses
 class BasicLight(SuperLight, SmartDevice):
-    ALLOWED_COLOURS = {Colour.DEFAULT} #Restrcits Colour Options
+    __slots__ = ('_brightness', '_colour')
+    POWER_DRAW = 5 #Watts When On
     
     #Initialising
     def __init__(self, name, brightness, colour: Colour, status=False):
         SmartDevice.__init__(self, name, status)
         SuperLight.__init__(self, brightness, colour)
-
-    def _is_colour_allowed(self, colour: Colour) -> bool:
-        return colour in self.ALLOWED_COLOURS
     
     #Overriding Base Class Abstract Method
     def get_energy_usage(self):
-        return 5 if self._status else 0
+        return self.POWER_DRAW if self._status else 0
 
 class ColourLight(SuperLight, SmartDevice):
+    __slots__ = ('_brightness', '_colour')
+    POWER_DRAW = 5
+
     def __init__(self, name, brightness, colour: Colour, status=False):
         SmartDevice.__init__(self, name, status)
         SuperLight.__init__(self, brightness, colour)
-
-    def _is_colour_allowed(self, colour: Colour) -> bool:
-        return True  #All Colours Allowed
     
     def get_energy_usage(self):
-        return 5 if self._status else 0
+        return self.POWER_DRAW if self._status else 0
 
 class Kettle(SuperTemp, SmartDevice):
+    __slots__ = ('_temperature',)
+    POWER_DRAW = 20
+    DEFAULT_TEMPERATURE = 100
+
     def __init__(self, name, temperature, status=False):
         SmartDevice.__init__(self, name, status)
         SuperTemp.__init__(self, temperature)
 
-    #Overwriting Base Class Temperature Validation
-    @SuperTemp.temperature.setter
-    def temperature(self, value):
-        if 60 <= value <= 100:
-            self._temperature = value
-        else:
-            raise ValueError("Temperature must be between 60 and 100")    
-
     def get_energy_usage(self):
-        return 20 if self._status else 0
+        return self.POWER_DRAW if self._status else 0
     
 class Thermostat(SuperTemp, SmartDevice):
+    __slots__ = ('_temperature',)
+    POWER_DRAW = 50
+
     def __init__(self, name, temperature, status=False):
         SmartDevice.__init__(self, name, status)
         SuperTemp.__init__(self, temperature)
 
-    @SuperTemp.temperature.setter
-    def temperature(self, value):
-        if 10 <= value <= 30:
-            self._temperature = value
-        else:
-            raise ValueError("Temperature must be between 10 and 30")   
-         
     def get_energy_usage(self):
-        return 50 if self._status else 0
+        return self.POWER_DRAW if self._status else 0
 
 class Boiler(SuperTemp, SmartDevice):
+    __slots__ = ('_temperature',)
+    POWER_DRAW = 50
+    DEFAULT_TEMPERATURE = 50
+
     def __init__(self, name, temperature, status=False):
         SmartDevice.__init__(self, name, status)
         SuperTemp.__init__(self, temperature)
 
-    @SuperTemp.temperature.setter
-    def temperature(self, value):
-        if 40 <= value <= 60:
-            self._temperature = value
-        else:
-            raise ValueError("Temperature must be between 40 and 60")    
-
     def get_energy_usage(self):
-        return 50 if self._status else 0
+        return self.POWER_DRAW if self._status else 0
 
 
 class Camera(SmartDevice):
+    __slots__ = ()
+    POWER_DRAW = 10
+
     def __init__(self, name, status=False):
         super().__init__(name, status)
 
     def get_energy_usage(self):
-        return 10 if self._status else 0
+        return self.POWER_DRAW if self._status else 0
 
 class DoorLock(SmartDevice):
+    __slots__ = ()
+    POWER_DRAW = 2
+
     def __init__(self, name, status=False):
         super().__init__(name, status)
 
     def get_energy_usage(self):
-        return 2 if self._status else 0
+        return self.POWER_DRAW if self._status else 0
 
 class Appliance(SmartDevice):
+    __slots__ = ()
+    POWER_DRAW = 10
+
     def __init__(self, name, status=False):
         super().__init__(name, status)
         
     def get_energy_usage(self):
-        return 10 if self._status else 0
-    
+        return self.POWER_DRAW if self._status else 0
+
+
+#Dispatch Table for SmartDevice.from_db
+DEVICE_CLASSES = {cls.__name__: cls for cls in (
+    BasicLight, ColourLight, Thermostat, Camera, DoorLock, Kettle, Boiler, Appliance)}
+
+#Watts Drawn by Each Device Type When On
+DEVICE_WATTAGE = {name: cls.POWER_DRAW for name, cls in DEVICE_CLASSES.items()}
+
+#Integer Stored in devices.type_code; Append New Types, Never Renumber
+DEVICE_TYPE_CODES = {
+    'BasicLight': 1, 'ColourLight': 2, 'Thermostat': 3, 'Camera': 4,
+    'DoorLock': 5, 'Kettle': 6, 'Boiler': 7, 'Appliance': 8,
+}
+DEVICE_TYPE_NAMES = {code: name for name, code in DEVICE_TYPE_CODES.items()}
 
 #Code for All Device Behaviour
+#The System Keeps Its Own Columnar Copy of Each Device's State
 class SmartHomeSystem:
-    def __init__(self):
-        self._devices = []
+    def __init__(self, home_id=1):
+        self.home_id = home_id #Household Whose Devices These Are
+        self._fleet = FleetStore(DEVICE_TYPE_CODES, DEVICE_WATTAGE, Colour.__members__)
+
+    def __len__(self):
+        return self._fleet.size
 
     #Add a Device
     def add_device(self, device):
-        self._devices.append(device)
+        colour = getattr(device, "colour", None)
+        self._fleet.append(
+            device.name,
+            device.type,
+            device.is_on,
+            getattr(device, "temperature", None),
+            getattr(device, "brightness", None),
+            colour.name if colour else None,
+        )
 
     #Remove a Device
     def remove_device(self, name):
-        self._devices = [d for d in self._devices if d._name != name]
+        self._fleet.remove(name)
+
+    #Rebuild a Device Object from the Stored Columns
+    def get_device(self, name):
+        return SmartDevice.from_db(self._fleet.row(name))
 
     #Turn Off All Devices
     def turn_all_off(self):
-        for device in self._devices:
-            device.turn_off()
+        self._fleet.set_all_status(False)
 
     #Calculate Total Energy Usage
     def get_total_energy_usage(self):
-        return sum(device.get_energy_usage() for device in self._devices)
+        return self._fleet.total_energy()
+
+    def get_energy_by_type(self):
+        return self._fleet.energy_by_type()
 
     #Show Device Status
     def show_devices(self):
-        for device in self._devices:
-            print(device)
+        fleet = self._fleet
+        for i, name in enumerate(fleet.names):
+            print(f"{name} ({'On' if fleet.status[i] else 'Off'})")
 
 #Error Handling
 class InvalidDeviceTypeError(Exception):
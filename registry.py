@@ -0,0 +1,144 @@
+import threading
+
+#Compact Copy of One Devices Row
+class DeviceRecord:
+    __slots__ = ('id', 'name', 'type', 'status', 'temperature', 'brightness', 'colour', 'version', 'home_id')
+
+    def __init__(self, id, name, type, status=False, temperature=None, brightness=None, colour=None, version=0,
+                 home_id=1):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.status = status
+        self.temperature = temperature
+        self.brightness = brightness
+        self.colour = colour
+        self.version = version
+        self.home_id = home_id
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row.name, row.type, bool(row.status), row.temperature,
+                   row.brightness, row.colour, row.version, row.home_id)
+
+    def __repr__(self):
+        return f"<DeviceRecord {self.id} {self.type} v{self.version}>"
+
+    def delta(self, previous=None): #Fields Changed Since previous, Always with id and version
+        return {field: getattr(self, field) for field in DeviceRecord.__slots__
+                if field in ('id', 'version') or previous is None
+                or getattr(previous, field) != getattr(self, field)}
+
+#Process-Local State of One Home's Devices, Keyed by ID
+class DeviceRegistry:
+    def __init__(self, home_id=1, listeners=None):
+        self.home_id = home_id
+        self._records = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.high_water = 0 #Highest Version Seen While Syncing
+        self.synced_at = 0.0
+        self._listeners = [] if listeners is None else listeners #Called with (Home, Deltas); None After a Reload
+        self._type_versions = {} #Type -> Counter Bumped on Every Change to a Device of That Type
+        self.generation = 0 #Bumped on Every Full Reload
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _notify(self, deltas):
+        if deltas or deltas is None:
+            for listener in self._listeners:
+                listener(self.home_id, deltas)
+
+    def replace(self, rows): #Full Reload
+        records = {}
+        high_water = 0
+        for row in rows:
+            record = DeviceRecord.from_row(row)
+            records[record.id] = record
+            high_water = max(high_water, record.version)
+        with self._lock:
+            reloaded = self.loaded
+            self.generation += 1
+            self._records = records
+            self.high_water = high_water
+            self.loaded = True
+        if reloaded:
+            self._notify(None)
+
+    def merge(self, rows): #Apply Rows Changed Since the Last Sync
+        self.put_many((DeviceRecord.from_row(row) for row in rows), sync=True)
+
+    #Write-Through from Local Mutations (Leaves high_water Alone)
+    def put(self, record):
+        self.put_many((record,))
+
+    def put_many(self, records, sync=False, force=False): #force Replaces Even a Higher (Provisional) Version
+        deltas = []
+        with self._lock:
+            for record in records:
+                current = self._records.get(record.id)
+                if force or current is None or current.version < record.version:
+                    deltas.append(record.delta(current))
+                    self._bump(record.type)
+                    if current is not None and current.type != record.type:
+                        self._bump(current.type)
+                if force or current is None or current.version <= record.version:
+                    self._records[record.id] = record
+                if sync:
+                    self.high_water = max(self.high_water, record.version)
+        self._notify(deltas)
+
+    def discard(self, device_id):
+        with self._lock:
+            removed = self._records.pop(device_id, None)
+            if removed is not None:
+                self._bump(removed.type)
+        if removed is not None:
+            self._notify([{'id': device_id, 'deleted': True}])
+
+    def _bump(self, device_type): #Caller Holds the Lock
+        self._type_versions[device_type] = self._type_versions.get(device_type, 0) + 1
+
+    def type_version(self, device_type): #Changes Whenever Any Device of the Type Does
+        return (self.generation, self._type_versions.get(device_type, 0))
+
+    def invalidate(self):
+        with self._lock:
+            self._records = {}
+            self.high_water = 0
+            self.loaded = False
+
+    def get(self, device_id):
+        return self._records.get(device_id)
+
+    def values(self):
+        return list(self._records.values())
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, device_id):
+        return device_id in self._records
+
+#One Registry per Home, Created and Loaded on First Use
+class HomeRegistries:
+    def __init__(self):
+        self._registries = {}
+        self._lock = threading.Lock()
+        self._listeners = [] #Shared by Every Home's Registry
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def __getitem__(self, home_id):
+        registry = self._registries.get(home_id)
+        if registry is None:
+            with self._lock:
+                registry = self._registries.setdefault(home_id, DeviceRegistry(home_id, self._listeners))
+        return registry
+
+    def homes(self):
+        return list(self._registries)
+
+registries = HomeRegistries()
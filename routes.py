@@ -1,361 +1,657 @@
-from flask import render_template, redirect, url_for, flash, request
-from app import app, scheduler
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, jsonify, session, g, Response, stream_with_context
+from schedulers import scheduler, schedulers
 from forms import *
 from database import *
 from models import *
 from tasks import *
+from commands import run_command, build_command, BulkCommandError, ACTIONS, ACTION_FIELDS, LIGHT_TYPES, TEMPERATURE_RANGES, DEVICE_GROUPS
+from telemetry import recorder, energy_history
+from events import hub, format_event, last_event_id
+from fragments import sections as section_cache
+from metrics import metrics, profiler, begin_request, finish_request
+from registry import registries
+from tenancy import HomeError, current_home, enter_home, parse_home
+from inventory import InventoryError, detect_format, out_of_range, read_devices, export_devices, validate_row
+from validation import ValidationError, check, check_changes
+from writebehind import writes
+from labels import LabelError, add_label, device_labels, label_counts, remove_label, select_ids, selector_condition
+from journal import JournalError, STATE_FIELDS, journal, position, recent, replay, undo, as_json as command_json
+from apscheduler.jobstores.base import JobLookupError
+from markupsafe import Markup
+import io
 from collections import defaultdict
-from datetime import datetime
-
-
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+main = Blueprint('main', __name__)
+
+#Instrumentation: Latency and SQL per Route, Read by Prometheus from /metrics
+def route_label(): #URL Rule Rather Than Path, to Keep Label Values Few
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@main.before_app_request
+def start_request_metrics():
+    g.request_timer = begin_request()
+
+@main.after_app_request
+def record_request_metrics(response):
+    timer = g.pop('request_timer', None)
+    if timer is not None:
+        finish_request(timer, route_label(), request.method, response.status_code)
+    return response
+
+@main.teardown_app_request
+def record_failed_request(error=None): #Unhandled Errors Skip after_request
+    timer = g.pop('request_timer', None)
+    if timer is not None:
+        finish_request(timer, route_label(), request.method, 500)
+
+metrics.gauge('smarthome_event_subscribers', 'Open /events streams', lambda: len(hub))
+metrics.gauge('smarthome_homes_loaded', 'Homes with a device registry in this process', lambda: len(registries.homes()))
+metrics.gauge('smarthome_telemetry_pending_samples', 'Energy samples waiting to be flushed', recorder.pending)
+metrics.gauge('smarthome_write_behind_pending_devices', 'Devices with commands waiting to be written', writes.pending)
+metrics.gauge('smarthome_write_behind_commands_total', 'Commands acknowledged from memory',
+              lambda: writes.accepted, kind='counter')
+metrics.gauge('smarthome_write_behind_written_total', 'Device rows written by flushes',
+              lambda: writes.written, kind='counter')
+metrics.gauge('smarthome_journal_pending_commands', 'Journal rows waiting to be written', journal.pending)
+metrics.gauge('smarthome_journal_commands_total', 'Commands recorded in the journal',
+              lambda: journal.recorded, kind='counter')
+metrics.gauge('smarthome_dashboard_section_hits_total', 'Dashboard sections served from cache',
+              lambda: section_cache.hits, kind='counter')
+metrics.gauge('smarthome_dashboard_section_misses_total', 'Dashboard sections rendered',
+              lambda: section_cache.misses, kind='counter')
+
+@main.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+#Switch the Sampling Profiler; Slow Requests are Written to PROFILER_DIRECTORY as Folded Stacks
+#Only Where PROFILER_ENABLED Opted In, so No Client Can Start Writing Stack Files
+@main.route('/metrics/profiler', methods=['GET', 'POST'])
+def profiler_switch():
+    if request.method == 'POST':
+        if not current_app.config['PROFILER_ENABLED']:
+            return jsonify(error="The profiler is not enabled; set PROFILER_ENABLED=1"), 403
+        data = request.get_json(silent=True) or request.form
+        if str(data.get('enabled', '1')).lower() in ('1', 'true', 'on'):
+            profiler.start()
+        else:
+            profiler.stop()
+    return jsonify(enabled=profiler.enabled, slow_seconds=profiler.slow_seconds,
+                   directory=profiler.directory, written=profiler.written)
+
+#Schedulers Start with the First Request a Process Serves, Not When it is Imported
+@main.before_app_request
+def start_schedulers():
+    if not schedulers.started:
+        schedulers.start()
+
+#Every Request Serves One Home: X-Home-ID Header, Then ?home=, Then the Home Picked Below
+@main.before_app_request
+def select_home():
+    enter_home(parse_home(request.headers.get('X-Home-ID'), request.args.get('home'), session.get('home_id')))
+
+@main.app_context_processor
+def inject_home():
+    return {'home_id': current_home()}
+
+@main.route('/homes', methods=['POST']) #Switch the Browser to Another Home
+def switch_home():
+    session['home_id'] = parse_home(request.form.get('home_id'))
+    flash(f"Switched to Home {session['home_id']}")
+    return redirect(url_for('.view_all'))
 
 #Main Routes
-@app.route('/')
+@main.route('/')
 def home():
     return render_template('index.html')
 
 #Add a Device
-@app.route('/add', methods=['GET', 'POST'])
+@main.route('/add', methods=['GET', 'POST'])
 def add_device():
     form = AddDeviceForm()
     if form.validate_on_submit():
-        device = Device(
-            name=form.name.data,
-            type=form.type.data,
-            status=False,
-            temperature=form.temperature.data if form.temperature.data else None,
-            brightness=form.brightness.data if form.brightness.data else 0
-        )
-        db.session.add(device)
-        db.session.commit()
+        #The Checks an Import Makes, so an Exported Device Always Imports Again
+        try:
+            values = validate_row({'name': form.name.data, 'type': form.type.data, 'status': False,
+                                   'temperature': form.temperature.data, 'brightness': form.brightness.data})
+        except InventoryError as error:
+            flash(f"{error.message}.", "error")
+            return render_template('add.html', form=form, title='Add Device')
+        problem = out_of_range([values]).get(0)
+        if problem:
+            flash(f"{problem}.", "error")
+            return render_template('add.html', form=form, title='Add Device')
+        add_device_row(**values)
         flash("Device Added")
-        return redirect(url_for('view_all'))
+        return redirect(url_for('.view_all'))
     return render_template('add.html', form=form, title='Add Device')
 
 #Device Dashboard
-@app.route('/alldevices', methods=['GET'])
+def render_section(device_type, where=None): #First Page of One Type's Table, Further Pages Load Separately
+    devices = get_devices_page(device_type, 1, current_app.config['DASHBOARD_SECTION_SIZE'], count=False,
+                               where=where).items
+    return render_template('_device_table.html', type=device_type, devices=devices,
+                           device_wattage=DEVICE_WATTAGE)
+
+def requested_selector(): #?selector=room:kitchen AND type:light, as Text and a WHERE Clause
+    selector = request.args.get('selector', '').strip()
+    return selector, selector_condition(selector) if selector else None
+
+@main.route('/alldevices', methods=['GET'])
 def view_all():
-    devices = Device.query.all()
-
-    grouped_devices = defaultdict(list)
-    device_objects = {}
-
-    for dev in devices:
-        grouped_devices[dev.type].append(dev)
-
-        obj = None
-        if dev.type == 'BasicLight':
-            obj = BasicLight(dev.name, dev.brightness, Colour.DEFAULT, dev.status)
-        elif dev.type == 'ColourLight':
-            colour_enum = colour_from_string(dev.colour)
-            obj = ColourLight(dev.name, dev.brightness, colour_enum, dev.status)
-        elif dev.type == 'Kettle':
-            obj = Kettle(dev.name, temperature=dev.temperature or 100, status=dev.status)
-        elif dev.type == 'Boiler':
-            obj = Boiler(dev.name, temperature=dev.temperature or 50, status=dev.status)
-        elif dev.type == 'Thermostat':
-            obj = Thermostat(dev.name, temperature=dev.temperature or 20, status=dev.status)
-        elif dev.type == 'Camera':
-            obj = Camera(dev.name, dev.status)
-        elif dev.type == 'DoorLock':
-            obj = DoorLock(dev.name, dev.status)
-     
-        if obj is not None and dev.id is not None:
-            device_objects[int(dev.id)] = obj
-
-    total_energy = sum(obj.get_energy_usage() for obj in device_objects.values())
+    selector, where = requested_selector()
+    sync_devices() #Other Workers' Writes Bump Their Type's Version
+    summaries = get_type_summary(where)
+
+    #A Type's Table is Only Re-Rendered After One of its Devices Changes; Filtered Tables are Not Cached
+    registry = home_registry()
+    sections = {
+        summary.type: Markup(render_section(summary.type, where)) if where is not None else
+        section_cache.get((registry.home_id, summary.type), registry.type_version(summary.type),
+                          lambda device_type=summary.type: render_section(device_type))
+        for summary in summaries
+    }
+    total_energy = sum(summary.energy for summary in summaries)
 
     return render_template(
         "devicelist.html",
-        grouped_devices=grouped_devices,
-        device_objects=device_objects,
+        summaries=summaries,
+        sections=sections,
+        section_size=current_app.config['DASHBOARD_SECTION_SIZE'],
         total_energy=total_energy,
+        selector=selector,
         title = 'Devices'
     )
 
-@app.route('/toggle/<int:device_id>', methods=['GET', 'POST']) #To Turn Device On or Off
+#Paginated Devices of One Type
+@main.route('/alldevices/<device_type>', methods=['GET'])
+def view_type(device_type):
+    if device_type not in DEVICE_WATTAGE:
+        raise InvalidDeviceTypeError(f"Unknown device type: {device_type}")
+
+    selector, where = requested_selector()
+    page = request.args.get('page', 1, type=int)
+    pagination = get_devices_page(device_type, page, current_app.config['DEVICES_PER_PAGE'], where=where)
+    return render_template(
+        "devicetype.html",
+        type=device_type,
+        devices=pagination.items,
+        pagination=pagination,
+        device_wattage=DEVICE_WATTAGE,
+        selector=selector,
+        title=f'{device_type}s'
+    )
+
+@main.route('/toggle/<int:device_id>', methods=['GET', 'POST']) #To Turn Device On or Off
 def toggle_device(device_id):
-    device = Device.query.get_or_404(device_id)
-    device.toggle_status()
-    db.session.commit()
+    device = get_device_or_404(device_id)
+    device = update_device(device_id, status=not device.status)
+    recorder.record(device)
+    if request.headers.get('HX-Request'): #Partial Update, Just the Changed Row
+        return render_device_row(device)
     return redirect('/alldevices')
 
+#Single Table Row, for Partial Page Updates
+def render_device_row(device):
+    return render_template('_device_row.html', device=device, type=device.type, device_wattage=DEVICE_WATTAGE)
+
+@main.route('/device/<int:device_id>/row', methods=['GET'])
+def device_row(device_id):
+    return render_device_row(get_device_or_404(device_id))
+
 #Device Information Page
-@app.route("/device/<int:device_id>", methods=['GET', 'POST'])
+@main.route("/device/<int:device_id>", methods=['GET', 'POST'])
 def device_info(device_id):
-    device = Device.query.get_or_404(device_id)  #Fetch Device or Show 404
+    device = get_device_or_404(device_id)  #Fetch Device or Show 404
     return render_template("deviceinfo.html", device=device, title='Device Information')
 
 #Updating Temperature
-@app.route('/update_temperature/<int:device_id>', methods=['GET', 'POST'])
+@main.route('/update_temperature/<int:device_id>', methods=['GET', 'POST'])
 def update_temperature(device_id):
-    device = Device.query.get_or_404(device_id)
+    device = get_device_or_404(device_id)
 
-    if device.type not in ['Thermostat', 'Kettle', 'Boiler']:
+    if device.type not in TEMPERATURE_RANGES:
         raise InvalidDeviceTypeError("Temperature can't be updated for this device.")
 
     form = UpdateTemperatureForm()
 
     if form.validate_on_submit():
-        new_temp = form.temperature.data
         #Validating input
-        if device.type == 'Thermostat' and not (10 <= new_temp <= 30):
-            flash("Temperature must be between 10 and 30 for a Thermostat.", "error")
-            return redirect(url_for('update_temperature', device_id=device.id))
-        if device.type == 'Kettle' and not (50 <= new_temp <= 100):
-            flash("Temperature must be between 50 and 100 for a Kettle.", "error")
-            return redirect(url_for('update_temperature', device_id=device.id))
-        if device.type == 'Boiler' and not (40 <= new_temp <= 60):
-            flash("Temperature must be between 40 and 60 for a Kettle.", "error")
-            return redirect(url_for('update_temperature', device_id=device.id))
-
-        device.temperature = new_temp
-        db.session.commit()
+        try:
+            new_temp = check(device.type, 'temperature', form.temperature.data)
+        except ValidationError as error:
+            flash(f"{error.message}.", "error")
+            return redirect(url_for('.update_temperature', device_id=device.id))
+
+        update_device(device_id, temperature=new_temp)
         flash("Changes Saved")
-        return redirect(url_for('view_all'))
+        return redirect(url_for('.view_all'))
     return render_template('update_temperature.html', form=form, device=device, title='Update Temperature')
 
 #Updating Light Settings
-@app.route('/update_light/<int:device_id>', methods=['GET', 'POST'])
+@main.route('/update_light/<int:device_id>', methods=['GET', 'POST'])
 def update_light(device_id):
-    device = Device.query.get_or_404(device_id)
+    device = get_device_or_404(device_id)
 
-    if device.type not in ('BasicLight', 'ColourLight'):
+    if device.type not in LIGHT_TYPES:
         raise InvalidDeviceTypeError("Brightness can't be updated for this device.")
 
     form = UpdateBrightnessForm()
 
     if form.validate_on_submit():
-        new_brightness = form.brightness.data
-        selected_colour = form.colour.data
-
-        # Basic validation
-        if not (0 <= new_brightness <= 100):
-            flash("Brightness must be between 0 and 100.", "error")
-            return redirect(url_for('update_light', device_id=device.id))
-
-
-        # Update brightness
-        device.brightness = new_brightness
-
-        # Update colour if applicable
-        if hasattr(device, "colour") and selected_colour:
-            try:
-                device.colour = Colour[selected_colour.upper()].value  
-            except KeyError:
-                raise InvalidDeviceTypeError("Invalid colour selected.")
-
-        db.session.commit()
+        # Brightness, and Colour if Submitted, Checked Against the Type's Rules
+        changes = {'brightness': form.brightness.data}
+        if form.colour.data:
+            changes['colour'] = form.colour.data
+        try:
+            changes = check_changes(device.type, changes)
+        except ValidationError as error:
+            flash(f"{error.message}.", "error")
+            return redirect(url_for('.update_light', device_id=device.id))
+
+        update_device(device_id, **changes)
         flash("Changes Saved")
-        return redirect(url_for('view_all'))
+        return redirect(url_for('.view_all'))
     return render_template('update_light.html', form=form, device=device, title='Change Light')
 
 #Updating Device Name
-@app.route('/update_name/<int:device_id>', methods=['GET', 'POST'])
+@main.route('/update_name/<int:device_id>', methods=['GET', 'POST'])
 def update_name(device_id):
-    device = Device.query.get_or_404(device_id)
+    device = get_device_or_404(device_id)
 
     form = UpdateNameForm()
 
     if form.validate_on_submit():
         new_name = form.name.data
-        device.name = new_name
-        db.session.commit()
+        update_device(device_id, name=new_name)
         flash('Changes Saved')
-        return redirect(url_for('view_all'))
+        return redirect(url_for('.view_all'))
 
     return render_template('update_name.html', form=form, device=device, title='Change Name')
 
 #Delete a Device
-@app.route('/delete/<int:device_id>', methods=['POST'])
+@main.route('/delete/<int:device_id>', methods=['POST'])
 def delete_device(device_id):
-    device = Device.query.get_or_404(device_id)
-    db.session.delete(device)
-    db.session.commit()
+    get_device_or_404(device_id)
+    delete_device_row(device_id)
     flash('Device Deleted')
-    return redirect(url_for('view_all'))
-
-
-@app.route('/turn_off_lights', methods=['POST']) #Turn all Lights Off
+    return redirect(url_for('.view_all'))
+
+
+#Bulk Device Commands
+@main.route('/devices/command', methods=['POST'])
+def bulk_command():
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {
+            'action': request.form.get('action'),
+            'value': request.form.get('value'),
+            'types': request.form.getlist('types'),
+            'ids': request.form.getlist('ids'),
+            'selector': request.form.get('selector'),
+        }
+    action = data.get('action')
+    affected = run_command(action, data.get('value'), data.get('types'), data.get('ids'), data.get('selector'))
+    return jsonify(action=action, affected=affected)
+
+@main.route('/turn_off_lights', methods=['POST']) #Turn all Lights Off
 def turn_off_lights():
-    lights = Device.query.filter(Device.type.in_(['BasicLight', 'ColourLight'])).all()
-    for light in lights:
-        light.status = False
-    db.session.commit()
-    flash('All Lights Off')
-    return redirect(url_for('view_all'))
-
-@app.route('/turn_on_lights', methods=['POST']) #Turn all Lights On
+    count = run_command('off', types=LIGHT_TYPES)
+    flash(f'All Lights Off ({count})')
+    return redirect(url_for('.view_all'))
+
+@main.route('/turn_on_lights', methods=['POST']) #Turn all Lights On
 def turn_on_lights():
-    lights = Device.query.filter(Device.type.in_(['BasicLight', 'ColourLight'])).all()
-    for light in lights:
-        light.status = True
-    db.session.commit()
-    flash('All Lights On')
-    return redirect(url_for('view_all'))
-
-@app.route('/lock_all_doors', methods=['POST']) #Lock all Doors
+    count = run_command('on', types=LIGHT_TYPES)
+    flash(f'All Lights On ({count})')
+    return redirect(url_for('.view_all'))
+
+@main.route('/lock_all_doors', methods=['POST']) #Lock all Doors
 def lock_all_doors():
-    locks = Device.query.filter_by(type='DoorLock').all()
-    for lock in locks:
-        lock.status = True
-    db.session.commit()
-    flash('Doors Locked')
-    return redirect(url_for('view_all'))
-
-@app.route('/maximum_security',  methods=['GET','POST']) #Maximum Security Toggle
+    count = run_command('on', types=['DoorLock'])
+    flash(f'Doors Locked ({count})')
+    return redirect(url_for('.view_all'))
+
+@main.route('/maximum_security',  methods=['GET','POST']) #Maximum Security Toggle
 def max_security():
-    locks = Device.query.filter_by(type='DoorLock').all()
-    for lock in locks:
-        lock.status = True
-    db.session.commit()
-    cameras = Device.query.filter_by(type='Camera').all()
-    for camera in cameras:
-        camera.status = True
-    db.session.commit()
+    run_command('on', selector=current_app.config['SECURITY_SELECTOR'])
     flash("Maximum Security On")
-    return redirect(url_for('home'))
+    return redirect(url_for('.home'))
+
+#Command Journal: Recent Commands, State at Any Past Point, and Undo
+@main.route('/journal', methods=['GET'])
+def journal_commands():
+    limit = min(request.args.get('limit', 50, type=int), current_app.config['API_MAX_PER_PAGE'])
+    commands = recent(request.args.get('device', type=int), request.args.get('before', type=int), limit)
+    return jsonify(commands=[command_json(command) for command in commands])
+
+@main.route('/journal/state', methods=['GET']) #?command=ID or ?at=2026-10-18T09:30, Else Now; ?device=ID
+def journal_state():
+    command_id = request.args.get('command', type=int)
+    at = request.args.get('at')
+    if command_id is None and at:
+        try:
+            command_id = position(datetime.fromisoformat(at))
+        except ValueError:
+            raise JournalError(f"at must be an ISO date and time, got {at!r}")
+    if command_id is None:
+        journal.flush() #Include Commands Still Buffered
+        command_id = position()
+    state = replay(command_id)
+    device_id = request.args.get('device', type=int)
+    if device_id is not None:
+        state = {device_id: state[device_id]} if device_id in state else {}
+    return jsonify(command=command_id,
+                   devices=[dict(zip(('id', *STATE_FIELDS), (device_id, *values)))
+                            for device_id, values in sorted(state.items())])
+
+@main.route('/journal/<int:command_id>/undo', methods=['POST'])
+def undo_journal_command(command_id):
+    restored, skipped = undo(command_id)
+    return jsonify(command=command_id, restored=restored, skipped=skipped) #Skipped Devices Changed Since
+
+#Rooms, Floors and Tags
+@main.route('/labels', methods=['GET'])
+def labels():
+    return jsonify(label_counts())
+
+#Label the Devices a Selector and/or ids Match: {"kind": "room", "name": "kitchen", "selector": "type:light"}
+#DELETE Takes the Same Body; Without a name it Removes Every Label of the Kind
+@main.route('/labels', methods=['POST', 'DELETE'])
+def change_labels():
+    data = request.get_json(silent=True) or request.form
+    kind, name = data.get('kind'), data.get('name')
+    ids = data.get('ids') if request.is_json else request.form.getlist('ids')
+    if request.method == 'POST':
+        count = add_label(kind, name, data.get('selector'), ids)
+    else:
+        count = remove_label(kind, name or None, data.get('selector'), ids)
+    return jsonify(kind=kind, name=name, devices=count)
+
+@main.route('/device/<int:device_id>/labels', methods=['GET'])
+def labels_of_device(device_id):
+    get_device_or_404(device_id)
+    return jsonify(device_labels(device_id))
+
+@main.route('/devices/select', methods=['GET']) #IDs a Selector Matches, Resolved in One Query
+def select_devices():
+    selector = request.args.get('selector', '')
+    ids = select_ids(selector)
+    return jsonify(selector=selector, count=len(ids), ids=ids)
+
+#Bulk Import of a CSV or NDJSON Upload (or Raw Body), Parsed as it Streams In
+@main.route('/devices/import', methods=['POST'])
+def import_inventory():
+    upload = request.files.get('file')
+    if upload:
+        fmt = detect_format(upload.filename, upload.mimetype, request.args.get('format'))
+        source = upload.stream
+    else:
+        fmt = detect_format(mimetype=request.mimetype, requested=request.args.get('format'))
+        source = request.stream
+    result = read_devices(io.TextIOWrapper(source, encoding='utf-8', newline=''), fmt,
+                          current_app.config['INVENTORY_CHUNK_SIZE'], request.args.get('stop_on_error') == '1')
+    return jsonify(result.as_dict())
+
+#Streamed Export of Every Device
+@main.route('/devices/export', methods=['GET'])
+def export_inventory():
+    fmt = detect_format(requested=request.args.get('format', 'csv'))
+    return Response(
+        stream_with_context(export_devices(fmt, current_app.config['INVENTORY_CHUNK_SIZE'], current_home())),
+        mimetype='application/x-ndjson' if fmt == 'ndjson' else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename=devices.{fmt}'},
+    )
+
+#Energy History from the Telemetry Rollups
+@main.route('/energy', methods=['GET'])
+def energy():
+    days = request.args.get('days', 30, type=float)
+    resolution, rows = energy_history(datetime.now() - timedelta(days=days))
+
+    by_type = defaultdict(float)
+    series = defaultdict(float)
+    for bucket, device_type, energy_wh in rows:
+        by_type[device_type] += energy_wh
+        series[bucket.isoformat()] += energy_wh
+    return jsonify(
+        days=days,
+        resolution=resolution,
+        total_wh=round(sum(by_type.values()), 3),
+        by_type={t: round(wh, 3) for t, wh in by_type.items()},
+        series=[{'bucket': bucket, 'energy_wh': round(wh, 3)} for bucket, wh in series.items()],
+    )
+
+#Live Device Changes as Server-Sent Events
+#Each Stream Holds a Worker Thread for as Long as it is Open, so Past EVENTS_MAX_STREAMS the Answer is 503
+@main.route('/events', methods=['GET'])
+def device_events():
+    subscription = hub.subscribe(current_home(), last_event_id(request.headers.get('Last-Event-ID')),
+                                 limit=current_app.config['EVENTS_MAX_STREAMS'])
+    if subscription is None:
+        return Response('Too many open event streams\n', status=503, mimetype='text/plain',
+                        headers={'Retry-After': '30'})
+    keepalive = current_app.config['EVENTS_KEEPALIVE']
+
+    def stream():
+        try:
+            yield 'retry: 2000\n\n'
+            while True:
+                yield format_event(subscription.get(keepalive))
+        finally:
+            hub.unsubscribe(subscription) #Client Went Away
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 #Scheduling Pages
-@app.route('/viewschedules', methods=['GET', 'POST'])
+def schedule_choices(): #Named Groups and Selectors for Scene Jobs; One Device is Picked by ID, Not from a List
+    groups = [(f'group:{key}', f'{label} (Scene)') for key, (label, types) in DEVICE_GROUPS.items()]
+    groups.append(('selector', 'Devices Matching the Selector (Scene)'))
+    return [('device', 'One Device (by ID)')] + groups
+
+def describe_schedule(row): #Display Details Read from the Schedules Table
+    if row.selector:
+        target = f'Matching {row.selector}'
+    elif row.device_group:
+        target = DEVICE_GROUPS.get(row.device_group, (row.device_group,))[0]
+    else:
+        device = get_device_by_id(row.device_id)
+        target = device.name if device else f'Device {row.device_id}'
+    return {
+        'id': row.job_id,
+        'target': target,
+        'action': row.action,
+        'value': row.value,
+        'repeat': row.repeat,
+        'next_run_time': row.next_run_at,
+    }
+
+def home_job(job_id): #The Job, if it Exists and Belongs to the Current Home
+    job = scheduler.get_job(job_id)
+    return job if job is not None and job_home(job) == current_home() else None
+
+def _parse_day(text): #Filter Dates from the Query String
+    try:
+        return datetime.strptime(text, '%Y-%m-%d') if text else None
+    except ValueError:
+        return None
+
+def job_from_form(form): #Job Function, Args and Trigger for a Submitted Form
+    target = form.target.data
+    action = form.action.data
+
+    if action == "set_colour":
+        value = form.colour.data.upper() if form.colour.data else None
+    elif action == "set_brightness" or action == "set_temperature":
+        value = form.value.data 
+    else:
+        value = None
+
+    trigger = build_trigger(form.trigger.data, form.schedule_time.data,
+                            form.interval_minutes.data, form.cron.data)
+
+    if target.startswith('group:'):
+        group = target.split(':', 1)[1]
+        build_command(action, value, types=DEVICE_GROUPS[group][1]) #Validate Before Saving
+        func, args = run_scene, [group, action]
+    elif target == 'selector':
+        selector = (form.selector.data or '').strip()
+        if not selector:
+            raise ValueError("Enter a selector, e.g. room:kitchen AND type:light")
+        build_command(action, value, selector=selector)
+        func, args = run_selection, [selector, action]
+    else:
+        device = get_device_by_id(form.device_id.data) if form.device_id.data is not None else None
+        if device is None:
+            raise ValueError(f"No device with id {form.device_id.data}" if form.device_id.data is not None
+                             else "Enter the ID of the device to schedule")
+        if value is not None: #Checked Against the Constraint Table Now, Not When the Job Runs
+            value = check(device.type, ACTION_FIELDS[action][0], value)
+        func, args = control_device, [str(form.device_id.data), action]
+    if value is not None:
+        args.append(value)
+    return func, args, trigger
+
+@main.route('/viewschedules', methods=['GET', 'POST'])
 def viewtasks():
-    jobs = scheduler.get_jobs()
-    devices = get_all_devices()
-    device_lookup = {str(d.id): d.name for d in devices}
-    return render_template('scheduled_tasks.html', jobs=jobs, device_lookup=device_lookup)
+    filters = {
+        'device': request.args.get('device', type=int),
+        'action': request.args.get('action') or None,
+        'start': request.args.get('start', ''),
+        'end': request.args.get('end', ''),
+    }
+    end = _parse_day(filters['end'])
+    pagination = get_schedules_page(
+        device_id=filters['device'],
+        action=filters['action'],
+        start=_parse_day(filters['start']),
+        end=end + timedelta(days=1) if end else None, #Inclusive of the End Day
+        page=request.args.get('page', 1, type=int),
+        per_page=current_app.config['SCHEDULES_PER_PAGE'],
+    )
+    tasks = [describe_schedule(row) for row in pagination.items]
+    device = get_device_by_id(filters['device']) if filters['device'] else None #Named Beside the ID Filter
+    return render_template('scheduled_tasks.html', tasks=tasks, pagination=pagination,
+                           filters=filters, device=device, actions=ACTIONS)
 
-@app.route('/schedule', methods=['GET', 'POST'])
+@main.route('/viewschedules/stats', methods=['GET']) #Scheduled Batch Statistics
+def schedule_stats():
+    return jsonify(batch_stats.as_dict())
+
+@main.route('/schedule', methods=['GET', 'POST'])
 def schedule():
     form = ScheduleForm()
-    devices = get_all_devices()
-    form.device_id.choices = [(str(d.id), d.name) for d in devices]
+    form.target.choices = schedule_choices()
 
     if form.validate_on_submit():
-        device_id = form.device_id.data
-        action = form.action.data
-        schedule_time = form.schedule_time.data
-
-        if action == "set_colour":
-            value = form.colour.data
-        elif action == "set_brightness" or action == "set_temperature":
-            value = form.value.data 
-        else:
-            value = None
-
-        #Compose Job ID
-        job_id_parts = [device_id, action]
-        if value is not None:
-            job_id_parts.append(str(value))
-        job_id_parts.append(schedule_time.strftime('%Y%m%d%H%M%S'))
-        job_id = "|".join(job_id_parts)
-
-        args = [device_id, action]
-        if value is not None:
-            if action == "set_colour":
-                args.append(value.upper())
-            else:
-                args.append(value)
-
-        #Schedule the Job
-        scheduler.add_job(
-            id=job_id,
-            func=control_device,
+        try:
+            func, args, trigger = job_from_form(form)
+        except (ValueError, BulkCommandError) as error:
+            flash(getattr(error, 'message', str(error)))
+            return render_template('schedule.html', form=form)
+
+        #Schedule the Job and Index it
+        job = scheduler.add_job(
+            id=uuid4().hex,
+            func=func,
             args=args,
-            trigger='date',
-            run_date=schedule_time,
-            next_run_time=schedule_time,
+            kwargs={'home_id': current_home()},
+            trigger=trigger,
             replace_existing=True
         )
+        save_schedule(job)
 
         flash('Task scheduled!')
-        return redirect(url_for('viewtasks'))
+        return redirect(url_for('.viewtasks'))
     return render_template('schedule.html', form=form)
 
-@app.route('/delete_job/<job_id>')
+@main.route('/delete_job/<job_id>')
 def delete_job(job_id):
-    print("Jobs before delete:", [job.id for job in scheduler.get_jobs()])
-    scheduler.remove_job(job_id)
-    print("Jobs after delete:", [job.id for job in scheduler.get_jobs()])
+    if scheduler.get_job(job_id) is not None and home_job(job_id) is None:
+        flash('Job not found.') #Another Home's Job
+        return redirect(url_for('.viewtasks'))
+    try:
+        scheduler.remove_job(job_id)
+    except JobLookupError:
+        pass #Already Finished, Only the Row is Left
+    delete_schedule(job_id)
     flash('Job deleted successfully.')
-    return redirect(url_for('viewtasks'))
+    return redirect(url_for('.viewtasks'))
 
-@app.route('/edit_job/<job_id>', methods=['GET', 'POST'])
+@main.route('/edit_job/<job_id>', methods=['GET', 'POST'])
 def edit_job(job_id):
-    form = ScheduleForm()
-
-    #Split Job ID Format
-    parts = job_id.split('|')
-    if len(parts) not in [3, 4]:
-        flash('Invalid job format.')
-        return redirect(url_for('viewtasks'))
+    job = home_job(job_id)
+    if job is None:
+        flash('Job not found.')
+        return redirect(url_for('.viewtasks'))
 
-    if len(parts) == 4:
-        device_id, action, value, time_str = parts
-    else:
-        device_id, action, time_str = parts
-        value = None
-
-    schedule_time = datetime.strptime(time_str, '%Y%m%d%H%M%S')
+    form = ScheduleForm()
+    form.target.choices = schedule_choices()
 
     #Populate Form with Existing Job Choices
-    devices = get_all_devices()
-    form.device_id.choices = [(str(d.id), d.name) for d in devices]
-
     if request.method == 'GET':
-        form.device_id.data = device_id
+        target, action, *value = job.args
+        if job.func_ref == 'tasks:run_selection':
+            form.target.data, form.selector.data = 'selector', target
+        elif job.func_ref == 'tasks:run_scene':
+            form.target.data = f'group:{target}'
+        else:
+            form.target.data, form.device_id.data = 'device', int(target)
         form.action.data = action
-        form.schedule_time.data = schedule_time
+        for field, data in trigger_fields(job.trigger).items():
+            getattr(form, field).data = data
         if value:
             if action == "set_colour":
-                form.colour.data = value
+                form.colour.data = value[0]
             else:
-                form.value.data = value
+                form.value.data = value[0]
 
     if form.validate_on_submit():
-        #Remove Old Job
-        scheduler.remove_job(job_id)
-
-        #Get Values from Form
-        device_id = form.device_id.data
-        action = form.action.data
-        schedule_time = form.schedule_time.data
+        try:
+            func, args, trigger = job_from_form(form)
+        except (ValueError, BulkCommandError) as error:
+            flash(getattr(error, 'message', str(error)))
+            return render_template('schedule.html', form=form, editing=True)
 
-        if action == "set_colour":
-            value = form.colour.data
-        elif action in ["set_brightness", "set_temperature"]:
-            value = form.value.data
-        else:
-            value = None
-
-        #Build New Job ID
-        new_parts = [device_id, action]
-        if value is not None:
-            new_parts.append(str(value))
-        new_parts.append(schedule_time.strftime('%Y%m%d%H%M%S'))
-        new_job_id = "|".join(new_parts)
-
-        #Build New args
-        args = [device_id, action]
-        if value is not None:
-            args.append(value.upper() if action == "set_colour" else value)
-
-        #Add New Job
-        scheduler.add_job(
-            id=new_job_id,
-            func=control_device,
-            args=args,
-            trigger='date',
-            run_date=schedule_time,
-            next_run_time=schedule_time,
-            replace_existing=True
-        )
+        #Edit the Job in Place, Keeping its ID
+        scheduler.modify_job(job_id, func=func, args=args, kwargs={'home_id': current_home()})
+        save_schedule(scheduler.reschedule_job(job_id, trigger=trigger))
 
         flash('Job updated successfully.')
-        return redirect(url_for('viewtasks'))
+        return redirect(url_for('.viewtasks'))
 
     return render_template('schedule.html', form=form, editing=True)
 
 #Error Handling
-@app.errorhandler(InvalidDeviceTypeError)
+@main.app_errorhandler(InvalidDeviceTypeError)
 def handle_invalid_device_type(error):
     return render_template('error.html', message=error.message), 400
+
+@main.app_errorhandler(InventoryError)
+def handle_inventory_error(error):
+    return jsonify(error=error.message), 400
+
+@main.app_errorhandler(HomeError)
+def handle_home_error(error):
+    if request.is_json or request.path.startswith('/api/'):
+        return jsonify(error=error.message), 400
+    return render_template('error.html', message=error.message), 400
+
+@main.app_errorhandler(JournalError)
+def handle_journal_error(error):
+    return jsonify(error=error.message), 400
+
+@main.app_errorhandler(LabelError)
+def handle_label_error(error):
+    if request.is_json or request.path.startswith(('/labels', '/devices/select')):
+        return jsonify(error=error.message), 400
+    return render_template('error.html', message=error.message), 400
+
+@main.app_errorhandler(BulkCommandError)
+def handle_bulk_command_error(error):
+    if request.is_json:
+        return jsonify(error=error.message), 400
+    return render_template('error.html', message=error.message), 400
@@ -0,0 +1,97 @@
+import threading
+from werkzeug.local import LocalProxy
+from app import get_app
+
+#APScheduler Instances for This Process, Built on First Use so Importing Anything Starts No Threads
+class Schedulers:
+    def __init__(self):
+        self._jobs = None
+        self._housekeeping = None
+        self._lock = threading.RLock()
+
+    @property
+    def jobs(self): #Persistent Jobs; Paused Here When worker.py Runs Them, but Still Editable
+        with self._lock:
+            if self._jobs is None:
+                self._jobs = self._build_jobs(get_app())
+            return self._jobs
+
+    def use(self, scheduler): #A Process Running its Own Scheduler (worker.py) Looks Jobs Up There
+        with self._lock:
+            self._jobs = scheduler
+
+    @property
+    def started(self):
+        return self._housekeeping is not None
+
+    def start(self): #Background Work a Serving Process Needs; Safe to Call Again
+        with self._lock:
+            if self._housekeeping is not None:
+                return
+            app = get_app()
+            if app.config['WRITE_BEHIND_ENABLED']: #Replays Logs a Crashed Process Left Before Taking Commands
+                from writebehind import writes
+                with app.app_context():
+                    writes.open(app.config['WRITE_BEHIND_DIRECTORY'], app.config['WRITE_BEHIND_MAX_PENDING'],
+                                app.config['WRITE_BEHIND_FSYNC'])
+            if app.config['SCHEDULER_RUN_JOBS']:
+                self.jobs #Due Jobs Run from Now On
+            self._housekeeping = self._build_housekeeping(app)
+
+    def _build_jobs(self, app):
+        from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED
+        from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from database import db
+        from engines import jobstore_engine
+        from executors import CoalescingExecutor, make_pool
+        from tasks import mark_schedule_stale
+
+        scheduler = BackgroundScheduler(jobstores={
+            'default': SQLAlchemyJobStore(engine=jobstore_engine(app, db))
+        }, executors={
+            #Jobs Due in the Same Tick Run as One Batch
+            'default': CoalescingExecutor(
+                make_pool('thread', app.config['WORKER_MAX_WORKERS']),
+                app.config['SCHEDULER_BATCHED_JOBS'],
+                window=app.config['WORKER_COALESCE_WINDOW'],
+                max_wait=app.config['WORKER_COALESCE_MAX_WAIT'],
+            )
+        })
+        #Keep Schedule Rows in Step with Jobs Run Here
+        scheduler.add_listener(mark_schedule_stale, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+        scheduler.start(paused=not app.config['SCHEDULER_RUN_JOBS'])
+        return scheduler
+
+    def _build_housekeeping(self, app): #Not Persisted, Run in Every Serving Process
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from tasks import (flush_journal, flush_telemetry, flush_writes, prune_journal, prune_telemetry,
+                           refresh_schedules, snapshot_journal, sync_for_subscribers)
+
+        housekeeping = BackgroundScheduler()
+        housekeeping.add_job(refresh_schedules, 'interval', seconds=app.config['SCHEDULE_REFRESH_INTERVAL'],
+                             id='schedule_refresh', replace_existing=True)
+        #Registry Changes Made by worker.py Reach Event Subscribers Within One Interval
+        housekeeping.add_job(sync_for_subscribers, 'interval', seconds=app.config['EVENTS_SYNC_INTERVAL'],
+                             id='events_sync', replace_existing=True)
+        #Telemetry Flushing and Retention
+        housekeeping.add_job(flush_telemetry, 'interval', seconds=app.config['TELEMETRY_FLUSH_INTERVAL'],
+                             id='telemetry_flush', replace_existing=True)
+        housekeeping.add_job(prune_telemetry, 'cron', hour=3, id='telemetry_prune', replace_existing=True)
+        #Command Journal Batches, Snapshots and Retention
+        if app.config['JOURNAL_ENABLED']:
+            housekeeping.add_job(flush_journal, 'interval', seconds=app.config['JOURNAL_FLUSH_INTERVAL'],
+                                 id='journal_flush', replace_existing=True)
+            housekeeping.add_job(snapshot_journal, 'interval', seconds=app.config['JOURNAL_SNAPSHOT_INTERVAL'],
+                                 id='journal_snapshot', replace_existing=True)
+            housekeeping.add_job(prune_journal, 'cron', hour=3, minute=30, id='journal_prune', replace_existing=True)
+        if app.config['WRITE_BEHIND_ENABLED']:
+            housekeeping.add_job(flush_writes, 'interval', seconds=app.config['WRITE_BEHIND_INTERVAL'],
+                                 id='writes_flush', replace_existing=True)
+        housekeeping.start()
+        return housekeeping
+
+schedulers = Schedulers()
+
+#Stands in for the Job Scheduler, Building it the First Time Anything Touches it
+scheduler = LocalProxy(lambda: schedulers.jobs)
@@ -0,0 +1,61 @@
+// Partial updates for device tables: toggles swap one row, and rows
+// changed elsewhere are re-fetched when /events reports them.
+(function () {
+    // The server names the stream: Flask's /events, or the async one under ASGI
+    var eventsUrl = document.currentScript.getAttribute('data-events-url');
+
+    function swapRow(deviceId, html) {
+        var row = document.querySelector('tr[data-device-id="' + deviceId + '"]');
+        if (!row) {
+            return;
+        }
+        var body = document.createElement('tbody');
+        body.innerHTML = html.trim();
+        row.replaceWith(body.firstElementChild);
+    }
+
+    function refreshRow(deviceId) {
+        fetch('/device/' + deviceId + '/row', {headers: {'HX-Request': 'true'}})
+            .then(function (response) { return response.ok ? response.text() : null; })
+            .then(function (html) { if (html) { swapRow(deviceId, html); } });
+    }
+
+    // Forms marked data-partial post in the background and replace their row
+    document.addEventListener('submit', function (event) {
+        var form = event.target;
+        if (!form.hasAttribute('data-partial')) {
+            return;
+        }
+        event.preventDefault();
+        var row = form.closest('tr[data-device-id]');
+        fetch(form.action, {method: 'POST', body: new FormData(form), headers: {'HX-Request': 'true'}})
+            .then(function (response) { return response.ok ? response.text() : Promise.reject(response); })
+            .then(function (html) { swapRow(row.getAttribute('data-device-id'), html); })
+            .catch(function () { form.submit(); });
+    });
+
+    // Only pages showing device rows listen for changes
+    if (!window.EventSource || !document.querySelector('tr[data-device-id]')) {
+        return;
+    }
+    var pending = {};
+    var timer = null;
+    new EventSource(eventsUrl).addEventListener('devices', function (event) {
+        JSON.parse(event.data).forEach(function (delta) {
+            var row = document.querySelector('tr[data-device-id="' + delta.id + '"]');
+            if (row && delta.deleted) {
+                row.remove();
+            } else if (row) {
+                pending[delta.id] = true;
+            }
+        });
+        // Coalesce bursts, such as a bulk command, into one round of fetches
+        if (timer === null) {
+            timer = setTimeout(function () {
+                Object.keys(pending).forEach(refreshRow);
+                pending = {};
+                timer = null;
+            }, 100);
+        }
+    });
+})();
@@ -1,34 +1,329 @@
-from database import Device, get_device_by_id, save_device
+import threading
+import time
+import click
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, select, update
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from commands import run_command, BulkCommandError, DEVICE_GROUPS
+from database import db, Device, Schedule, get_device_by_id, home_registry, shard_engines, sync_devices
+from events import hub
 from models import *
-from app import app
+from registry import DeviceRecord
+from telemetry import accrue, recorder, prune
+from tenancy import current_home, using_home
+from writebehind import writes
+from journal import journal, prune as prune_journal_history, snapshot_homes, using_source
+from app import get_app
+from schedulers import scheduler, schedulers
 
-def control_device(device_id, action, value=None):
-    with app.app_context():
-        device_row = get_device_by_id(device_id) #Retrieve Device
-        device = SmartDevice.from_db(device_row)
-
-        if action == 'on': #Perform Relevant Action
+def apply_action(device, action, value=None): #Perform Relevant Action on a Device Object
+    if action == 'on':
+        device.turn_on()
+    elif action == 'off':
+        device.turn_off()
+    elif action == 'set_brightness' and hasattr(device, "brightness"):
+        try:
+            device.brightness = int(value)
             device.turn_on()
-        elif action == 'off':
-            device.turn_off()
-        elif action == 'set_brightness' and hasattr(device, "brightness"):
+        except ValueError:
+            print(f"Invalid brightness value: {value}")
+    elif action == 'set_temperature':
+        if isinstance(device, (Thermostat, Kettle, Boiler)):
             try:
-                device.brightness = int(value)
-                device.turn_on()
-            except ValueError:
-                print(f"Invalid brightness value: {value}")
-        elif action == 'set_temperature':
-            if isinstance(device, (Thermostat, Kettle, Boiler)):
-                device.temperature = value
-            else:
-                print(f"{device_row.name} does not support temperature control.")
-        elif action == 'set_colour' and hasattr(device, "colour"):
+                device.temperature = int(value)
+            except (TypeError, ValueError) as error:
+                print(f"Invalid temperature for {device.name}: {error}")
+        else:
+            print(f"{device.name} does not support temperature control.")
+    elif action == 'set_colour' and hasattr(device, "colour"):
+        try:
+            device.colour = Colour[value.upper()]
+            device.turn_on()
+        except (KeyError, ValueError):
+            print(f"Invalid colour: {value}")
+    else:
+        print(f"Unsupported action or device type: {action}")
+
+def settle_buffers(): #A Process-Pool Child Never Starts Housekeeping, so a Job Run There Writes its Own Buffers
+    if not schedulers.started:
+        recorder.flush()
+        journal.flush()
+
+def control_device(device_id, action, value=None, home_id=None): #Jobs Saved Before Homes Run in the First Home
+    control_devices([(device_id, action, value)], home_id)
+
+#Batch Sizes and Apply Latency for Jobs Run in This Process
+class BatchStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.jobs = 0
+        self.statements = 0
+        self.max_batch_size = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last = None
+
+    def add(self, jobs, statements, elapsed_ms):
+        with self._lock:
+            self.batches += 1
+            self.jobs += jobs
+            self.statements += statements
+            self.max_batch_size = max(self.max_batch_size, jobs)
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.last = {'jobs': jobs, 'statements': statements, 'apply_ms': round(elapsed_ms, 3)}
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'jobs': self.jobs,
+                'statements': self.statements,
+                'avg_batch_size': round(self.jobs / self.batches, 2) if self.batches else 0,
+                'max_batch_size': self.max_batch_size,
+                'avg_apply_ms': round(self.total_ms / self.batches, 3) if self.batches else 0,
+                'max_apply_ms': round(self.max_ms, 3),
+                'last': self.last,
+            }
+
+batch_stats = BatchStats()
+
+BATCH_CHUNK = 5000 #IDs per IN (...) List
+
+def _changes(row, device): #Fields the Commands Actually Changed
+    changes = {}
+    if device.is_on != bool(row.status):
+        changes['status'] = device.is_on
+    if hasattr(device, "temperature") and device.temperature != row.temperature:
+        changes['temperature'] = device.temperature
+    if hasattr(device, "brightness") and device.brightness != row.brightness:
+        changes['brightness'] = device.brightness
+    if hasattr(device, "colour") and device.colour and device.colour is not colour_from_string(row.colour):
+        changes['colour'] = device.colour.name
+    return changes
+
+def control_devices(commands, home_id=None): #Run a Tick's Scheduled Commands for One Home in One Transaction
+    started = time.perf_counter()
+    with get_app().app_context(), using_home(home_id), using_source('job'):
+        #Validate Each Command Through the Model Setters, in Job Order
+        rows, devices = {}, {}
+        for device_id, action, *value in commands:
+            value = value[0] if value else None
+            device_id = int(device_id)
+            if device_id not in devices:
+                device_row = get_device_by_id(device_id) #Retrieve Device
+                if device_row is None:
+                    print(f"No device found with ID {device_id}")
+                    continue
+                rows[device_id] = device_row
+                devices[device_id] = SmartDevice.from_db(device_row)
+            apply_action(devices[device_id], action, value)
+
+        #Devices Ending with the Same Changes Share One UPDATE
+        groups = defaultdict(list)
+        for device_id, device in devices.items():
+            changes = _changes(rows[device_id], device)
+            if changes:
+                groups[tuple(sorted(changes.items()))].append(device_id)
+
+        if writes.enabled: #Acknowledged Now, Written with the Next Flush
+            records = [writes.submit(current_home(), device_id, dict(changes))
+                       for changes, ids in groups.items() for device_id in ids]
+            records = [record for record in records if record is not None] #Deleted Since it was Read
+            statements = 0
+        else:
+            updated = []
+            statements = 0
             try:
-                device.colour = Colour[value.upper()]
-                device.turn_on()
-            except KeyError:
-                print(f"Invalid colour: {value}")
+                for changes, ids in groups.items():
+                    for start in range(0, len(ids), BATCH_CHUNK):
+                        updated.extend(db.session.execute(
+                            update(Device)
+                            .where(Device.id.in_(ids[start:start + BATCH_CHUNK]), Device.home_id == current_home())
+                            .values(**dict(changes))
+                            .returning(*Device.__table__.columns)
+                            .execution_options(synchronize_session=False)
+                        ).all())
+                        statements += 1
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            records = [DeviceRecord.from_row(row) for row in updated]
+            home_registry().put_many(records)
+        recorder.record_many(records)
+        for changes, ids in groups.items():
+            journal.record(ids, dict(changes))
+        settle_buffers()
+
+    batch_stats.add(len(commands), statements, (time.perf_counter() - started) * 1000)
+    return len(records)
+
+def run_scene(group, action, value=None, home_id=None): #One Job Driving a Whole Device Group
+    with get_app().app_context(), using_home(home_id), using_source('job'):
+        try:
+            run_command(action, value, types=DEVICE_GROUPS[group][1])
+        except (KeyError, BulkCommandError) as error:
+            print(f"Scene {group} failed: {getattr(error, 'message', error)}")
+        settle_buffers()
+
+def run_selection(selector, action, value=None, home_id=None): #One Job Driving the Devices a Selector Matches
+    with get_app().app_context(), using_home(home_id), using_source('job'):
+        try:
+            run_command(action, value, selector=selector)
+        except BulkCommandError as error:
+            print(f"Selector {selector!r} failed: {error.message}")
+        settle_buffers()
+
+#Scheduling Triggers
+def build_trigger(kind, run_at=None, interval_minutes=None, cron=None):
+    if kind == 'interval':
+        if not interval_minutes or interval_minutes < 1:
+            raise ValueError("Repeating tasks need an interval of at least 1 minute")
+        return IntervalTrigger(minutes=interval_minutes, start_date=run_at)
+    if kind == 'cron':
+        if not cron:
+            raise ValueError("Cron tasks need a cron expression")
+        return CronTrigger.from_crontab(cron)
+    if run_at is None:
+        raise ValueError("One-off tasks need a schedule time")
+    return DateTrigger(run_date=run_at)
+
+def trigger_fields(trigger): #Form Values That Rebuild a Trigger
+    if isinstance(trigger, IntervalTrigger):
+        return {'trigger': 'interval', 'schedule_time': trigger.start_date,
+                'interval_minutes': int(trigger.interval.total_seconds() // 60)}
+    if isinstance(trigger, CronTrigger):
+        fields = {field.name: str(field) for field in trigger.fields}
+        cron = ' '.join(fields[name] for name in ('minute', 'hour', 'day', 'month', 'day_of_week'))
+        return {'trigger': 'cron', 'cron': cron}
+    return {'trigger': 'date', 'schedule_time': trigger.run_date}
+
+def describe_trigger(trigger):
+    if isinstance(trigger, IntervalTrigger):
+        return f"Every {int(trigger.interval.total_seconds() // 60)} Minutes"
+    if isinstance(trigger, CronTrigger):
+        return f"Cron: {trigger_fields(trigger)['cron']}"
+    return "Once"
+
+#Schedule Rows Kept Alongside APScheduler Jobs
+def local_time(moment): #Naive Local Time, as Stored in the Schedules Table
+    return moment.astimezone().replace(tzinfo=None) if moment else None
+
+def job_home(job):
+    return job.kwargs.get('home_id') or current_app.config['DEFAULT_HOME_ID']
+
+def schedule_fields(job): #Row Values Describing a Job
+    target, action, *value = job.args
+    scene = job.func_ref == 'tasks:run_scene'
+    selection = job.func_ref == 'tasks:run_selection'
+    fields = trigger_fields(job.trigger)
+    spec = fields.get('interval_minutes') or fields.get('cron')
+    return {
+        'home_id': job_home(job),
+        'job_id': job.id,
+        'device_id': None if scene or selection else int(target),
+        'device_group': target if scene else None,
+        'selector': target if selection else None,
+        'action': action,
+        'value': str(value[0]) if value and value[0] is not None else None,
+        'trigger': fields['trigger'],
+        'trigger_spec': str(spec) if spec else None,
+        'next_run_at': local_time(job.next_run_time),
+    }
+
+def save_schedule(job): #Insert or Update the Row for a Job, in its Home's Shard
+    fields = schedule_fields(job)
+    with using_home(fields['home_id']):
+        row = db.session.execute(select(Schedule).filter_by(job_id=job.id)).scalar_one_or_none()
+        if row is None:
+            db.session.add(Schedule(**fields))
         else:
-            print(f"Unsupported action or device type: {action}")
+            for name, value in fields.items():
+                setattr(row, name, value)
+        db.session.commit()
+
+def delete_schedule(job_id):
+    db.session.execute(delete(Schedule).where(Schedule.job_id == job_id, Schedule.home_id == current_home()))
+    db.session.commit()
+
+_stale_jobs = set()
+_stale_lock = threading.Lock()
+
+def mark_schedule_stale(event): #Scheduler Listener; Rows are Refreshed in Bulk Later
+    with _stale_lock:
+        _stale_jobs.add(event.job_id)
+
+def refresh_schedules(): #Copy next_run_time from the Jobstore, Dropping Finished Jobs
+    with _stale_lock:
+        job_ids = list(_stale_jobs)
+        _stale_jobs.clear()
+    if not job_ids:
+        return
+    with get_app().app_context():
+        for job_id in job_ids:
+            job = scheduler.get_job(job_id)
+            if job is None: #The Home is Gone with the Job, so Try Every Shard
+                for engine in shard_engines():
+                    db.session.execute(delete(Schedule).where(Schedule.job_id == job_id),
+                                       bind_arguments={'bind': engine})
+            else:
+                with using_home(job_home(job)):
+                    db.session.execute(update(Schedule).where(Schedule.job_id == job_id)
+                                       .values(next_run_at=local_time(job.next_run_time)))
+        db.session.commit()
+
+@click.command('sync-schedules') #Create Rows for Jobs Added Before the Schedules Table
+@with_appcontext
+def sync_schedules():
+    for job in scheduler.get_jobs():
+        if job.func_ref in ('tasks:control_device', 'tasks:run_scene', 'tasks:run_selection'):
+            save_schedule(job)
+
+@click.command('create-shards') #Tables in Each DATABASE_SHARDS Database; the Main One Uses Migrations
+@with_appcontext
+def create_shards():
+    for shard in current_app.config['HOME_SHARDS']:
+        if shard is not None:
+            db.metadata.create_all(db.engines[shard])
+            print(f"Created tables in {shard}")
+
+def sync_for_subscribers(): #Pull Other Processes' Writes for Homes Someone is Listening To
+    homes = hub.homes()
+    if homes:
+        with get_app().app_context():
+            for home_id in homes:
+                with using_home(home_id):
+                    sync_devices(force=True)
+
+def flush_writes(): #Write Queued Device Commands
+    with get_app().app_context():
+        writes.flush()
+
+def flush_journal(): #Write Buffered Device Commands
+    with get_app().app_context():
+        journal.flush()
+
+def snapshot_journal(): #Fold Recent Commands into Fresh Snapshots
+    with get_app().app_context():
+        snapshot_homes()
+
+def prune_journal(): #Apply the Journal Retention Policy
+    with get_app().app_context():
+        prune_journal_history(current_app.config['JOURNAL_RETENTION_DAYS'])
+
+def flush_telemetry(): #Write Buffered Energy Samples, Then Credit Devices Left On
+    with get_app().app_context():
+        recorder.flush()
+        accrue(datetime.now() - timedelta(seconds=current_app.config['TELEMETRY_ACCRUAL_LAG']))
 
-        save_device(device_id, device) #Save Changes
+def prune_telemetry(): #Apply the Telemetry Retention Policy
+    with get_app().app_context():
+        prune(current_app.config['TELEMETRY_RETENTION_DAYS'])
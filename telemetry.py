@@ -0,0 +1,196 @@
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select, func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import db, EnergyMeter, EnergySample, EnergyRollup, shard_engines
+from models import DEVICE_WATTAGE
+from tenancy import current_home, using_home
+
+RESOLUTIONS = ('minute', 'hour', 'day')
+
+def bucket_start(moment, resolution): #Truncate a Timestamp to its Rollup Bucket
+    if resolution == 'minute':
+        return moment.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+BUCKET_LENGTHS = {'minute': timedelta(minutes=1), 'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+METER_CHUNK = 5000 #IDs per IN (...) List
+
+def spread(totals, device_type, watts, start, end): #Credit watts Drawn Over [start, end) to Every Bucket it Covers
+    if watts <= 0:
+        return
+    for resolution in RESOLUTIONS:
+        moment = start
+        while moment < end:
+            bucket = bucket_start(moment, resolution)
+            close = min(bucket + BUCKET_LENGTHS[resolution], end)
+            totals[(resolution, bucket, device_type)][1] += watts * (close - moment).total_seconds() / 3600
+            moment = close
+
+def upsert_rollups(home_id, totals, **bind): #Add {(Resolution, Bucket, Type): [Samples, Wh]} to a Home's Rollups
+    rollups = [
+        {'home_id': home_id, 'resolution': resolution, 'bucket': bucket, 'device_type': device_type,
+         'samples': count, 'energy_wh': energy_wh}
+        for (resolution, bucket, device_type), (count, energy_wh) in totals.items()
+    ]
+    upsert = sqlite_insert(EnergyRollup)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=['home_id', 'resolution', 'bucket', 'device_type'],
+        set_={
+            'samples': EnergyRollup.samples + upsert.excluded.samples,
+            'energy_wh': EnergyRollup.energy_wh + upsert.excluded.energy_wh,
+        },
+    )
+    db.session.execute(upsert, rollups, **bind)
+
+#Buffers Samples in Memory Until the Scheduler Flushes Them
+#Intervals are Worked Out at Flush Time from the Stored Meters, so They Survive Restarts and Span Processes
+class TelemetryRecorder:
+    def __init__(self):
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def record(self, device, at=None):
+        at = at or datetime.now()
+        with self._lock:
+            self._buffer.append({
+                'home_id': device.home_id,
+                'device_id': device.id,
+                'device_type': device.type,
+                'recorded_at': at,
+                'status': bool(device.status),
+                'watts': DEVICE_WATTAGE.get(device.type, 0) if device.status else 0,
+            })
+
+    def record_many(self, devices):
+        at = datetime.now()
+        for device in devices:
+            self.record(device, at)
+
+    def pending(self):
+        return len(self._buffer)
+
+    def flush(self): #Write Buffered Samples and Fold Them into the Rollups, Home by Home
+        with self._lock:
+            samples, self._buffer = self._buffer, []
+        homes = defaultdict(list)
+        for sample in samples:
+            homes[sample['home_id']].append(sample)
+
+        written = set()
+        for home_id, home_samples in homes.items():
+            try:
+                with using_home(home_id): #Each Home's Rows Go to its Own Shard
+                    self._write(home_id, home_samples)
+            except Exception:
+                db.session.rollback()
+                with self._lock: #Retry This and the Remaining Homes on the Next Flush
+                    self._buffer[:0] = [sample for sample in samples if sample['home_id'] not in written]
+                raise
+            written.add(home_id)
+        return len(samples)
+
+    def _write(self, home_id, samples):
+        samples = sorted(samples, key=lambda sample: sample['recorded_at'])
+        ids = list({sample['device_id'] for sample in samples})
+        meters = {} #Device ID -> (Watts, Since, Accrued To) of its Open Interval
+        for start in range(0, len(ids), METER_CHUNK):
+            meters.update((row.device_id, (row.watts, row.since, row.accrued_to)) for row in db.session.execute(
+                select(EnergyMeter.device_id, EnergyMeter.watts, EnergyMeter.since, EnergyMeter.accrued_to)
+                .where(EnergyMeter.home_id == home_id, EnergyMeter.device_id.in_(ids[start:start + METER_CHUNK]))))
+
+        #Each Sample Closes its Device's Open Interval; Energy Not Yet Accrued is Spread Over the Buckets it Spans
+        totals = defaultdict(lambda: [0, 0.0])
+        types = {}
+        for sample in samples:
+            at, device_id = sample['recorded_at'], sample['device_id']
+            meter = meters.get(device_id)
+            if meter is None:
+                sample['energy_wh'] = 0.0
+                accrued_to = at
+            else:
+                watts, since, accrued_to = meter
+                sample['energy_wh'] = watts * max((at - since).total_seconds(), 0) / 3600
+                spread(totals, sample['device_type'], watts, accrued_to, at)
+                accrued_to = max(accrued_to, at) #A Sample Older Than the Accrual Takes Effect from There
+            meters[device_id] = (sample['watts'], at, accrued_to)
+            types[device_id] = sample['device_type']
+            for resolution in RESOLUTIONS:
+                totals[(resolution, bucket_start(at, resolution), sample['device_type'])][0] += 1
+
+        upsert = sqlite_insert(EnergyMeter)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=['home_id', 'device_id'],
+            set_={field: getattr(upsert.excluded, field) for field in ('device_type', 'watts', 'since', 'accrued_to')},
+        )
+        db.session.execute(insert(EnergySample), samples)
+        db.session.execute(upsert, [
+            {'home_id': home_id, 'device_id': device_id, 'device_type': device_type, 'watts': meters[device_id][0],
+             'since': meters[device_id][1], 'accrued_to': meters[device_id][2]}
+            for device_id, device_type in types.items()
+        ])
+        upsert_rollups(home_id, totals)
+        db.session.commit()
+
+recorder = TelemetryRecorder()
+
+def accrue(until): #Credit Devices Still Drawing Power up to until (Whole Minutes), in Every Shard
+    until = bucket_start(until, 'minute')
+    for engine in shard_engines():
+        shard = {'bind': engine}
+        due = (EnergyMeter.watts > 0, EnergyMeter.accrued_to < until)
+        #Meters Credited Together Share accrued_to, so This is a Handful of Groups, Not One Row per Device
+        homes = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+        for home_id, device_type, watts, accrued_to, count in db.session.execute(
+                select(EnergyMeter.home_id, EnergyMeter.device_type, EnergyMeter.watts, EnergyMeter.accrued_to,
+                       func.count())
+                .where(*due)
+                .group_by(EnergyMeter.home_id, EnergyMeter.device_type, EnergyMeter.watts, EnergyMeter.accrued_to),
+                bind_arguments=shard):
+            spread(homes[home_id], device_type, watts * count, accrued_to, until)
+        if not homes:
+            continue
+        try:
+            for home_id, totals in homes.items():
+                upsert_rollups(home_id, totals, bind_arguments=shard)
+            db.session.execute(update(EnergyMeter).where(*due).values(accrued_to=until), bind_arguments=shard)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+def prune(retention, now=None): #Drop Samples and Rollups Older Than Their Retention (Days), in Every Shard
+    now = now or datetime.now()
+    for engine in shard_engines():
+        shard = {'bind': engine}
+        db.session.execute(delete(EnergySample).where(
+            EnergySample.recorded_at < now - timedelta(days=retention['raw'])), bind_arguments=shard)
+        for resolution in RESOLUTIONS:
+            db.session.execute(delete(EnergyRollup).where(
+                EnergyRollup.resolution == resolution,
+                EnergyRollup.bucket < bucket_start(now - timedelta(days=retention[resolution]), resolution)),
+                bind_arguments=shard)
+    db.session.commit()
+
+def energy_history(start, end=None): #Read the Coarsest Rollup That Fits the Window
+    end = end or datetime.now()
+    span = end - start
+    if span > timedelta(days=2):
+        resolution = 'day'
+    elif span > timedelta(hours=2):
+        resolution = 'hour'
+    else:
+        resolution = 'minute'
+    rows = db.session.execute(
+        select(EnergyRollup.bucket, EnergyRollup.device_type, func.sum(EnergyRollup.energy_wh))
+        .where(EnergyRollup.home_id == current_home(),
+               EnergyRollup.resolution == resolution,
+               EnergyRollup.bucket >= bucket_start(start, resolution),
+               EnergyRollup.bucket <= end)
+        .group_by(EnergyRollup.bucket, EnergyRollup.device_type)
+        .order_by(EnergyRollup.bucket)
+    ).all()
+    return resolution, rows
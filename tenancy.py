@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app
+from werkzeug.utils import import_string
+from config import Config
+
+#The Home (Tenant) Being Served; Set per Request, Job or Command, Defaulting to the First Home
+_current_home = ContextVar('current_home', default=Config.DEFAULT_HOME_ID)
+
+#Error Handling
+class HomeError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+def current_home():
+    return _current_home.get()
+
+def parse_home(*candidates): #First Given Value of Header, Query Argument, Session...
+    for value in candidates:
+        if value is None or value == '':
+            continue
+        try:
+            home_id = int(value)
+        except (TypeError, ValueError):
+            raise HomeError(f"Home must be a whole number, got {value!r}")
+        if home_id < 1:
+            raise HomeError(f"Home must be positive, got {home_id}")
+        return home_id
+    return Config.DEFAULT_HOME_ID
+
+@contextmanager
+def using_home(home_id=None): #Scope Queries, Inserts and the Shard to One Home
+    token = _current_home.set(home_id or Config.DEFAULT_HOME_ID)
+    try:
+        yield
+    finally:
+        _current_home.reset(token)
+
+def enter_home(home_id): #For Request Hooks; Every Request Sets its Own, so Nothing Needs Resetting
+    _current_home.set(home_id)
+
+#Sharding: Homes are Spread Over the Main Database and Any SQLALCHEMY_BINDS
+def route_home(home_id, shards): #Default Router; Home 1 Stays on the Main Database
+    return shards[(home_id - 1) % len(shards)]
+
+_routers = {}
+
+def shard_for(home_id, config=None): #Bind Key Holding a Home's Rows, None for the Main Database
+    config = config or current_app.config
+    shards = config['HOME_SHARDS']
+    if len(shards) == 1:
+        return shards[0]
+    path = config['HOME_ROUTER']
+    if path not in _routers:
+        _routers[path] = import_string(path)
+    shard = _routers[path](home_id, shards)
+    if shard not in shards:
+        raise HomeError(f"Router sent home {home_id} to unknown shard {shard!r}")
+    return shard
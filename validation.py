@@ -0,0 +1,103 @@
+import numpy as np
+
+COLOUR_NAMES = ('RED', 'ORANGE', 'YELLOW', 'GREEN', 'BLUE', 'PURPLE', 'PINK', 'DEFAULT') #Match models.Colour
+
+#What Each Device Type Accepts; None Means the Type Has No Such Setting
+class Rule:
+    __slots__ = ('temperature', 'brightness', 'colours')
+
+    def __init__(self, temperature=None, brightness=None, colours=()):
+        self.temperature = temperature #(Lowest, Highest)
+        self.brightness = brightness
+        self.colours = colours
+
+#The One Constraint Table; Models, Routes, Tasks, Commands and Imports All Read it
+RULES = {
+    'BasicLight': Rule(brightness=(0, 100), colours=('DEFAULT',)),
+    'ColourLight': Rule(brightness=(0, 100), colours=COLOUR_NAMES),
+    'Thermostat': Rule(temperature=(10, 30)),
+    'Kettle': Rule(temperature=(60, 100)),
+    'Boiler': Rule(temperature=(40, 60)),
+    'Camera': Rule(),
+    'DoorLock': Rule(),
+    'Appliance': Rule(),
+}
+
+RANGE_FIELDS = ('temperature', 'brightness')
+
+#Error Handling; a ValueError so Existing Handlers Keep Working
+class ValidationError(ValueError):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+def ranges(field): #Type -> (Lowest, Highest) for Types That Have the Field
+    return {device_type: getattr(rule, field) for device_type, rule in RULES.items() if getattr(rule, field)}
+
+def _rule(device_type):
+    try:
+        return RULES[device_type]
+    except KeyError:
+        raise ValidationError(f"Unknown device type: {device_type}")
+
+def _whole_number(value, field):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"{field.capitalize()} must be a whole number, got {value!r}")
+
+def range_message(device_type, field):
+    low, high = getattr(_rule(device_type), field)
+    if field == 'brightness':
+        return f"Brightness must be between {low} and {high}"
+    return f"Temperature must be between {low} and {high} for a {device_type}"
+
+#Single Values
+def check(device_type, field, value): #Cleaned Value, or ValidationError
+    rule = _rule(device_type)
+    if field in RANGE_FIELDS:
+        limits = getattr(rule, field)
+        if limits is None:
+            raise ValidationError(f"{field.capitalize()} can't be updated for this device.")
+        value = _whole_number(value, field)
+        if not (limits[0] <= value <= limits[1]):
+            raise ValidationError(range_message(device_type, field))
+        return value
+    if field == 'colour':
+        name = str(getattr(value, 'name', value)).upper()
+        if name not in COLOUR_NAMES:
+            raise ValidationError(f"Invalid colour: {value}")
+        if name not in rule.colours:
+            raise ValidationError("This Device cannot change colours")
+        return name
+    raise ValidationError(f"Unknown setting: {field}")
+
+def check_changes(device_type, changes): #Every Field of One Update
+    return {field: check(device_type, field, value) for field, value in changes.items()}
+
+def accepting(field, value): #Types That Would Accept value, for Commands Spanning Types
+    if field == 'colour':
+        name = str(value).upper()
+        return tuple(t for t, rule in RULES.items() if name in rule.colours)
+    return tuple(t for t, (low, high) in ranges(field).items() if low <= value <= high)
+
+#Whole Batches, Array-at-a-Time
+def _limits(field, types):
+    names, inverse = np.unique(np.asarray(types, dtype=object).astype(str), return_inverse=True)
+    low = np.full(len(names), np.nan)
+    high = np.full(len(names), np.nan)
+    for i, name in enumerate(names):
+        limits = getattr(RULES[name], field) if name in RULES else None
+        if limits:
+            low[i], high[i] = limits
+    return low[inverse], high[inverse]
+
+def check_many(field, types, values): #Boolean Mask of Rows Where values[i] Suits types[i]
+    low, high = _limits(field, types)
+    values = np.asarray(values, dtype=float) #None Becomes nan, Which Fails Every Comparison
+    with np.errstate(invalid='ignore'):
+        return (values >= low) & (values <= high)
+
+def rejected(field, types, values): #Indexes of Rows Whose Type Has field but Whose Value Fails it
+    low, _ = _limits(field, types)
+    return np.flatnonzero(~np.isnan(low) & ~check_many(field, types, values))
@@ -0,0 +1,56 @@
+#Scheduled Job Worker: python worker.py
+import logging
+import os
+
+#This Process Owns Job Execution, so a Web Scheduler Built Here Would Stay Paused
+os.environ['SCHEDULER_RUN_JOBS'] = '0'
+
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED
+from app import create_app
+from database import db
+from engines import jobstore_engine
+from schedulers import schedulers
+from tasks import mark_schedule_stale
+from executors import CoalescingExecutor, make_pool
+
+def poll(): #Wakes the Scheduler so it Sees Jobs Added by Other Processes
+    pass
+
+def create_worker(app):
+    config = app.config
+    pool = make_pool(config['WORKER_POOL'], config['WORKER_MAX_WORKERS'])
+    worker = BlockingScheduler(
+        jobstores={
+            'default': SQLAlchemyJobStore(engine=jobstore_engine(app, db)),
+            'local': MemoryJobStore(),
+        },
+        executors={
+            'default': CoalescingExecutor(
+                pool,
+                config['SCHEDULER_BATCHED_JOBS'],
+                window=config['WORKER_COALESCE_WINDOW'],
+                max_wait=config['WORKER_COALESCE_MAX_WAIT'],
+            ),
+            'local': ThreadPoolExecutor(1),
+        },
+    )
+    worker.add_listener(mark_schedule_stale, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+    worker.add_job(poll, 'interval', seconds=config['WORKER_POLL_INTERVAL'], id='poll',
+                   jobstore='local', executor='local')
+    schedulers.use(worker) #Schedule Rows are Refreshed from This Scheduler's Jobs
+    return worker
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger('apscheduler.executors.local').setLevel(logging.WARNING)
+    app = create_app(web=False) #No Routes or Forms; Jobs Run Against This App
+    worker = create_worker(app)
+    schedulers.start() #Schedule Refresh and Telemetry Flushing
+    try:
+        worker.start()
+    except (KeyboardInterrupt, SystemExit):
+        pass
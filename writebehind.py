@@ -0,0 +1,267 @@
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import func, select, update
+from registry import DeviceRecord, registries
+from tenancy import using_home
+
+FLUSH_CHUNK = 5000 #IDs per IN (...) List
+
+#A Record Not Yet Written; its Version is Only Local, so it Gets No ETag, and Another Process May Hold the
+#Same Number for Different Values
+class ProvisionalRecord(DeviceRecord):
+    __slots__ = ()
+
+def provisional(current, values): #The Registry's Record with values Applied, One Version Ahead
+    record = ProvisionalRecord(*(getattr(current, field) for field in DeviceRecord.__slots__))
+    for field, value in values.items():
+        setattr(record, field, value)
+    record.version = current.version + 1 #The Flush Writes at Least This, so Versions Never Go Back
+    return record
+
+#Write-Behind Device Commands: Acknowledged from the Registry, Collapsed per Device (Last Write to Each
+#Field Wins) and Written to the devices Table in Batches by the Housekeeping Scheduler
+#Every Command is Appended to This Process's Log First; Logs Left by a Crashed Process are Replayed on Start,
+#Except Commands Whose Row Changed After the Version They Were Based On
+class WriteBehindQueue:
+    def __init__(self):
+        self.enabled = False
+        self.max_pending = 10000
+        self.fsync = True
+        self.directory = None
+        #(Home, Device ID) -> [Values, Sequence of the Latest Command, Provisional Version, Base Version]
+        #The Base is the Written Version the Commands Build On; None While the Device's Last Flush is in Flight
+        self._pending = {}
+        self._sequence = 0
+        self._segment = 0
+        self._log = None
+        self._path = None
+        self._finished = [] #(Path, File) of Segments Deleted by the Next Full Flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.accepted = 0
+        self.written = 0
+
+    def open(self, directory, max_pending=10000, fsync=True): #Needs an App Context, to Flush What it Replays
+        with self._flush_lock, self._lock:
+            if self.enabled:
+                return
+            self.directory = directory
+            self.max_pending = max_pending
+            self.fsync = fsync
+            os.makedirs(directory, exist_ok=True)
+            replayed = self._replay()
+            self._open_segment()
+            self.enabled = True
+        if replayed:
+            self.flush()
+
+    def pending(self):
+        return len(self._pending)
+
+    #Commands
+    def submit(self, home_id, device_id, values): #Provisional Record, or None for an Unknown Device
+        registry = registries[home_id]
+        with self._lock:
+            current = registry.get(device_id)
+            if current is None:
+                return None
+            record = provisional(current, values)
+            entry = self._pending.get((home_id, device_id))
+            if entry is not None:
+                base = entry[3]
+            else:
+                base = None if isinstance(current, ProvisionalRecord) else current.version
+            self._sequence += 1
+            self._append({'s': self._sequence, 't': time.time(), 'h': home_id, 'd': device_id, 'v': values, 'b': base})
+            self._merge((home_id, device_id), values, self._sequence, record.version, base)
+            registry.put(record)
+            self.accepted += 1
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush() #Back-Pressure: the Writer That Filled the Queue Pays for the Flush
+        return record
+
+    def overlay(self, registry): #Put Unflushed Values Back After a Registry Reload
+        with self._lock:
+            records = []
+            for (home_id, device_id), entry in self._pending.items():
+                if home_id == registry.home_id and device_id in registry:
+                    records.append(provisional(registry.get(device_id), entry[0]))
+                    entry[2] = records[-1].version
+            registry.put_many(records)
+
+    def _merge(self, key, values, sequence, version=0, base=None): #Caller Holds the Lock
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [dict(values), sequence, version, base]
+        else:
+            entry[0].update(values)
+            entry[1] = sequence
+            entry[2] = max(entry[2], version)
+
+    #Flushing
+    def flush(self, home_id=None): #Write Pending Commands of Every Home, or One; Returns Devices Written
+        if not self.enabled:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                if home_id is None:
+                    batch, self._pending = self._pending, {}
+                    if batch or self._finished:
+                        self._rotate()
+                    finished = list(self._finished)
+                else:
+                    batch = {key: self._pending.pop(key) for key in list(self._pending) if key[0] == home_id}
+                    finished = []
+            homes = defaultdict(dict)
+            for (home, device_id), entry in batch.items():
+                homes[home][device_id] = entry
+
+            written = 0
+            for home, entries in list(homes.items()):
+                try:
+                    with using_home(home): #Each Home's Rows Go to its Own Shard
+                        rows = self._write(home, entries)
+                except Exception:
+                    self._restore(homes)
+                    raise
+                self._settle(home, rows, max(entry[1] for entry in entries.values()))
+                del homes[home]
+                written += len(rows)
+
+            with self._lock:
+                for path, log in finished: #Everything They Held is in the Table Now
+                    os.remove(path)
+                    log.close()
+                    self._finished.remove((path, log))
+            return written
+
+    def _write(self, home_id, entries): #Devices Ending with the Same Values Share One UPDATE
+        from database import db, Device, NEXT_VERSION
+        groups = defaultdict(list)
+        for device_id, entry in entries.items():
+            groups[tuple(sorted(entry[0].items()))].append(device_id)
+        rows = []
+        try:
+            for values, ids in groups.items():
+                for start in range(0, len(ids), FLUSH_CHUNK):
+                    chunk = ids[start:start + FLUSH_CHUNK]
+                    served = max(entries[device_id][2] for device_id in chunk) #Highest Provisional Version Served
+                    rows.extend(db.session.execute(
+                        update(Device)
+                        .where(Device.id.in_(chunk), Device.home_id == home_id)
+                        .values(**dict(values), version=func.max(NEXT_VERSION, served))
+                        .returning(*Device.__table__.columns)
+                        .execution_options(synchronize_session=False)
+                    ).all())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return rows
+
+    def _settle(self, home_id, rows, sequence): #Real Versions Replace Provisional Ones Not Written Over Since
+        records = [DeviceRecord.from_row(row) for row in rows]
+        with self._lock:
+            registries[home_id].put_many([record for record in records if (home_id, record.id) not in self._pending],
+                                         force=True)
+            #Commands Made While This Flush Was in Flight Build On the Versions it Wrote
+            rebased = []
+            for record in records:
+                entry = self._pending.get((home_id, record.id))
+                if entry is not None:
+                    entry[3] = record.version
+                    rebased.append([record.id, record.version])
+            self._append({'flushed': home_id, 's': sequence, 'b': rebased}) #Replay Skips This Home's Earlier Commands
+            self.written += len(records)
+
+    def _restore(self, homes): #Unwritten Commands Go Back, Under Any Newer Ones
+        with self._lock:
+            for home, entries in homes.items():
+                for device_id, (values, sequence, version, base) in entries.items():
+                    newer = self._pending.get((home, device_id))
+                    self._pending[(home, device_id)] = [dict(values), sequence, version, base]
+                    if newer is not None:
+                        self._merge((home, device_id), newer[0], newer[1], newer[2])
+
+    #Append Log: One Segment File per Process at a Time, Held Under an flock While the Process Lives
+    #flock is Unix Only, so fcntl is Imported Once open() Enables the Queue, Not When the App Imports This Module
+    def _open_segment(self): #Caller Holds the Lock
+        import fcntl
+        self._segment += 1
+        self._path = os.path.join(self.directory, f"{os.getpid()}-{self._segment}.log")
+        self._log = open(self._path, 'a', encoding='utf-8')
+        fcntl.flock(self._log, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _rotate(self): #Caller Holds the Lock; the Old Segment Stays Locked Until it is Deleted
+        self._finished.append((self._path, self._log))
+        self._open_segment()
+
+    def _append(self, line): #Caller Holds the Lock
+        self._log.write(json.dumps(line, separators=(',', ':')) + '\n')
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+
+    def _replay(self): #Load Logs No Live Process Holds; Caller Holds Both Locks
+        import fcntl
+        commands = []
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.log'))):
+            log = open(path, 'r', encoding='utf-8')
+            try:
+                fcntl.flock(log, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                log.close() #Another Running Process's Log
+                continue
+            self._finished.append((path, log))
+            commands.extend(self._read(log))
+        commands = self._current(commands)
+        for command in sorted(commands, key=lambda command: command['t']): #Across Logs, the Later Command Wins
+            self._sequence += 1
+            self._merge((command['h'], command['d']), command['v'], self._sequence, 0, command.get('b'))
+        return bool(commands)
+
+    def _read(self, log): #Commands in One Log Not Covered by a Later Flush Marker
+        commands = []
+        bases = {} #(Home, Device ID) -> Base of its Latest Command, for Commands Logged Mid-Flush
+        for text in log:
+            try:
+                line = json.loads(text)
+            except ValueError:
+                continue #Torn Last Line from the Crash
+            if 'flushed' in line:
+                commands = [command for command in commands
+                            if command['h'] != line['flushed'] or command['s'] > line['s']]
+                rebased = dict(line.get('b', ()))
+                for command in commands:
+                    if command['h'] == line['flushed'] and command['d'] in rebased:
+                        command['b'] = bases[(command['h'], command['d'])] = rebased[command['d']]
+            else:
+                key = (line['h'], line['d'])
+                if line.get('b') is None:
+                    line['b'] = bases.get(key) #Died Before the Flush Marker Said What it Wrote
+                bases[key] = line['b']
+                commands.append(line)
+        return commands
+
+    def _current(self, commands): #Drop Commands for Rows Deleted or Changed Since Their Base Version
+        from database import db, Device
+        homes = defaultdict(set)
+        for command in commands:
+            homes[command['h']].add(command['d'])
+        versions = {}
+        for home_id, ids in homes.items():
+            ids = list(ids)
+            with using_home(home_id):
+                for start in range(0, len(ids), FLUSH_CHUNK):
+                    versions.update(((home_id, device_id), version) for device_id, version in db.session.execute(
+                        select(Device.id, Device.version)
+                        .where(Device.home_id == home_id, Device.id.in_(ids[start:start + FLUSH_CHUNK]))))
+        return [command for command in commands if (command['h'], command['d']) in versions
+                and (command.get('b') is None or versions[(command['h'], command['d'])] <= command['b'])]
+
+writes = WriteBehindQueue()